@@ -0,0 +1,622 @@
+#==========================================================================================
+#   複数の構造計算書を一括でチェックするバッチ処理（ページ単位の並列処理）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+フォルダ（またはPDFのパスを1行に1つ書いたリストファイル）に含まれる構造計算書をまとめてチェックする。
+
+    python BatchCheck.py 計算書フォルダ --limit 0.95 --workers 8
+    python BatchCheck.py manifest.txt --tool elements --out results.jsonl
+
+・内容が同じPDF（SHA-256が一致するもの）は一度だけ処理し、重複分には同じ結果を返す。
+・ページ単位の仕事をプロセスプールで処理し、ファイルサイズの大きい計算書から投入する。
+・ページの重みをコンテンツストリームの大きさ等から見積もり、重みがそろうようにページをまとめて
+  ワークスティーリングのスケジューラ（PageScheduler）に渡す。--cost-log でページごとの処理時間を記録できる。
+・計算書ごとの結果は、終わったものから1行1件のJSONで出力する。
+
+SS7の計算書では、柱・梁の検定表のページが伏図・軸組図・断面リストのページで読み取った部材データを使うため、
+1回目に部材データを作るページとその他のページを処理し、2回目に検定表のページを前のページまでの部材データで処理する。
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import traceback
+import multiprocessing
+
+from PageScheduler import PageScheduler, CostLog, EstimatePageFeatures, PageWeight, LoadCostModel
+
+SS7_KIND = "SuperBuild/SS7"
+
+# 部材データを作るページ（伏図・軸組図・断面リスト）と、部材データを使うページ（柱・梁の検定表）
+PRODUCER_FLAGS = ("床伏図", "軸組図", "断面リスト梁", "断面リスト柱")
+CONSUMER_FLAGS = ("柱", "梁")
+
+# 1回の仕事で処理するページ数の上限の既定値
+DEFAULT_CHUNK = 8
+
+# 1冊の計算書をワーカー数の何倍の仕事に分けるか（重みの見積り誤差をスティールで吸収する）
+SPLIT_FACTOR = 4
+
+# ワーカーが開いたままにしておく計算書の数
+OPEN_BOOKS = 2
+
+# ワーカープロセスごとに保持するインスタンス
+_worker = {}
+
+
+#============================================================================
+#  入力ファイルの一覧を作成する関数（フォルダまたはリストファイル）
+#============================================================================
+
+def CollectFiles(target):
+    files = []
+    if os.path.isdir(target):
+        for root, dirs, names in os.walk(target):
+            dirs.sort()
+            for name in sorted(names):
+                # 以前に出力した検出結果のPDFは対象外
+                if name.lower().endswith(".pdf") and not "[検出結果" in name:
+                    files.append(os.path.join(root, name))
+                #end if
+            #next
+        #next
+    else:
+        base = os.path.dirname(os.path.abspath(target))
+        with open(target, "r", encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                #end if
+                if not os.path.isabs(line):
+                    line = os.path.join(base, line)
+                #end if
+                files.append(line)
+            #next
+        #end with
+    #end if
+    return files
+#end def
+
+
+#============================================================================
+#  ファイル内容のハッシュ値（SHA-256）を求める関数
+#============================================================================
+
+def HashFile(filename, blocksize=1 << 20):
+    h = hashlib.sha256()
+    with open(filename, "rb") as fp:
+        while True:
+            data = fp.read(blocksize)
+            if not data:
+                break
+            #end if
+            h.update(data)
+        #end while
+    #end with
+    return h.hexdigest()
+#end def
+
+
+#============================================================================
+#  同じ内容のファイルをまとめ、大きいファイルから順に並べる関数
+#============================================================================
+
+def GroupBooks(files):
+    books = {}
+    order = []
+    errors = []
+    for filename in files:
+        try:
+            digest = HashFile(filename)
+            size = os.path.getsize(filename)
+        except OSError as e:
+            errors.append({"file": filename, "ok": False, "error": "{}: {}".format(type(e).__name__, e)})
+            continue
+        #end try
+        if digest in books:
+            books[digest]["duplicates"].append(filename)
+        else:
+            books[digest] = {"file": filename, "sha256": digest, "size": size, "duplicates": []}
+            order.append(digest)
+        #end if
+    #next
+    # 大きい計算書を先に投入して、最後に大きな計算書だけが残るのを防ぐ
+    order.sort(key=lambda d: -books[d]["size"])
+    return [books[d] for d in order], errors
+#end def
+
+
+#============================================================================
+#  ワーカープロセスの初期化と、ワーカー内で開いている計算書の管理
+#============================================================================
+
+def InitWorker(quiet):
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+        # 進捗を捨てる場合はイベントの整形も行わない
+        import EventLog
+        EventLog.SetConsole(None)
+    else:
+        sys.stdout = sys.stderr
+    #end if
+    import MemberCheck01
+    _worker["MemberCheck01"] = MemberCheck01
+    _worker["CheckTool"] = MemberCheck01.CheckTool()
+    _worker["books"] = {}
+#end def
+
+def OpenBook(filename):
+    # 同じ計算書の仕事が続くことが多いので、直近の計算書を開いたままにしておく
+    books = _worker["books"]
+    if filename in books:
+        books[filename] = books.pop(filename)   # 最近使った順に並べ替える
+    else:
+        while len(books) >= OPEN_BOOKS:
+            books.pop(next(iter(books)))["source"].close()
+        #end while
+        from PdfInput import PdfSource
+        source = PdfSource(filename)
+        # フォントのキャッシュはPDFごとに持つ必要があるので、ツールも計算書ごとに作る
+        books[filename] = {"source": source, "tools": _worker["CheckTool"].MakeTools()}
+    #end if
+    return books[filename]
+#end def
+
+def CloseBook(filename):
+    books = _worker["books"]
+    if filename in books:
+        books.pop(filename)["source"].close()
+    #end if
+#end def
+
+def ErrorText(e):
+    return "{}: {}".format(type(e).__name__, e)
+#end def
+
+
+#============================================================================
+#  ワーカーで実行する仕事
+#============================================================================
+
+def ScanBook(filename, stpage, edpage):
+    # プログラムの種類を判定し（CheckTool.RunCheck と同じ順番）、ページ数と検索範囲、各ページの重みの特徴量を返す
+    CT = _worker["CheckTool"]
+    book = OpenBook(filename)
+    source = book["source"]
+    interpreter, device, interpreter2, device2 = book["tools"]
+    PageMax = source.PageCount()
+    kind, version = CT.DetectKind(source, interpreter, device, interpreter2, device2)
+    startpage, endpage = CT.PageRange(PageMax, stpage, edpage)
+    features = [EstimatePageFeatures(page) for page in source.Pages()]
+    return {"kind": kind, "version": version, "PageMax": PageMax,
+            "startpage": startpage, "endpage": endpage, "features": features}
+#end def
+
+def CheckPages(filename, kind, limit, pages):
+    # 1回目：部材データを作るページとその他のページを処理する（検定表のページは後回し）
+    CT = _worker["CheckTool"]
+    book = OpenBook(filename)
+    source = book["source"]
+    interpreter, device, interpreter2, device2 = book["tools"]
+    records = []
+    for pageI in pages:
+        t0 = time.perf_counter()
+        rec = {"page": pageI, "mode": ""}
+        page = source.Pages()[pageI - 1]
+        try:
+            layout = None
+            producer = False
+            consumer = False
+            if kind == SS7_KIND:
+                interpreter.process_page(page)
+                layout = device.get_result()
+                mode, Flags = CT.SS7PageMode(layout)
+                rec["mode"] = mode
+                producer = any(Flags[key] for key in PRODUCER_FLAGS)
+                consumer = any(Flags[key] for key in CONSUMER_FLAGS)
+            #end if
+            if consumer:
+                rec["deferred"] = True
+            #end if
+            if consumer and not producer:
+                records.append(rec)
+                continue
+            #end if
+
+            CT.ResetMemberData()
+            try:
+                rec["result"] = CT.CheckPage(page, kind, limit, interpreter, device, interpreter2, device2, layout)
+            except Exception:
+                # 検定表を兼ねるページは2回目にやり直すので、ここでの失敗は無視する
+                if not consumer:
+                    raise
+                #end if
+            finally:
+                if producer:
+                    rec["member"] = CT.GetMemberData()
+                #end if
+            #end try
+            if consumer:
+                rec.pop("result", None)
+            #end if
+        except Exception as e:
+            rec["error"] = ErrorText(e)
+        #end try
+        rec["time"] = time.perf_counter() - t0
+        records.append(rec)
+    #next
+    return records
+#end def
+
+def CheckDeferredPages(filename, kind, limit, pages, member):
+    # 2回目：前のページまでの部材データを使って検定表のページを処理する
+    CT = _worker["CheckTool"]
+    book = OpenBook(filename)
+    source = book["source"]
+    interpreter, device, interpreter2, device2 = book["tools"]
+    CT.ResetMemberData()
+    for data in member:
+        CT.MergeMemberData(data)
+    #next
+    records = []
+    for pageI in pages:
+        t0 = time.perf_counter()
+        rec = {"page": pageI, "mode": "検定表"}
+        try:
+            page = source.Pages()[pageI - 1]
+            rec["result"] = CT.CheckPage(page, kind, limit, interpreter, device, interpreter2, device2)
+        except Exception as e:
+            rec["error"] = ErrorText(e)
+        #end try
+        rec["time"] = time.perf_counter() - t0
+        records.append(rec)
+    #next
+    return records
+#end def
+
+def MakeBookPdf(filename, limit, pageNo, pageResultData, pageResultData2):
+    CT = _worker["CheckTool"]
+    CloseBook(filename)
+    from PdfInput import PdfSource
+    source = PdfSource(filename)
+    try:
+        out_file = _worker["MemberCheck01"].MakeOutFileName(filename, limit)
+        ok = CT.MakeResultPdf(source, out_file, limit, source.PaperSizes(), pageNo, pageResultData, pageResultData2)
+    finally:
+        source.close()
+    #end try
+    return ok, out_file
+#end def
+
+def ReadElements(filename, strategy=None):
+    # strategy : ChartEngine の読取り方式（None は ChartEngine の既定の方式）
+    if not "ChartEngine" in _worker:
+        import ChartEngine
+        _worker["ChartEngine"] = ChartEngine
+    #end if
+    return _worker["ChartEngine"].ReadElements(filename, strategy=strategy)
+#end def
+
+
+#============================================================================
+#  計算書ごとの進み具合を管理し、ページ単位の仕事をプールに投入するクラス
+#============================================================================
+
+class BatchCheck():
+
+    def __init__(self, workers=2, limit=0.95, stpage=0, edpage=0, chunk=DEFAULT_CHUNK,
+                 tool="check", quiet=False, emit=None, model=None, costlog=None, strategy=None):
+        self.workers = workers
+        self.limit = limit
+        self.stpage = stpage
+        self.edpage = edpage
+        self.chunk = max(1, chunk)
+        self.tool = tool
+        self.strategy = strategy    # 断面リストの読取り方式（tool="elements" の場合）
+        self.quiet = quiet
+        self.emit = emit or self.PrintResult
+        self.model = model or LoadCostModel(None)
+        self.costlog = costlog      # ページごとの処理時間の記録（CostLog）
+        self.lock = threading.RLock()
+        self.done = threading.Condition(self.lock)
+        self.remaining = 0
+        self.pool = None
+    #end def
+
+    def PrintResult(self, result):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+    #end def
+
+    #==================================================================================
+    #   一括処理のメインルーチン
+    #==================================================================================
+
+    def Run(self, files):
+        books, errors = GroupBooks(files)
+        for result in errors:
+            self.emit(result)
+        #next
+        if len(books) == 0:
+            return
+        #end if
+
+        self.remaining = len(books)
+        self.pool = PageScheduler(processes=self.workers, initializer=InitWorker, initargs=(self.quiet,))
+        try:
+            for book in books:
+                book["t0"] = time.time()
+                # ページ数が分かるまではファイルサイズを重みの代わりにする
+                if self.tool == "elements":
+                    self.Submit(book, ReadElements, (book["file"], self.strategy), self.ElementsDone, book["size"])
+                else:
+                    self.Submit(book, ScanBook, (book["file"], self.stpage, self.edpage), self.ScanDone, book["size"])
+                #end if
+            #next
+            with self.done:
+                while self.remaining > 0:
+                    self.done.wait()
+                #end while
+            #end with
+        finally:
+            self.pool.close()
+            self.pool.join()
+        #end try
+    #end def
+
+    def Submit(self, book, func, args, callback, weight=1.0):
+        def ok(result):
+            with self.lock:
+                try:
+                    callback(book, result)
+                except Exception as e:
+                    traceback.print_exc()
+                    self.Finish(book, {"ok": False, "error": ErrorText(e)})
+                #end try
+            #end with
+        #end def
+
+        def failed(e):
+            with self.lock:
+                self.Finish(book, {"ok": False, "error": ErrorText(e)})
+            #end with
+        #end def
+
+        self.pool.apply_async(func, args, callback=ok, error_callback=failed, weight=weight, group=book["sha256"])
+    #end def
+
+    #==================================================================================
+    #   計算書の処理が終わった時に結果を出力する関数（重複ファイルにも同じ結果を返す）
+    #==================================================================================
+
+    def Finish(self, book, result):
+        if book.get("finished"):
+            return
+        #end if
+        book["finished"] = True
+        result = dict(result)
+        result["time"] = round(time.time() - book["t0"], 3)
+        first = {"file": book["file"], "sha256": book["sha256"]}
+        first.update(result)
+        self.emit(first)
+        for filename in book["duplicates"]:
+            dup = {"file": filename, "sha256": book["sha256"], "duplicate_of": book["file"]}
+            dup.update(result)
+            self.emit(dup)
+        #next
+        self.remaining -= 1
+        self.done.notify_all()
+    #end def
+
+    def ElementsDone(self, book, result):
+        self.Finish(book, {"ok": True, "result": result})
+    #end def
+
+    #==================================================================================
+    #   表紙の読取りが終わった計算書のページを仕事に分けて投入する関数
+    #==================================================================================
+
+    def ScanDone(self, book, info):
+        book.update(info)
+        book["records"] = {}
+        book["weights"] = [PageWeight(f, self.model) for f in info["features"]]
+        pages = list(range(info["startpage"], info["endpage"] + 1))
+        chunks = self.MakeChunks(book, pages)
+        book["pending"] = len(chunks)
+        if len(chunks) == 0:
+            self.PagesDone(book)
+            return
+        #end if
+        for pages in chunks:
+            self.Submit(book, CheckPages, (book["file"], book["kind"], self.limit, pages), self.ChunkDone,
+                        self.ChunkWeight(book, pages))
+        #next
+    #end def
+
+    def ChunkWeight(self, book, pages):
+        return sum(book["weights"][p - 1] for p in pages)
+    #end def
+
+    def MakeChunks(self, book, pages):
+        # 連続したページを、重みの合計がそろうようにまとめる（軽いページはまとめ、重いページは単独にする）
+        total = self.ChunkWeight(book, pages)
+        target = total / float(self.workers * SPLIT_FACTOR) if total > 0 else 0.0
+        chunks = []
+        chunk = []
+        weight = 0.0
+        for p in pages:
+            w = book["weights"][p - 1]
+            if len(chunk) > 0 and (weight + w > target or len(chunk) >= self.chunk):
+                chunks.append(chunk)
+                chunk = []
+                weight = 0.0
+            #end if
+            chunk.append(p)
+            weight += w
+        #next
+        if len(chunk) > 0:
+            chunks.append(chunk)
+        #end if
+        return chunks
+    #end def
+
+    def ChunkDone(self, book, records):
+        for rec in records:
+            book["records"][rec["page"]] = rec
+            if self.costlog is not None and "time" in rec:
+                self.costlog.Write(book["file"], rec["page"], rec.get("mode", ""), book["features"][rec["page"] - 1],
+                                   book["weights"][rec["page"] - 1], rec["time"])
+            #end if
+        #next
+        book["pending"] -= 1
+        if book["pending"] == 0:
+            self.PagesDone(book)
+        #end if
+    #end def
+
+    #==================================================================================
+    #   1回目の処理が終わった計算書の検定表のページを投入する関数
+    #==================================================================================
+
+    def PagesDone(self, book):
+        records = book["records"]
+        deferred = [p for p in sorted(records) if records[p].get("deferred") and not "error" in records[p]]
+        if len(deferred) == 0 or book.get("phase2"):
+            self.Annotate(book)
+            return
+        #end if
+        book["phase2"] = True
+
+        # 部材データを作るページを挟まない連続した検定表のページを1つの仕事にまとめる
+        producers = [p for p in sorted(records) if "member" in records[p]]
+        groups = []
+        for p in deferred:
+            if len(groups) > 0:
+                last = groups[-1]
+                between = [q for q in producers if last[-1] < q < p]
+                if len(between) == 0 and len(last) < self.chunk:
+                    last.append(p)
+                    continue
+                #end if
+            #end if
+            groups.append([p])
+        #next
+
+        book["pending"] = len(groups)
+        for group in groups:
+            member = [records[q]["member"] for q in producers if q < group[0]]
+            self.Submit(book, CheckDeferredPages, (book["file"], book["kind"], self.limit, group, member),
+                        self.ChunkDone, self.ChunkWeight(book, group))
+        #next
+    #end def
+
+    #==================================================================================
+    #   全ページの結果を集めて検出結果のPDFを作成する関数
+    #==================================================================================
+
+    def Annotate(self, book):
+        records = book["records"]
+        errors = ["page {}: {}".format(p, records[p]["error"]) for p in sorted(records) if "error" in records[p]]
+        if len(errors) > 0:
+            # 1ページでも失敗した場合は、CheckTool と同じく計算書全体を失敗とする
+            self.Finish(book, {"ok": False, "kind": book["kind"], "version": book["version"],
+                               "pages": book["PageMax"], "error": "; ".join(errors)})
+            return
+        #end if
+
+        pageNo = [1]            # 表紙には検索結果の見出しを印字する
+        pageResultData = [[]]
+        pageResultData2 = [[]]
+        hits = 0
+        for p in sorted(records):
+            if not "result" in records[p]:
+                continue
+            #end if
+            pageFlag, ResultData, pageFlag2, ResultData2 = records[p]["result"]
+            if pageFlag or pageFlag2:
+                pageNo.append(p)
+                pageResultData.append(ResultData if pageFlag else [])
+                pageResultData2.append(ResultData2 if pageFlag2 else [])
+                if pageFlag:
+                    hits += len(ResultData)
+                #end if
+            #end if
+        #next
+        book["hits"] = hits
+        book["found"] = len(pageNo) - 1
+        self.Submit(book, MakeBookPdf, (book["file"], self.limit, pageNo, pageResultData, pageResultData2),
+                    self.PdfDone, self.ChunkWeight(book, pageNo) / 10.0)
+    #end def
+
+    def PdfDone(self, book, result):
+        ok, out_file = result
+        self.Finish(book, {"ok": bool(ok), "kind": book["kind"], "version": book["version"],
+                           "pages": book["PageMax"], "found_pages": book["found"],
+                           "hits": book["hits"], "output": out_file})
+    #end def
+#end class
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="構造計算書の一括チェック")
+    parser.add_argument("target", help="計算書のフォルダ、またはPDFのパスを1行ずつ書いたリストファイル")
+    parser.add_argument("--tool", choices=["check", "elements"], default="check",
+                        help="check: 検定比のチェック  elements: 断面リストの読取り")
+    parser.add_argument("--strategy", help="elements の読取り方式（ChartEngine.STRATEGIES。省略時は既定の方式）")
+    parser.add_argument("--limit", type=float, default=0.95, help="検定比の閾値")
+    parser.add_argument("--stpage", type=int, default=0, help="検索を開始するページ")
+    parser.add_argument("--edpage", type=int, default=0, help="検索を終了するページ")
+    parser.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() - 1),
+                        help="ワーカープロセスの数")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="1回の仕事で処理するページ数の上限")
+    parser.add_argument("--cost-model", help="ページの重みの係数（PageScheduler.py fit で作成したJSON）")
+    parser.add_argument("--cost-log", help="ページごとの見積りと処理時間を追記するCSVファイル")
+    parser.add_argument("--out", help="結果を追記するJSON行ファイル（省略時は標準出力）")
+    parser.add_argument("--quiet", action="store_true", help="ワーカーの print 出力を破棄する")
+    args = parser.parse_args(argv)
+
+    files = CollectFiles(args.target)
+    fout = None
+    emit = None
+    if args.out:
+        fout = open(args.out, "a", encoding="utf-8")
+
+        def WriteResult(result):
+            fout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            fout.flush()
+        #end def
+
+        emit = WriteResult
+    #end if
+
+    costlog = CostLog(args.cost_log) if args.cost_log else None
+
+    try:
+        batch = BatchCheck(workers=args.workers, limit=args.limit, stpage=args.stpage, edpage=args.edpage,
+                           chunk=args.chunk, tool=args.tool, quiet=args.quiet, emit=emit,
+                           model=LoadCostModel(args.cost_model), costlog=costlog, strategy=args.strategy)
+        batch.Run(files)
+    finally:
+        if fout is not None:
+            fout.close()
+        #end if
+        if costlog is not None:
+            costlog.close()
+        #end if
+    #end try
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#==========================================================================================
+#   ページ数・表の密度に対する処理時間のスケーリングの計測
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+MakeSampleBook で大きさの異なる合成計算書を作成し、CheckTool.CheckTool と
+ChartEngine.ReadElements（既定の読取り方式）の処理時間・スループット（ページ/秒、文字/秒）・最大メモリを計測する。
+
+    python BenchScale.py                                  # 既定の大きさ（20,50,100ページ）
+    python BenchScale.py --pages 50,200,800 --rows 20,60 --grid 4x6 --json bench.json
+    python BenchScale.py --tools check --repeat 3
+
+・計測は1回ごとに新しいプロセス（spawn）で行い、import の時間を除いた処理時間と、
+  そのプロセスの最大常駐メモリ（ru_maxrss）を記録する（前回の計測のメモリが残らないようにするため）。
+・フォントは ./Fonts を使う（無い場合は組み込みのフォントで代用する。FontSetup.RegisterFonts(fallback=True)）。合成計算書は一時フォルダに作成する。
+・繰り返して計測しても毎回すべてのページを処理するように、ページの種類の索引（PageIndex）は使わない。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+from MakeSampleBook import MakeSampleBook, ParseGrid
+
+TOOLS = ("check", "elements")
+
+
+#============================================================================
+#  新しいプロセスで1回の処理を実行する関数
+#============================================================================
+
+def MaxRss():
+    # 最大常駐メモリ（MB）。resource が無い環境（Windows）では0
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    #end try
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / (1024.0 * 1024.0)
+    #end if
+    return rss / 1024.0
+#end def
+
+def RunOne(tool, filename, limit):
+    sys.stdout = open(os.devnull, "w")
+    import EventLog
+    EventLog.SetConsole(None)
+    # 合成計算書の計測なので、./Fonts が無い環境でも組み込みのフォントで続ける
+    from FontSetup import RegisterFonts
+    RegisterFonts(fallback=True)
+    if tool == "check":
+        import MemberCheck01
+        CT = MemberCheck01.CheckTool()
+        CT.UsePageIndex = False     # 毎回すべてのページを判定する
+        CT.UseJournal = False       # 途中経過を記録しない
+    else:
+        import ChartEngine
+    #end if
+    baseRss = MaxRss()
+
+    time_sta = time.perf_counter()
+    cpu_sta = time.process_time()
+    if tool == "check":
+        ok = bool(CT.CheckTool(filename, limit=limit))
+    else:
+        elements = ChartEngine.ReadElements(filename, index=False)
+        ok = elements is not None
+    #end if
+    return {"ok": ok, "time": time.perf_counter() - time_sta, "cpu": time.process_time() - cpu_sta,
+            "base_rss": baseRss, "peak_rss": MaxRss()}
+#end def
+
+def Measure(tool, filename, limit):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(RunOne, (tool, filename, limit))
+    #end with
+#end def
+
+
+#============================================================================
+#  大きさの組合せごとに計測する関数
+#============================================================================
+
+def BenchScale(pages=(20, 50, 100), rows=(30,), grids=((4, 6),), tools=TOOLS, repeat=1,
+               limit=0.95, seed=0, workdir=None, report=None):
+    results = []
+    tmp = workdir or tempfile.mkdtemp(prefix="benchscale_")
+    try:
+        for n in pages:
+            for r in rows:
+                for g in grids:
+                    filename = os.path.join(tmp, "sample_{}p_{}r_{}x{}.pdf".format(n, r, g[0], g[1]))
+                    info = MakeSampleBook(filename, pages=n, rows=r, grid=g, seed=seed)
+                    size = os.path.getsize(filename)
+                    for tool in tools:
+                        runs = [Measure(tool, filename, limit) for i in range(repeat)]
+                        t = statistics.median([run["time"] for run in runs])
+                        result = {"tool": tool, "pages": info["pages"], "rows": r, "grid": "{}x{}".format(*g),
+                                  "glyphs": info["glyphs"], "rules": info["rules"], "bytes": size,
+                                  "ok": all(run["ok"] for run in runs),
+                                  "time": t, "cpu": statistics.median([run["cpu"] for run in runs]),
+                                  "pages_per_sec": info["pages"] / t if t > 0 else 0.0,
+                                  "glyphs_per_sec": info["glyphs"] / t if t > 0 else 0.0,
+                                  "base_rss_mb": max(run["base_rss"] for run in runs),
+                                  "peak_rss_mb": max(run["peak_rss"] for run in runs)}
+                        results.append(result)
+                        if report is not None:
+                            report(result)
+                        #end if
+                    #next
+                #next
+            #next
+        #next
+    finally:
+        if workdir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+        #end if
+    #end try
+    return results
+#end def
+
+def PrintResult(result):
+    print("{tool:<8} {pages:>6} {rows:>5} {grid:>6} {glyphs:>9} {time:>9.2f} {pages_per_sec:>8.2f} "
+          "{glyphs_per_sec:>10.0f} {peak_rss_mb:>8.1f} {ok}".format(**result))
+    sys.stdout.flush()
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def IntList(text):
+    return tuple(int(v) for v in text.split(","))
+#end def
+
+def GridList(text):
+    return tuple(ParseGrid(v) for v in text.split(","))
+#end def
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ページ数・表の密度に対する処理時間のスケーリングの計測")
+    parser.add_argument("--pages", type=IntList, default=(20, 50, 100), help="ページ数（カンマ区切り）")
+    parser.add_argument("--rows", type=IntList, default=(30,), help="検定表の行数（カンマ区切り）")
+    parser.add_argument("--grid", type=GridList, default=((4, 6),), help="断面リストの大きさ 行x列（カンマ区切り）")
+    parser.add_argument("--tools", default=",".join(TOOLS), help="計測する処理 check,elements")
+    parser.add_argument("--repeat", type=int, default=1, help="繰返し回数（中央値を採用）")
+    parser.add_argument("--limit", type=float, default=0.95, help="CheckTool の検定比の閾値")
+    parser.add_argument("--seed", type=int, default=0, help="合成計算書の乱数の種")
+    parser.add_argument("--keep", help="合成計算書を残すフォルダ（省略時は一時フォルダを削除）")
+    parser.add_argument("--json", help="結果を保存するJSONファイル")
+    args = parser.parse_args(argv)
+
+    tools = tuple(t for t in args.tools.split(",") if t)
+    for t in tools:
+        if not t in TOOLS:
+            parser.error("不明な処理: {}".format(t))
+        #end if
+    #next
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+    #end if
+
+    print("{:<8} {:>6} {:>5} {:>6} {:>9} {:>9} {:>8} {:>10} {:>8} {}".format(
+        "tool", "pages", "rows", "grid", "glyphs", "time[s]", "pages/s", "glyphs/s", "rss[MB]", "ok"))
+    results = BenchScale(pages=args.pages, rows=args.rows, grids=args.grid, tools=tools, repeat=args.repeat,
+                         limit=args.limit, seed=args.seed, workdir=args.keep, report=PrintResult)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=1)
+        #end with
+    #end if
+    return 0 if all(r["ok"] for r in results) else 1
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+#==========================================================================================
+#   断面リストの表読取りエンジン（ReadChart・ReadChart2・ReadChartByChar の統合）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+ReadChart（テキストボックス）、ReadChart2（テキストボックス＋1文字ずつ）、ReadChartByChar（1文字ずつ）の
+ChartReader.ChartDevider を「読取り方式（strategy）」として切り替えて使う、共通のページ処理ループ。
+
+・PDFは PdfSource で一度だけ開き、pdfminer のツールは1組だけ作る。
+  従来の各 Read_Elements_from_pdf は ChartDevider の前にも process_page を呼んでいたが、
+  ChartDevider（MakeChar）がページを解釈し直すので、このループでは呼ばない（各ページの解釈が1回減る）。
+・読取り方式ごとに ChartReader の属性（罫線の正規化 NormalizeRules など）を設定できる。
+・Benchmark で各方式の処理時間と正解CSVとの差分を計測し、正解と一致する方式のうち最も速いものを
+  計算書の系統（family）ごとに選んで STRATEGY_FILE に保存する。ReadElements(pdf, family=...) はその方式を使う。
+・各ページで表を読み取ったかどうかを読取り方式ごとに PageIndex（計算書ごとのページの種類の索引）に記録し、
+  2回目からは同じ方式で表の無かったページの ChartDevider を省略する。
+・PageBudget（PageWatchdog.PageBudget）を設定すると、重いページを監視付きの子プロセスで読み取り、
+  CPU時間・メモリの上限を超えたページは読み飛ばして skipped に記録する。
+・次の PrefetchDepth ページのストリームを PagePipeline で先読みして展開する（統計は pipeline）。
+
+    import ChartEngine
+    ElementData = ChartEngine.ReadElements("計算書.pdf", strategy="textbox")
+
+    python ChartEngine.py read 計算書.pdf --strategy char-raw --csv 計算書_部材リスト.csv
+    python ChartEngine.py bench --family SS7 計算書.pdf:計算書_部材リスト.csv --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import importlib
+
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.converter import PDFPageAggregator
+
+from PdfInput import PdfSource, TimedPageInterpreter
+import Instrument
+import EventLog
+import PageIndex
+import PageWatchdog
+import PagePipeline
+
+# 読み取るページの種類と部材の種類（従来の Read_Elements_from_pdf と同じ）
+PAGE_KIND = ["構造計算書", "断面リスト"]
+ELEMENT_KIND = ["【大梁】", "【基礎大梁】", "【柱】"]
+
+# 読取り方式 : (モジュール, ChartDevider の引数の形式, ChartReader に設定する属性)
+#   "single" : ChartDevider(interpreter2, device2, page, PageKind, EKind)
+#   "pair"   : ChartDevider(interpreter, device, interpreter2, device2, page, PageKind, EKind)
+STRATEGIES = {
+    "textbox":  ("ReadChart", "single", {}),
+    "textbox2": ("ReadChart2", "pair", {}),
+    "char":     ("ReadChartByChar", "pair", {"NormalizeRules": True}),
+    "char-raw": ("ReadChartByChar", "pair", {"NormalizeRules": False}),
+}
+# 既定はテキストボックス方式（1文字ずつの方式は表の構造の推定が未完成で、見本の計算書では部材を読み取れない）
+DEFAULT_STRATEGY = "textbox"
+
+# 系統ごとに選んだ読取り方式の保存先
+STRATEGY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chart_strategy.json")
+
+
+#============================================================================
+#  読取り方式の選択結果の読み書き
+#============================================================================
+
+def LoadStrategies(filename=STRATEGY_FILE):
+    if filename and os.path.exists(filename):
+        try:
+            with open(filename, encoding="utf-8") as fp:
+                return json.load(fp)
+            #end with
+        except ValueError:
+            return {}
+        #end try
+    #end if
+    return {}
+#end def
+
+def SaveStrategy(family, strategy, results, filename=STRATEGY_FILE):
+    data = LoadStrategies(filename)
+    data[family] = {"strategy": strategy, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, ensure_ascii=False, indent=1)
+    #end with
+    os.replace(tmp, filename)
+#end def
+
+def StrategyFor(family, filename=STRATEGY_FILE):
+    entry = LoadStrategies(filename).get(family)
+    if entry and entry.get("strategy") in STRATEGIES:
+        return entry["strategy"]
+    #end if
+    return DEFAULT_STRATEGY
+#end def
+
+
+#============================================================================
+#  表読取りエンジン
+#============================================================================
+
+class ChartEngine():
+
+    def __init__(self, strategy=DEFAULT_STRATEGY, PageKind=PAGE_KIND, EKind=ELEMENT_KIND):
+        if not strategy in STRATEGIES:
+            raise ValueError("不明な読取り方式: {}".format(strategy))
+        #end if
+        self.strategy = strategy
+        self.PageKind = list(PageKind)
+        self.EKind = list(EKind)
+        # ページの種類の索引を使うかどうかと、索引を保存するフォルダ（None の場合は計算書と同じフォルダ）
+        self.UsePageIndex = True
+        self.IndexDir = None
+        # 1ページの処理時間とメモリの上限（None の場合は隔離しない）と、上限を超えて読み飛ばしたページ
+        self.PageBudget = None
+        self.skipped = []
+        # 先読みするページ数（0 の場合は先読みしない）と、前回の読取りの先読みの統計
+        self.PrefetchDepth = PagePipeline.DEPTH
+        self.pipeline = None
+        moduleName, self.style, options = STRATEGIES[strategy]
+        module = importlib.import_module(moduleName)
+        self.reader = module.ChartReader()
+        for key, value in options.items():
+            setattr(self.reader, key, value)
+        #next
+        self.MakeTools()
+    #end def
+
+    def MakeTools(self):
+        resourceManager = PDFResourceManager()
+        # PDFから単語を取得するためのデバイス
+        self.device = PDFPageAggregator(resourceManager, laparams=LAParams())
+        # PDFから１文字ずつを取得するためのデバイス
+        self.device2 = PDFPageAggregator(resourceManager)
+        self.interpreter = TimedPageInterpreter(resourceManager, self.device)
+        self.interpreter2 = TimedPageInterpreter(resourceManager, self.device2)
+    #end def
+
+    def Devide(self, page):
+        if self.style == "single":
+            return self.reader.ChartDevider(self.interpreter2, self.device2, page, self.PageKind, self.EKind)
+        #end if
+        return self.reader.ChartDevider(self.interpreter, self.device, self.interpreter2, self.device2,
+                                        page, self.PageKind, self.EKind)
+    #end def
+
+    def DevideSupervised(self, watchdog, pdf_path, pageN, page):
+        # 重いページは監視付きの子プロセスで読み取る（上限を超えた場合は (None, {}) を返す）
+        risky = False
+        if watchdog is not None:
+            risky, features = watchdog.budget.Risky(page)
+        #end if
+        if not risky:
+            return self.Devide(page)
+        #end if
+        status, value, diag = watchdog.Call(PageWatchdog.ChartPageTask,
+                                            (pdf_path, pageN, self.strategy, self.PageKind, self.EKind))
+        if status == "ok":
+            return value
+        #end if
+        if status == "error":
+            raise RuntimeError(value)
+        #end if
+        skip = dict(diag, page=pageN, reason=status)
+        skip.update(features)
+        self.skipped.append(skip)
+        EventLog.Error("skip", **skip)
+        Instrument.Count("pages_over_budget")
+        return None, {}
+    #end def
+
+    #==================================================================================
+    #   PDFの断面リストを読み取る関数（断面リストのページが終わったら読取りを止める）
+    #==================================================================================
+
+    def Read(self, pdf_path):
+        ElementData = {}
+        for EK in self.EKind:
+            ElementData[EK] = {}
+        #next
+        stopFlag = False
+        with PdfSource(pdf_path) as source:
+            index = None
+            if self.UsePageIndex:
+                index = PageIndex.Open(source, pdf_path, self.IndexDir)
+            #end if
+            watchdog = None
+            if self.PageBudget is not None:
+                watchdog = PageWatchdog.PageWatchdog(self.PageBudget)
+            #end if
+            self.skipped = []
+            pipeline = None
+            if self.PrefetchDepth > 0:
+                # 前回、同じ読取り方式で表が無かったページは展開しない
+                pipeline = PagePipeline.PagePipeline(source, self.PrefetchDepth,
+                                                     lambda n: index is None or index.ChartFound(n, self.strategy) is not False)
+                pages = pipeline
+            else:
+                pages = enumerate(source.GetPages(), 1)
+            #end if
+            # ページごとの計測値を計算書ごとに分ける（呼び出し側の計算書は終わったら戻す）
+            document = Instrument.CurrentDocument()
+            Instrument.SetDocument(pdf_path)
+            try:
+                for pageN, page in pages:
+                    Instrument.SetPage(pageN)
+                    EventLog.Debug("page")
+                    if index is not None and index.ChartFound(pageN, self.strategy) is False:
+                        # 前回、同じ読取り方式で表が無かったページ
+                        Instrument.Count("pages_indexed")
+                        dflag = False
+                    else:
+                        dflag, element = self.DevideSupervised(watchdog, pdf_path, pageN, page)
+                        if dflag is None:
+                            # 上限を超えて読み飛ばしたページ（索引には記録せず、表の有無の判断にも使わない。
+                            # 断面リストの途中のページでも読取りを止めずに次のページへ進む）
+                            continue
+                        #end if
+                        if index is not None:
+                            index.RecordChart(pageN, self.strategy, dflag,
+                                              tables=[EK for EK in self.EKind if dflag and len(element[EK]) > 0])
+                        #end if
+                    #end if
+                    if dflag :
+                        for EK in self.EKind:
+                            if len(element[EK])>0:
+                                ElementData[EK]= ElementData[EK] | element[EK]
+                            #end if
+                        #next
+                        stopFlag = True
+                    else:
+                        if stopFlag:
+                            break
+                        #end if
+                    #end if
+                #next
+            finally:
+                Instrument.SetPage(None)
+                Instrument.SetDocument(document)
+                if index is not None:
+                    index.SaveQuietly()
+                #end if
+                if watchdog is not None:
+                    watchdog.close()
+                #end if
+                if pipeline is not None:
+                    pipeline.close()
+                    self.pipeline = pipeline.Stats()
+                #end if
+            #end try
+        #end with
+        return ElementData
+    #end def
+
+    def close(self):
+        self.device.close()
+        self.device2.close()
+    #end def
+#end class
+
+
+#============================================================================
+#  断面リストを読み取る関数（読取り方式または系統を指定）
+#============================================================================
+
+def ReadElements(pdf_path, strategy=None, family=None, index=True):
+    # index : ページの種類の索引を使うかどうか（計測では毎回すべてのページを読むので使わない）
+    if strategy is None:
+        strategy = StrategyFor(family) if family else DEFAULT_STRATEGY
+    #end if
+    engine = ChartEngine(strategy)
+    engine.UsePageIndex = index
+    try:
+        return engine.Read(pdf_path)
+    finally:
+        engine.close()
+    #end try
+#end def
+
+
+#============================================================================
+#  読取り方式のベンチマークと選択
+#============================================================================
+
+def Benchmark(samples, strategies=None, repeat=1, report=None):
+    # samples : [(PDF, 正解CSV)]。方式ごとに合計の処理時間と正解との不一致の数を返す
+    from ReadChartByChar import ElementCsvRows
+    from GoldenCheck import ReadCsvRows, DiffRows
+
+    results = {}
+    for strategy in (strategies or list(STRATEGIES)):
+        total = 0.0
+        mismatches = 0
+        pages = 0
+        for pdf_file, csv_file in samples:
+            times = []
+            for i in range(max(repeat, 1)):
+                time_sta = time.perf_counter()
+                ElementData = ReadElements(pdf_file, strategy=strategy, index=False)
+                times.append(time.perf_counter() - time_sta)
+            #next
+            diffs, ncells = DiffRows(ReadCsvRows(csv_file), ElementCsvRows(ElementData))
+            total += statistics.median(times)
+            mismatches += len(diffs)
+            with PdfSource(pdf_file) as source:
+                pages += source.PageCount()
+            #end with
+        #next
+        results[strategy] = {"seconds": round(total, 4), "pages": pages,
+                             "pages_per_sec": round(pages / total, 4) if total > 0 else 0.0,
+                             "mismatches": mismatches, "match": mismatches == 0}
+        if report is not None:
+            report(strategy, results[strategy])
+        #end if
+    #next
+    return results
+#end def
+
+def SelectStrategy(results):
+    # 正解と一致する方式のうち最も速いもの（一致する方式が無い場合は None）
+    matched = [(r["seconds"], name) for name, r in results.items() if r["match"]]
+    if len(matched) == 0:
+        return None
+    #end if
+    return min(matched)[1]
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    from GoldenCheck import ParseSample
+
+    parser = argparse.ArgumentParser(description="断面リストの表読取りエンジン")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("read", help="断面リストを読み取る")
+    p.add_argument("pdf")
+    p.add_argument("--strategy", choices=sorted(STRATEGIES), help="読取り方式")
+    p.add_argument("--family", help="保存した選択結果を使う系統")
+    p.add_argument("--csv", help="部材リストのCSVの出力先（省略時は <PDF名>_部材リスト.csv）")
+
+    p = sub.add_parser("bench", help="読取り方式のベンチマークと選択")
+    p.add_argument("samples", nargs="+", type=ParseSample, help="PDF[:正解CSV]")
+    p.add_argument("--family", default="default", help="選択結果を保存する系統の名前")
+    p.add_argument("--strategies", default=",".join(STRATEGIES), help="比較する方式（カンマ区切り）")
+    p.add_argument("--repeat", type=int, default=1, help="繰返し回数（処理時間は中央値）")
+    p.add_argument("--dry-run", action="store_true", help="選択結果を保存しない")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "read":
+        from ReadChartByChar import WriteElementCsv
+
+        ElementData = ReadElements(args.pdf, strategy=args.strategy, family=args.family)
+        filename = args.csv or os.path.splitext(args.pdf)[0] + "_部材リスト.csv"
+        WriteElementCsv(ElementData, filename)
+        print(filename)
+        return 0
+    #end if
+
+    strategies = [s for s in args.strategies.split(",") if s]
+    for s in strategies:
+        if not s in STRATEGIES:
+            parser.error("不明な読取り方式: {}".format(s))
+        #end if
+    #next
+
+    def PrintResult(strategy, r):
+        print("{:<10} {:>8.2f} 秒 {:>7.2f} ページ/秒  不一致 {}".format(
+            strategy, r["seconds"], r["pages_per_sec"], r["mismatches"]), file=sys.stderr)
+    #end def
+
+    results = Benchmark(args.samples, strategies=strategies, repeat=args.repeat, report=PrintResult)
+    best = SelectStrategy(results)
+    if best is None:
+        print("正解と一致する読取り方式がありません（選択結果は変更しません）", file=sys.stderr)
+        return 1
+    #end if
+    print("系統 {} : {}".format(args.family, best), file=sys.stderr)
+    if not args.dry_run:
+        SaveStrategy(args.family, best, results)
+    #end if
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#==========================================================================================
+#   常駐型のチェックサーバー（ウォームワーカーによる繰り返し実行）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+CheckTool（検定比のチェック）と ChartReader（断面リストの読取り）を常駐プロセスで待機させ、
+ジョブごとの python MemberCheck01.py の起動・import・フォント登録・makePattern のコストを省くサーバー。
+
+ジョブは1行1件のJSONで受け付け、結果も1行1件のJSONで返す。
+
+    python CheckServer.py --stdin --workers 4            # 標準入力から受付
+    python CheckServer.py --socket /tmp/membercheck.sock # ローカルのUNIXソケットで受付
+    python CheckServer.py --port 8765                    # 127.0.0.1 のTCPポートで受付
+    python CheckServer.py --stdin --workers 8 --threads  # 1つのプロセスのスレッドで同時に実行
+
+ジョブの例
+    {"id": 1, "tool": "check", "file": "計算書.pdf", "limit": 0.95, "stpage": 2, "edpage": 0}
+    {"id": 2, "tool": "elements", "file": "断面リスト.pdf"}
+    {"id": 3, "tool": "elements", "file": "断面リスト.pdf", "strategy": "textbox2"}   # 省略時は ChartEngine の既定の方式
+
+結果の例
+    {"id": 1, "ok": true, "result": {"output": "計算書[検出結果(閾値=0.95)].pdf", "kind": "SuperBuild/SS7",
+                                     "version": "1.1.1.17", "pages": [12, 13], "hits": 5}, "time": 1.23}
+    {"id": 2, "ok": false, "error": "FileNotFoundError: ...", "time": 0.01}
+
+ワーカーの print 出力は結果のJSONと混ざらないよう標準エラーに回す（--quiet で破棄）。
+
+--threads では、ワーカープロセスを作らずにこのプロセスのスレッドプールでジョブを実行する。
+CheckTool はスレッドごとに作り、実行ごとの状態は CheckResult に持つので、同時に実行しても結果は混ざらない。
+（処理は GIL で直列化されるので、CPUを使い切るにはプロセスのワーカーの方が速い。
+  起動の速さ・メモリの少なさを優先するWebのバックエンド向け）
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+import socketserver
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# ワーカープロセスごとに保持するインスタンス
+_worker = {}
+
+
+#============================================================================
+#  ワーカープロセスの初期化（import・フォント登録・パターン作成を一度だけ行う）
+#============================================================================
+
+def InitWorker(quiet):
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+        # 進捗を捨てる場合はイベントの整形も行わない
+        import EventLog
+        EventLog.SetConsole(None)
+    else:
+        sys.stdout = sys.stderr
+    #end if
+
+    import MemberCheck01
+    from FontSetup import RegisterFonts
+
+    try:
+        RegisterFonts()
+    except Exception:
+        # フォントが無い場合でも読取りのジョブは実行できるので、ここでは止めない
+        traceback.print_exc()
+    #end try
+
+    # このスレッドの CheckTool を作っておく（makePattern を最初のジョブの前に済ませる）
+    MemberCheck01.ThreadCheckTool()
+    _worker["MemberCheck01"] = MemberCheck01
+#end def
+
+
+def GetChartEngine():
+    # ChartEngine（断面リストの読取り）は断面リストのジョブが来た時に初めて読み込む
+    if not "ChartEngine" in _worker:
+        import ChartEngine
+        _worker["ChartEngine"] = ChartEngine
+    #end if
+    return _worker["ChartEngine"]
+#end def
+
+
+#============================================================================
+#  1件のジョブを実行する関数（ワーカープロセスで実行）
+#============================================================================
+
+def RunJob(job):
+    t0 = time.time()
+    reply = {"id": job.get("id")}
+    try:
+        tool = job.get("tool", "check")
+        filename = job["file"]
+        if not os.path.isfile(filename):
+            raise FileNotFoundError(filename)
+        #end if
+        if tool == "check":
+            # スレッドごとの CheckTool で実行（プロセスのワーカーではスレッドは1つ）
+            result = _worker["MemberCheck01"].CheckOne(job)
+            reply["ok"] = result.ok
+            reply["result"] = {"output": result.out_file, "kind": result.kind, "version": result.version,
+                               "pages": result.pageNo, "hits": result.hits}
+            if result.error is not None:
+                reply["error"] = result.error
+            #end if
+        elif tool == "elements":
+            engine = GetChartEngine()
+            reply["result"] = engine.ReadElements(filename, strategy=job.get("strategy"))
+            reply["ok"] = True
+        else:
+            raise ValueError("unknown tool: {}".format(tool))
+        #end if
+    except Exception as e:
+        reply["ok"] = False
+        reply["error"] = "{}: {}".format(type(e).__name__, e)
+    #end try
+    reply["time"] = round(time.time() - t0, 3)
+    return reply
+#end def
+
+
+#============================================================================
+#  ワーカープールとジョブキューを管理するクラス
+#============================================================================
+
+class PendingJobs():
+    # 投入済みで結果を返していないジョブの数（サーバー全体と、接続ごとに持つ）
+
+    def __init__(self):
+        self.count = 0
+        self.cond = threading.Condition()
+    #end def
+
+    def Add(self):
+        with self.cond:
+            self.count += 1
+        #end with
+    #end def
+
+    def Done(self):
+        with self.cond:
+            self.count -= 1
+            self.cond.notify_all()
+        #end with
+    #end def
+
+    def Wait(self):
+        with self.cond:
+            while self.count > 0:
+                self.cond.wait()
+            #end while
+        #end with
+    #end def
+#end class
+
+
+class CheckServer():
+
+    def __init__(self, workers=2, quiet=False, maxtasks=None, threads=False):
+        self.workers = workers
+        self.stdout = sys.stdout
+        if threads:
+            # このプロセスで一度だけ初期化し、スレッドプールで実行する
+            InitWorker(quiet)
+            self.pool = ThreadPool(processes=workers)
+        else:
+            self.pool = multiprocessing.Pool(processes=workers, initializer=InitWorker,
+                                             initargs=(quiet,), maxtasksperchild=maxtasks)
+        #end if
+        self.pending = PendingJobs()
+    #end def
+
+    #==================================================================================
+    #   ジョブをキューに投入する関数（結果は reply(dict) で非同期に返す）
+    #==================================================================================
+
+    def Submit(self, job, reply, pending=None):
+        # pending : 接続ごとの PendingJobs（その接続のジョブだけを待つため）
+        counters = [self.pending] if pending is None else [self.pending, pending]
+        for c in counters:
+            c.Add()
+        #next
+
+        def done(result):
+            try:
+                reply(result)
+            finally:
+                for c in counters:
+                    c.Done()
+                #next
+            #end try
+        #end def
+
+        def failed(e):
+            done({"id": job.get("id"), "ok": False, "error": "{}: {}".format(type(e).__name__, e)})
+        #end def
+
+        self.pool.apply_async(RunJob, (job,), callback=done, error_callback=failed)
+    #end def
+
+    def Wait(self):
+        # 投入済みのジョブがすべて終わるまで待つ
+        self.pending.Wait()
+    #end def
+
+    def close(self):
+        self.Wait()
+        self.pool.close()
+        self.pool.join()
+    #end def
+
+    #==================================================================================
+    #   1行のテキストをジョブとして解釈して投入する関数
+    #==================================================================================
+
+    def SubmitLine(self, line, reply, pending=None):
+        line = line.strip()
+        if line == "":
+            return
+        #end if
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or not "file" in job:
+                raise ValueError("job must be an object with a 'file' key")
+            #end if
+        except ValueError as e:
+            reply({"id": None, "ok": False, "error": "{}: {}".format(type(e).__name__, e)})
+            return
+        #end try
+        self.Submit(job, reply, pending)
+    #end def
+
+    #==================================================================================
+    #   標準入力からジョブを受け付ける関数
+    #==================================================================================
+
+    def ServeStdin(self, fin=None, fout=None):
+        fin = fin or sys.stdin
+        fout = fout or self.stdout
+        lock = threading.Lock()
+
+        def reply(result):
+            with lock:
+                fout.write(json.dumps(result, ensure_ascii=False) + "\n")
+                fout.flush()
+            #end with
+        #end def
+
+        for line in fin:
+            self.SubmitLine(line, reply)
+        #next
+        self.Wait()
+    #end def
+
+    #==================================================================================
+    #   ソケット（UNIXソケットまたは127.0.0.1のTCP）でジョブを受け付ける関数
+    #==================================================================================
+
+    def ServeSocket(self, path=None, port=None):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+                pending = PendingJobs()
+
+                def reply(result):
+                    with lock:
+                        try:
+                            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+                            self.wfile.flush()
+                        except OSError:
+                            pass    # クライアントが先に切断した場合
+                        #end try
+                    #end with
+                #end def
+
+                for raw in self.rfile:
+                    server.SubmitLine(raw.decode("utf-8"), reply, pending)
+                #next
+                # この接続で投入したジョブの結果を返し終わるまで待つ（他の接続のジョブは待たない）
+                pending.Wait()
+            #end def
+        #end class
+
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)
+            #end if
+            srv = socketserver.ThreadingUnixStreamServer(path, Handler)
+        else:
+            srv = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        #end if
+        srv.daemon_threads = True
+        try:
+            srv.serve_forever()
+        finally:
+            srv.server_close()
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+            #end if
+        #end try
+    #end def
+#end class
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐型のチェックサーバー")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stdin", action="store_true", help="標準入力からJSON行を受け付ける")
+    group.add_argument("--socket", help="UNIXソケットのパス")
+    group.add_argument("--port", type=int, help="127.0.0.1 で待ち受けるTCPポート")
+    parser.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() - 1),
+                        help="ワーカープロセスの数")
+    parser.add_argument("--max-jobs-per-worker", type=int, default=None,
+                        help="この件数を処理したワーカーを入れ替える（メモリ対策）")
+    parser.add_argument("--quiet", action="store_true", help="ワーカーの print 出力を破棄する")
+    parser.add_argument("--threads", action="store_true", help="ワーカープロセスの代わりにスレッドで実行する")
+    args = parser.parse_args(argv)
+
+    server = CheckServer(workers=args.workers, quiet=args.quiet, maxtasks=args.max_jobs_per_worker,
+                         threads=args.threads)
+    try:
+        if args.stdin:
+            server.ServeStdin()
+        else:
+            server.ServeSocket(path=args.socket, port=args.port)
+        #end if
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    #end try
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
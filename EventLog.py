@@ -0,0 +1,285 @@
+#==========================================================================================
+#   構造化イベントログ（JSON lines・バッファ付きの書込みスレッド）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+CheckTool の各ページの処理状況や検出した数値を print() の代わりにイベントとして記録する。
+イベントはキューに入れ、バックグラウンドのスレッドがまとめて出力先（コンソール・JSON linesファイル）へ書き込む。
+標準出力が遅いパイプの場合でも、チェックの処理はブロックされない。
+
+    import EventLog
+    EventLog.Open("events.jsonl", EventLog.DEBUG)     # JSON lines に全イベントを出力
+    EventLog.SetConsole(EventLog.INFO)                # コンソールはページ単位の進捗のみ（既定）
+    EventLog.Info("page", page=3)
+    EventLog.Debug("hit", val=1.02)                   # 検出した数値ごとの記録（既定では出力しない）
+    EventLog.Flush()
+
+・レベルは logging と同じ値（DEBUG=10, INFO=20, WARNING=30, ERROR=40）。
+・出力先のいずれのレベルにも満たないイベントは、レベルの比較だけで戻る（引数の整形もしない）。
+・環境変数 MEMBERCHECK_LOG にファイル名を設定すると JSON lines の出力を、
+  MEMBERCHECK_LOG_LEVEL に DEBUG などを設定するとコンソールのレベルを変更できる。
+・ページ番号は Instrument.SetPage で設定した値をイベントに付ける。
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import queue
+
+import Instrument
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELNAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+_consoleLevel = INFO
+_fileLevel = OFF
+_fileName = None
+_level = INFO       # 出力先のレベルの最小値（これ未満のイベントはすぐに戻る）
+
+_queue = queue.SimpleQueue()
+_writer = None
+_writerLock = threading.Lock()
+_STOP = object()
+
+
+#============================================================================
+#  出力先の設定
+#============================================================================
+
+def _UpdateLevel():
+    global _level
+    _level = min(_consoleLevel, _fileLevel)
+#end def
+
+def SetConsole(level):
+    # コンソールに出力するレベル（None または OFF で出力しない）
+    global _consoleLevel
+    Flush()
+    _consoleLevel = OFF if level is None else level
+    _UpdateLevel()
+#end def
+
+def Open(filename, level=DEBUG):
+    # JSON lines で出力するファイル（追記）
+    global _fileName, _fileLevel
+    Flush()
+    _fileName = filename
+    _fileLevel = level
+    _UpdateLevel()
+#end def
+
+def Close():
+    global _fileName, _fileLevel
+    Flush()
+    _fileName = None
+    _fileLevel = OFF
+    _UpdateLevel()
+#end def
+
+def IsEnabledFor(level):
+    return level >= _level
+#end def
+
+def LevelValue(name):
+    if isinstance(name, int):
+        return name
+    #end if
+    name = str(name).upper()
+    for value, text in LEVELNAMES.items():
+        if text == name:
+            return value
+        #end if
+    #next
+    if name == "OFF":
+        return OFF
+    #end if
+    return int(name)
+#end def
+
+
+#============================================================================
+#  イベントの記録
+#============================================================================
+
+def Emit(level, event, **fields):
+    if level < _level:
+        return
+    #end if
+    record = {"t": time.time(), "level": level, "event": event}
+    page = Instrument.CurrentPage()
+    if page is not None:
+        record["page"] = page
+    #end if
+    record.update(fields)
+    _StartWriter()
+    _queue.put(record)
+#end def
+
+def Debug(event, **fields):
+    if DEBUG < _level:
+        return
+    #end if
+    Emit(DEBUG, event, **fields)
+#end def
+
+def Info(event, **fields):
+    if INFO < _level:
+        return
+    #end if
+    Emit(INFO, event, **fields)
+#end def
+
+def Warning(event, **fields):
+    Emit(WARNING, event, **fields)
+#end def
+
+def Error(event, **fields):
+    Emit(ERROR, event, **fields)
+#end def
+
+
+#============================================================================
+#  バックグラウンドの書込みスレッド
+#============================================================================
+
+def ConsoleText(record):
+    # コンソール用の1行（ページ番号・イベント名・値）
+    text = ""
+    if "page" in record:
+        text += "page={}: ".format(record["page"])
+    #end if
+    text += record["event"]
+    for key, value in record.items():
+        if key in ("t", "level", "event", "page"):
+            continue
+        #end if
+        if isinstance(value, float):
+            value = "{:.2f}".format(value)
+        #end if
+        text += " {}={}".format(key, value)
+    #next
+    if record["level"] >= WARNING:
+        text = LEVELNAMES.get(record["level"], "") + ": " + text
+    #end if
+    return text
+#end def
+
+def _Write(records):
+    lines = []
+    jsonLines = []
+    for record in records:
+        if record["level"] >= _consoleLevel:
+            lines.append(ConsoleText(record))
+        #end if
+        if _fileName is not None and record["level"] >= _fileLevel:
+            record = dict(record)
+            record["level"] = LEVELNAMES.get(record["level"], record["level"])
+            jsonLines.append(json.dumps(record, ensure_ascii=False, default=str))
+        #end if
+    #next
+    if len(lines) > 0:
+        try:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+        #end try
+    #end if
+    if len(jsonLines) > 0:
+        with open(_fileName, "a", encoding="utf-8") as fp:
+            fp.write("\n".join(jsonLines) + "\n")
+        #end with
+    #end if
+#end def
+
+def _WriterLoop():
+    while True:
+        item = _queue.get()
+        records = []
+        waiters = []
+        stop = False
+        # 溜まっているイベントをまとめて書き込む
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                records.append(item)
+            #end if
+            if len(records) >= 1000:
+                break
+            #end if
+            try:
+                item = _queue.get_nowait()
+            except queue.Empty:
+                break
+            #end try
+        #next
+        if len(records) > 0:
+            try:
+                _Write(records)
+            except Exception:
+                pass
+            #end try
+        #end if
+        for w in waiters:
+            w.set()
+        #next
+        if stop:
+            return
+        #end if
+    #end while
+#end def
+
+def _StartWriter():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    #end if
+    with _writerLock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_WriterLoop, name="EventLog", daemon=True)
+            _writer.start()
+        #end if
+    #end with
+#end def
+
+def Flush(timeout=10.0):
+    # それまでに記録したイベントが書き込まれるまで待つ
+    if _writer is None or not _writer.is_alive():
+        return
+    #end if
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+#end def
+
+def Shutdown():
+    Flush()
+    if _writer is not None and _writer.is_alive():
+        _queue.put(_STOP)
+        _writer.join(10.0)
+    #end if
+#end def
+
+atexit.register(Shutdown)
+
+
+# 環境変数による出力先の設定
+if os.environ.get("MEMBERCHECK_LOG_LEVEL"):
+    SetConsole(LevelValue(os.environ["MEMBERCHECK_LOG_LEVEL"]))
+#end if
+if os.environ.get("MEMBERCHECK_LOG"):
+    Open(os.environ["MEMBERCHECK_LOG"], LevelValue(os.environ.get("MEMBERCHECK_LOG_FILE_LEVEL", "DEBUG")))
+#end if
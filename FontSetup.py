@@ -0,0 +1,79 @@
+#==========================================================================================
+#   検出結果PDFの描画に使うフォントの登録
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+ReportLab へのフォント登録をプロセスにつき一度だけ行うためのモジュール。
+CheckTool や ChartReader のインスタンスを作るたびに TTF を読み込まないよう、
+実際に PDF へ文字を描画する直前に RegisterFonts() を呼び出す。
+./Fonts のフォントが無い場合は、従来どおり例外にする（検出結果PDFのフォントが黙って変わらないように）。
+合成計算書のベンチマークやサンプルのチェックなど、フォントが無い環境（リポジトリだけを取得した場合など）で
+動かすツールは RegisterFonts(fallback=True)（または環境変数 MEMBERCHECK_FONT_FALLBACK=1）で、
+ReportLab に組み込みの日本語フォント（FALLBACK_FACE、PDFには埋め込まない）を同じ名前で登録する。
+"""
+
+import os
+import threading
+
+# 源真ゴシック等幅フォント
+# GEN_SHIN_GOTHIC_MEDIUM_TTF = "/Library/Fonts/GenShinGothic-Monospace-Medium.ttf"
+GEN_SHIN_GOTHIC_MEDIUM_TTF = "./Fonts/GenShinGothic-Monospace-Medium.ttf"
+FONTNAME1 = 'GenShinGothic'
+# IPAexゴシックフォント
+# IPAEXG_TTF = "/Library/Fonts/ipaexg.ttf"
+IPAEXG_TTF = "./Fonts/ipaexg.ttf"
+FONTNAME2 = 'ipaexg'
+# フォントのファイルが無い場合に使う ReportLab の組み込みのフォント
+FALLBACK_FACE = 'HeiseiKakuGo-W5'
+# 組み込みのフォントでの代用を許可する環境変数
+FALLBACK_ENV = "MEMBERCHECK_FONT_FALLBACK"
+
+_registered = False
+_lock = threading.Lock()
+
+
+#============================================================================
+#  フォントを登録する関数（2回目以降の呼び出しは何もしない）
+#============================================================================
+
+def RegisterFonts(fallback=None):
+    # fallback : True の場合はフォントのファイルが無ければ組み込みのフォントで代用する
+    #            （None の場合は環境変数 MEMBERCHECK_FONT_FALLBACK で決める。既定は代用しない）
+    global _registered
+
+    if _registered:
+        return
+    #end if
+    if fallback is None:
+        fallback = os.environ.get(FALLBACK_ENV, "") not in ("", "0")
+    #end if
+    with _lock:
+        if not _registered:
+            # pip install reportlab
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            for name, filename in ((FONTNAME1, GEN_SHIN_GOTHIC_MEDIUM_TTF), (FONTNAME2, IPAEXG_TTF)):
+                if fallback and not os.path.exists(filename):
+                    pdfmetrics.registerFont(FallbackFont(name))
+                else:
+                    # フォントが無い場合は TTFont が例外にする（インストールの不備を隠さない）
+                    pdfmetrics.registerFont(TTFont(name, filename))
+                #end if
+            #next
+            _registered = True
+        #end if
+    #end with
+#end def
+
+def FallbackFont(name):
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    import EventLog
+
+    EventLog.Warning("font", message="フォントのファイルが無いので {} を使います".format(FALLBACK_FACE), font=name)
+    font = UnicodeCIDFont(FALLBACK_FACE)
+    font.name = font.fontName = name    # setFont で使う名前で登録する
+    return font
+#end def
@@ -0,0 +1,300 @@
+#==========================================================================================
+#   部材リスト読取りの回帰テスト（正解CSVとの比較）とスループットの記録
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+同梱のサンプルPDFを ChartEngine の読取り方式（既定は ReadChart の textbox）で読み取り、正解の「_部材リスト.csv」とセル単位で比較する。
+ファイルごとの処理時間・最大メモリを履歴（JSON lines）に追記し、
+スループット（ページ/秒）が履歴の基準値より tolerance を超えて低下した場合は失敗とする。
+ChartDevider などを高速化したときに、結果が変わっていないことと速くなったことを確認するために使う。
+
+    python GoldenCheck.py                       # 同梱のサンプルをチェック（履歴はこのファイルと同じフォルダの golden_history.jsonl）
+    python GoldenCheck.py --tolerance 0.10 --repeat 3
+    python GoldenCheck.py --strategy textbox2
+    python GoldenCheck.py 計算書.pdf:計算書_部材リスト.csv
+    python GoldenCheck.py --update              # 現在の読取り結果を正解CSVとして保存し直す
+
+・基準値は同じファイルの直近 BASELINE_RUNS 回（正解との不一致の数が今回と同じ回）のスループットの中央値。
+・終了コード: 0=合格、1=結果の不一致、2=スループットの低下
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import multiprocessing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 同梱のサンプル（PDF : 正解CSV）
+#   構造計算書断面リスト1（罫線なし）.pdf はどの読取り方式でも部材を読み取れない（比較するセルが無い）ので含めない
+SAMPLES = [
+    (os.path.join(HERE, "03構造計算書（部材リストのみ）.pdf"), os.path.join(HERE, "03構造計算書（部材リストのみ）_部材リスト.csv")),
+]
+
+# スループットの履歴（作業フォルダではなくこのファイルと同じフォルダに置き、.gitignore で除外する）
+HISTORY = os.path.join(HERE, "golden_history.jsonl")
+DEFAULT_STRATEGY = "textbox"
+TOLERANCE = 0.15        # 許容するスループットの低下率
+BASELINE_RUNS = 5       # 基準値に使う直近の履歴の数
+
+
+#============================================================================
+#  正解CSVの読込みと比較
+#============================================================================
+
+def ReadCsvRows(filename):
+    with open(filename, encoding="utf-8", newline="") as fp:
+        return [row for row in csv.reader(fp) if len(row) > 0]
+    #end with
+#end def
+
+def RowsToCells(rows):
+    # 部材種類の行・見出し行・各部材の行を (部材種類, 符号名：断面, 列名) : 値 の辞書に変換
+    cells = {}
+    kind = ""
+    header = None
+    for row in rows:
+        if len(row) == 1 and row[0].startswith("【"):
+            # 部材の無い部材種類の行は比較しない（読み取る部材種類を増やしても差分にしない）
+            kind = row[0]
+            header = None
+        elif header is None:
+            header = row
+        else:
+            for col, value in zip(header[1:], row[1:]):
+                cells[(kind, row[0], col)] = value
+            #next
+            cells[(kind, row[0], None)] = ""
+        #end if
+    #next
+    return cells
+#end def
+
+def DiffRows(expected, actual):
+    # セル単位の差分 [(部材種類, 符号名：断面, 列名, 正解, 読取り結果)]（None は存在しないことを表す）
+    c0 = RowsToCells(expected)
+    c1 = RowsToCells(actual)
+    diffs = []
+    for key in sorted(set(c0) | set(c1), key=lambda k: tuple("" if v is None else v for v in k)):
+        v0 = c0.get(key)
+        v1 = c1.get(key)
+        if v0 != v1:
+            diffs.append(key + (v0, v1))
+        #end if
+    #next
+    return diffs, len(c0)
+#end def
+
+def DiffText(diff):
+    kind, row, col, v0, v1 = diff
+    if col is None:
+        where = "{} {}".format(kind, row)
+    else:
+        where = "{} {} [{}]".format(kind, row, col)
+    #end if
+    if v0 is None:
+        return "  + {}".format(where) + ("" if col is None else " = {!r}".format(v1))
+    #end if
+    if v1 is None:
+        return "  - {}".format(where) + ("" if col is None else " = {!r}".format(v0))
+    #end if
+    return "  * {} : {!r} -> {!r}".format(where, v0, v1)
+#end def
+
+
+#============================================================================
+#  新しいプロセスで1つのPDFを読み取る関数
+#============================================================================
+
+def ReadOne(pdf_file, strategy):
+    sys.stdout = open(os.devnull, "w")
+    import EventLog
+    EventLog.SetConsole(None)
+    # 同梱のサンプルの読取りなので、./Fonts が無い環境でも組み込みのフォントで続ける
+    from FontSetup import RegisterFonts
+    RegisterFonts(fallback=True)
+    import ChartEngine
+    import ReadChartByChar
+    from PdfInput import PdfSource
+    from BenchScale import MaxRss
+
+    source = PdfSource(pdf_file)
+    pages = source.PageCount()
+    source.close()
+
+    time_sta = time.perf_counter()
+    cpu_sta = time.process_time()
+    ElementData = ChartEngine.ReadElements(pdf_file, strategy=strategy, index=False)
+    seconds = time.perf_counter() - time_sta
+    cpu = time.process_time() - cpu_sta
+    return {"rows": ReadChartByChar.ElementCsvRows(ElementData), "pages": pages,
+            "seconds": seconds, "cpu": cpu, "peak_rss_mb": MaxRss()}
+#end def
+
+def Measure(pdf_file, strategy):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(ReadOne, (pdf_file, strategy))
+    #end with
+#end def
+
+
+#============================================================================
+#  スループットの履歴
+#============================================================================
+
+def GitRevision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+    #end try
+#end def
+
+def ReadHistory(filename):
+    records = []
+    if filename and os.path.exists(filename):
+        with open(filename, encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        pass
+                    #end try
+                #end if
+            #next
+        #end with
+    #end if
+    return records
+#end def
+
+def AppendHistory(filename, record):
+    with open(filename, "a", encoding="utf-8") as fp:
+        fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+    #end with
+#end def
+
+def Baseline(history, name, strategy, mismatches, runs=BASELINE_RUNS):
+    # 読取り方式と読取り結果（不一致の数）が同じ回だけを比較の対象にする
+    values = [r["pages_per_sec"] for r in history
+              if r.get("file") == name and r.get("strategy", "char") == strategy
+              and r.get("mismatches") == mismatches and r.get("pages_per_sec")]
+    if len(values) == 0:
+        return None
+    #end if
+    return statistics.median(values[-runs:])
+#end def
+
+
+#============================================================================
+#  サンプルを1つずつチェックする関数
+#============================================================================
+
+def GoldenCheck(samples, strategy=DEFAULT_STRATEGY, history=HISTORY, tolerance=TOLERANCE, repeat=1, update=False, verbose=20):
+    records = ReadHistory(history)
+    revision = GitRevision()
+    status = 0
+    results = []
+    for pdf_file, csv_file in samples:
+        name = os.path.basename(pdf_file)
+        runs = [Measure(pdf_file, strategy) for i in range(max(repeat, 1))]
+        seconds = statistics.median([r["seconds"] for r in runs])
+        run = runs[0]
+        pages_per_sec = run["pages"] / seconds if seconds > 0 else 0.0
+
+        if update:
+            with open(csv_file, "w", encoding="utf-8", newline="") as fp:
+                csv.writer(fp).writerows(run["rows"])
+            #end with
+        #end if
+        diffs, ncells = DiffRows(ReadCsvRows(csv_file), run["rows"])
+        match = len(diffs) == 0
+        base = Baseline(records, name, strategy, len(diffs))
+        regressed = base is not None and pages_per_sec < base * (1.0 - tolerance)
+
+        print("{} [{}] : {} ページ {:.2f} 秒 {:.2f} ページ/秒 {:.1f} MB".format(
+            name, strategy, run["pages"], seconds, pages_per_sec, run["peak_rss_mb"]))
+        if match:
+            print("  正解と一致（{} セル）".format(ncells))
+        else:
+            print("  正解と不一致（{} / {} セル）".format(len(diffs), ncells))
+            for diff in diffs[:verbose]:
+                print(DiffText(diff))
+            #next
+            if len(diffs) > verbose:
+                print("  ... 他 {} 件".format(len(diffs) - verbose))
+            #end if
+            status = max(status, 1)
+        #end if
+        if base is not None:
+            print("  基準値 {:.2f} ページ/秒 に対して {:+.1%}".format(base, pages_per_sec / base - 1.0))
+        #end if
+        if regressed:
+            print("  スループットが許容値（{:.0%}）を超えて低下しました".format(tolerance))
+            status = 2
+        #end if
+
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": revision, "file": name, "strategy": strategy,
+                  "pages": run["pages"], "seconds": round(seconds, 4), "cpu": round(run["cpu"], 4),
+                  "pages_per_sec": round(pages_per_sec, 4), "peak_rss_mb": round(run["peak_rss_mb"], 1),
+                  "cells": ncells, "mismatches": len(diffs), "match": match}
+        results.append(record)
+        if history:
+            AppendHistory(history, record)
+        #end if
+    #next
+    return status, results
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def ParseSample(text):
+    if ":" in text:
+        pdf_file, csv_file = text.rsplit(":", 1)
+    else:
+        pdf_file = text
+        csv_file = os.path.splitext(text)[0] + "_部材リスト.csv"
+    #end if
+    return pdf_file, csv_file
+#end def
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="部材リスト読取りの回帰テストとスループットの記録")
+    parser.add_argument("samples", nargs="*", type=ParseSample, help="PDF[:正解CSV]（省略時は同梱のサンプル）")
+    parser.add_argument("--strategy", default=DEFAULT_STRATEGY, help="ChartEngine の読取り方式")
+    parser.add_argument("--history", default=HISTORY, help="スループットの履歴（JSON lines）")
+    parser.add_argument("--no-history", action="store_true", help="履歴に記録しない")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="許容するスループットの低下率")
+    parser.add_argument("--repeat", type=int, default=1, help="繰返し回数（処理時間は中央値）")
+    parser.add_argument("--update", action="store_true", help="現在の読取り結果を正解CSVとして保存する")
+    parser.add_argument("--show", type=int, default=20, help="表示する差分の数")
+    args = parser.parse_args(argv)
+
+    samples = args.samples or SAMPLES
+    for pdf_file, csv_file in samples:
+        if not os.path.isfile(pdf_file) or (not args.update and not os.path.isfile(csv_file)):
+            parser.error("ファイルがありません: {} / {}".format(pdf_file, csv_file))
+        #end if
+    #next
+    status, results = GoldenCheck(samples, strategy=args.strategy, history=None if args.no_history else args.history,
+                                  tolerance=args.tolerance, repeat=args.repeat, update=args.update,
+                                  verbose=args.show)
+    return status
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+#==========================================================================================
+#   処理段階ごとの時間と件数の計測（CheckTool・ChartReader 用）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+PDFの読込み、用紙サイズの取得、pdfminer の解釈、MakeChar/MakeCharPlus、SS7 のページ分類、
+各チェック（柱・梁・壁・ブレース・検定比図など）、断面リストの検索、検出結果PDFの出力について、
+経過時間（wall）とCPU時間、ページごとの文字・罫線の数、飛ばしたページの数を記録する。
+
+    import Instrument
+    Instrument.Enable()
+    CT.CheckTool(filename)
+    Instrument.WriteReport("report.json")     # 拡張子が .csv の場合はページごとのCSV
+
+ページごとの記録は (計算書, ページ番号) ごとに分ける。SetDocument はスレッドごとに設定するので、
+CheckFiles などで複数の計算書を同時に処理しても、別の計算書の同じページ番号の計測値は混ざらない。
+
+環境変数 MEMBERCHECK_INSTRUMENT にファイル名を設定すると、起動時に計測を有効にし、終了時にそのファイルへ出力する。
+無効の場合（既定）は、Stage・Timed・Count はフラグを見て何もしないで戻る。
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_stages = {}        # 段階名 : [回数, wall, cpu]
+_counts = {}        # 件数名 : 合計
+_pages = {}         # (計算書, ページ番号) : {"stages": {段階名: [回数, wall, cpu]}, "counts": {件数名: 件数}}
+
+
+#============================================================================
+#  計測の有効・無効の切替えと初期化
+#============================================================================
+
+def Enable():
+    global _enabled
+    _enabled = True
+#end def
+
+def Disable():
+    global _enabled
+    _enabled = False
+#end def
+
+def IsEnabled():
+    return _enabled
+#end def
+
+def Reset():
+    with _lock:
+        _stages.clear()
+        _counts.clear()
+        _pages.clear()
+    #end with
+#end def
+
+def SetPage(pageNo):
+    # 以降の計測を記録するページ番号（None の場合はページに属さない）
+    _local.page = pageNo
+#end def
+
+def CurrentPage():
+    return getattr(_local, "page", None)
+#end def
+
+def SetDocument(name):
+    # このスレッドで処理している計算書（None の場合は計算書に属さない）
+    _local.document = name
+#end def
+
+def CurrentDocument():
+    return getattr(_local, "document", None)
+#end def
+
+def PageKey():
+    # ページごとの記録のキー（ページに属さない場合は None）
+    page = CurrentPage()
+    if page is None:
+        return None
+    #end if
+    return (CurrentDocument(), page)
+#end def
+
+
+#============================================================================
+#  計測値の記録
+#============================================================================
+
+def Record(name, wall, cpu):
+    page = PageKey()
+    with _lock:
+        s = _stages.setdefault(name, [0, 0.0, 0.0])
+        s[0] += 1
+        s[1] += wall
+        s[2] += cpu
+        if page is not None:
+            p = _pages.setdefault(page, {"stages": {}, "counts": {}})
+            s = p["stages"].setdefault(name, [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += wall
+            s[2] += cpu
+        #end if
+    #end with
+#end def
+
+def Count(name, n=1):
+    if not _enabled:
+        return
+    #end if
+    page = PageKey()
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + n
+        if page is not None:
+            p = _pages.setdefault(page, {"stages": {}, "counts": {}})
+            p["counts"][name] = p["counts"].get(name, 0) + n
+        #end if
+    #end with
+#end def
+
+
+#============================================================================
+#  処理段階の時間を計測するコンテキストマネージャとデコレータ
+#============================================================================
+
+class _Stage():
+    __slots__ = ("name", "t0", "c0")
+
+    def __init__(self, name):
+        self.name = name
+    #end def
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self.c0 = time.process_time()
+        return self
+    #end def
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Record(self.name, time.perf_counter() - self.t0, time.process_time() - self.c0)
+        return False
+    #end def
+#end class
+
+class _NoStage():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+    #end def
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+    #end def
+#end class
+
+_NOSTAGE = _NoStage()
+
+def Stage(name):
+    if _enabled:
+        return _Stage(name)
+    #end if
+    return _NOSTAGE
+#end def
+
+def Timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            #end if
+            with _Stage(name):
+                return func(*args, **kwargs)
+            #end with
+        #end def
+        return wrapper
+    #end def
+    return decorator
+#end def
+
+
+#============================================================================
+#  長い関数の中の区間を順番に計測するラップタイマー
+#  （lap.Next("柱", 柱_Flag) で前の区間を閉じて次の区間を開始、lap.Stop() で終了）
+#============================================================================
+
+class Lap():
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self.name = None
+        self.t0 = 0.0
+        self.c0 = 0.0
+    #end def
+
+    def Next(self, name, active=True):
+        if not _enabled:
+            return
+        #end if
+        self.Stop()
+        if active:
+            self.name = self.prefix + name
+            self.t0 = time.perf_counter()
+            self.c0 = time.process_time()
+        #end if
+    #end def
+
+    def Stop(self):
+        if self.name is not None:
+            Record(self.name, time.perf_counter() - self.t0, time.process_time() - self.c0)
+            self.name = None
+        #end if
+    #end def
+#end class
+
+
+#============================================================================
+#  計測結果の出力（JSONまたはページごとのCSV）
+#============================================================================
+
+def Report():
+    with _lock:
+        stages = {}
+        for name, (n, wall, cpu) in _stages.items():
+            stages[name] = {"calls": n, "wall": round(wall, 6), "cpu": round(cpu, 6)}
+        #next
+        # 計算書を設定しない計測は従来どおり pages、計算書ごとの計測は documents に出力する
+        pages = {}
+        documents = {}
+        for document, page in sorted(_pages, key=lambda k: (k[0] or "", k[1])):
+            p = _pages[(document, page)]
+            st = {}
+            for name, (n, wall, cpu) in p["stages"].items():
+                st[name] = {"calls": n, "wall": round(wall, 6), "cpu": round(cpu, 6)}
+            #next
+            entry = {"stages": st, "counts": dict(p["counts"])}
+            if document is None:
+                pages[str(page)] = entry
+            else:
+                documents.setdefault(document, {})[str(page)] = entry
+            #end if
+        #next
+        report = {"stages": stages, "counts": dict(_counts), "pages": pages}
+        if len(documents) > 0:
+            report["documents"] = documents
+        #end if
+        return report
+    #end with
+#end def
+
+def WriteReport(filename):
+    report = Report()
+    if filename.lower().endswith(".csv"):
+        import csv
+
+        stageNames = sorted(report["stages"])
+        countNames = sorted(report["counts"])
+        # 計算書ごとの計測がある場合は先頭に計算書の列を付ける
+        rows = [("", page, p) for page, p in report["pages"].items()]
+        for document, pages in report.get("documents", {}).items():
+            rows += [(document, page, p) for page, p in pages.items()]
+        #next
+        withDocument = "documents" in report
+        with open(filename, "w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            header = ["document", "page"] if withDocument else ["page"]
+            for name in stageNames:
+                header += [name + ":wall", name + ":cpu"]
+            #next
+            header += countNames
+            writer.writerow(header)
+            for document, page, p in rows:
+                row = [document, page] if withDocument else [page]
+                for name in stageNames:
+                    s = p["stages"].get(name)
+                    row += [s["wall"], s["cpu"]] if s else ["", ""]
+                #next
+                for name in countNames:
+                    row.append(p["counts"].get(name, ""))
+                #next
+                writer.writerow(row)
+            #next
+        #end with
+    else:
+        with open(filename, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=1)
+        #end with
+    #end if
+#end def
+
+
+# 環境変数で計測を有効にした場合は、終了時に結果を出力する
+_envReport = os.environ.get("MEMBERCHECK_INSTRUMENT")
+if _envReport:
+    Enable()
+    atexit.register(WriteReport, _envReport)
+#end if
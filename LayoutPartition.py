@@ -0,0 +1,169 @@
+#==========================================================================================
+#   ページのレイアウトを一度の走査で種類ごとに分ける処理
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+MakeChar・MakeCharPlus・CoverCheck は、同じレイアウトを「回転していない文字」「線・四角形」
+「正の回転の文字」「負の回転の文字」ごとに3～4回走査していた。
+PagePartition はレイアウトの木を一度だけ走査し（LTFigure の中も辿る）、種類ごとのリストに分ける。
+
+・chars   : 回転していない文字 [char, x0, x1, y0, y1, matrix]（MakeChar の CharData と同じ形式）
+・rotated : 回転した文字（chars と同じ形式。RotatedText.RotatedRuns にそのまま渡す）
+・lines   : 線 (x0, y0, x1, y1, linewidth, pts)、rects : 四角形 (x0, y0, x1, y1)、curves : その他の図形 (x0, y0, x1, y1)
+・CharBoxes() は文字の座標を件数の分だけ確保した float64 の配列（n×4: x0, x1, y0, y1）で返す。
+
+LTFigure（フォームXObject）の中の文字や線も対象にするので、ページ全体がフォームXObjectとして
+貼り込まれたPDF（検出結果のPDFや、他のツールで結合したPDF）も読み取れる。
+フィギュアの中の要素は、レイアウトの順番の中でそのフィギュアの位置に並ぶ。
+
+RecordingDevice.RecordingDevice は、レイアウトの木を作らずに解釈中のページから直接 PagePartition を作る。
+PartitionOf(layout) は、どちらのデバイスの結果からも PagePartition を返す。
+"""
+
+import numpy as np
+
+from pdfminer.layout import LTChar, LTLine, LTRect, LTCurve, LTFigure
+
+# 要素の種類（クラスごとに一度だけ判定して記憶する）
+CHAR = 1
+LINE = 2
+RECT = 3
+CURVE = 4
+FIGURE = 5
+OTHER = 0
+
+_kinds = {}
+
+def Kind(lt):
+    cls = type(lt)
+    kind = _kinds.get(cls)
+    if kind is None:
+        if issubclass(cls, LTChar):
+            kind = CHAR
+        elif issubclass(cls, LTLine):
+            kind = LINE
+        elif issubclass(cls, LTRect):
+            kind = RECT
+        elif issubclass(cls, LTCurve):
+            kind = CURVE
+        elif issubclass(cls, LTFigure):
+            kind = FIGURE
+        else:
+            kind = OTHER
+        #end if
+        _kinds[cls] = kind
+    #end if
+    return kind
+#end def
+
+
+#============================================================================
+#  レイアウトを種類ごとに分けるクラス
+#============================================================================
+
+class PagePartition():
+
+    def __init__(self, layout=None, figures=True):
+        self.chars = []
+        self.rotated = []
+        self.lines = []
+        self.rects = []
+        self.curves = []
+        if layout is not None:
+            self.Walk(layout, figures)
+        #end if
+    #end def
+
+    def Walk(self, layout, figures):
+        chars = self.chars
+        rotated = self.rotated
+        lines = self.lines
+        # 再帰の代わりにイテレータのスタックで辿る
+        stack = [iter(layout)]
+        while stack:
+            for lt in stack[-1]:
+                kind = Kind(lt)
+                if kind == CHAR:
+                    if lt.matrix[1] == 0.0:     # 回転していない文字
+                        chars.append([lt.get_text(), lt.x0, lt.x1, lt.y0, lt.y1, lt.matrix])
+                    else:
+                        rotated.append([lt.get_text(), lt.x0, lt.x1, lt.y0, lt.y1, lt.matrix])
+                    #end if
+                elif kind == LINE:
+                    lines.append((lt.x0, lt.y0, lt.x1, lt.y1, lt.linewidth, lt.pts))
+                elif kind == RECT:
+                    self.rects.append((lt.x0, lt.y0, lt.x1, lt.y1))
+                elif kind == CURVE:
+                    self.curves.append((lt.x0, lt.y0, lt.x1, lt.y1))
+                elif kind == FIGURE and figures:
+                    stack.append(iter(lt))
+                    break
+                #end if
+            else:
+                stack.pop()
+            #end for
+        #end while
+    #end def
+
+    #==================================================================================
+    #   線・四角形を MakeChar の辞書の形式で返す関数
+    #==================================================================================
+
+    def LineDicts(self):
+        LineData = []
+        for x0, y0, x1, y1, linewidth, pts in self.lines:
+            lineDic = {}
+            lineDic["x0"] = x0
+            lineDic["x1"] = x1
+            lineDic["y0"] = y0
+            lineDic["y1"] = y1
+            lineDic["height"] = y1 - y0
+            lineDic["width"] = x1 - x0
+            lineDic["linewidth"] = linewidth
+            lineDic["pts"] = pts
+            if x0 == x1 :
+                lineAngle = "V"
+            else:
+                lineAngle = "H"
+            #end if
+            lineDic["angle"] = lineAngle
+            LineData.append(lineDic)
+        #next
+        return LineData
+    #end def
+
+    def RectDicts(self):
+        RectData = []
+        for x0, y0, x1, y1 in self.rects:
+            RectData.append({"x0": x0, "x1": x1, "y0": y0, "y1": y1})
+        #next
+        return RectData
+    #end def
+
+    #==================================================================================
+    #   文字の座標の配列（件数が分かっているので一度に確保する）
+    #==================================================================================
+
+    def CharBoxes(self):
+        n = len(self.chars)
+        boxes = np.empty((n, 4), dtype=np.float64)
+        for i, c in enumerate(self.chars):
+            boxes[i, 0] = c[1]
+            boxes[i, 1] = c[2]
+            boxes[i, 2] = c[3]
+            boxes[i, 3] = c[4]
+        #next
+        return boxes
+    #end def
+#end class
+
+
+def PartitionOf(layout):
+    # RecordingDevice の結果はそのまま、LTPage は一度走査して分ける
+    if isinstance(layout, PagePartition):
+        return layout
+    #end if
+    return PagePartition(layout)
+#end def
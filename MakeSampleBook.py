@@ -0,0 +1,286 @@
+#==========================================================================================
+#   ベンチマーク用の合成構造計算書（SS7形式）の作成
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+ReportLab で SS7 形式を模した構造計算書のPDFを作成する。実際の計算書を使わずに、
+ページ数・表の密度・文字数を変えたときの CheckTool / ChartReader の処理時間を計測するために使う。
+
+    python MakeSampleBook.py sample.pdf --pages 200 --rows 40 --grid 6x8
+
+作成するページ
+・表紙           「プログラムの名称：SuperBuild/SS7」「プログラムバージョン：…」
+・柱・梁の検定表  「柱の断面検定表」「梁の断面検定表」の見出しと「検定比」の列を持つ表（rows 行）
+・検定比図       「検定比図」の見出しと、部材に沿って回転した検定比のラベル
+・断面リスト     「断面リスト」「【大梁】」の見出しと、罫線で区切った grid（行x列）の表
+
+ページの並びは表紙の後に kinds（既定は 柱・梁・検定比図・断面リスト）を繰り返す。
+検定比は乱数（seed で固定）で作成し、ratio（既定 0.3）の割合で 0.90～0.99 の値を混ぜる。
+文字は ReportLab 内蔵の HeiseiKakuGo-W5（埋め込まないCIDフォント）で描画する。フォントファイルが不要でオフラインで作成でき、
+pdfminer も UniJIS-UCS2-H の CMap で文字を読み取れる（TTFのサブセットは ToUnicode が無く読み取れない）。
+"""
+
+import sys
+import random
+import argparse
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase import pdfmetrics
+
+PAGE_KINDS = ("柱", "梁", "検定比図", "断面リスト")
+
+PROGRAM_NAME = "SuperBuild/SS7"
+PROGRAM_VERSION = "1.1.1.18"
+
+FONTSIZE = 8.0
+SAMPLE_FONT = "HeiseiKakuGo-W5"
+
+
+#============================================================================
+#  使用するフォント（ReportLab 内蔵のCIDフォント）を登録する関数
+#============================================================================
+
+def SampleFont():
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+
+    if not SAMPLE_FONT in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(SAMPLE_FONT))
+    #end if
+    return SAMPLE_FONT
+#end def
+
+
+#============================================================================
+#  合成計算書を作成するクラス
+#============================================================================
+
+class SampleBook():
+
+    def __init__(self, filename, rows=30, grid=(4, 6), ratio=0.3, seed=0, font=None):
+        self.filename = filename
+        self.rows = rows
+        self.grid = grid
+        self.ratio = ratio
+        self.random = random.Random(seed)
+        self.font = font or SampleFont()
+        self.PaperSize = landscape(A4)
+        self.cv = canvas.Canvas(filename, pagesize=self.PaperSize)
+        self.pages = 0
+        self.glyphs = 0     # 描画した文字数（空白を除く）
+        self.rules = 0      # 描画した罫線数
+        self.hits = 0       # 0.90以上の検定比の数
+    #end def
+
+    #==================================================================================
+    #   文字・罫線を描画する関数（文字数・罫線数を数える）
+    #==================================================================================
+
+    def Text(self, x, y, text, size=FONTSIZE, angle=0):
+        cv = self.cv
+        cv.setFont(self.font, size)
+        if angle == 0:
+            cv.drawString(x, y, text)
+        else:
+            cv.saveState()
+            cv.translate(x, y)
+            cv.rotate(angle)
+            cv.drawString(0, 0, text)
+            cv.restoreState()
+        #end if
+        self.glyphs += len(text.replace(" ", ""))
+    #end def
+
+    def Rule(self, x0, y0, x1, y1):
+        self.cv.line(x0, y0, x1, y1)
+        self.rules += 1
+    #end def
+
+    def Ratio(self):
+        if self.random.random() < self.ratio:
+            self.hits += 1
+            return self.random.uniform(0.90, 0.99)
+        #end if
+        return self.random.uniform(0.10, 0.85)
+    #end def
+
+    def EndPage(self):
+        self.cv.showPage()
+        self.pages += 1
+    #end def
+
+    #==================================================================================
+    #   各ページを作成する関数
+    #==================================================================================
+
+    def Cover(self):
+        w, h = self.PaperSize
+        self.Text(w / 2 - 80, h - 120, "構造計算書（合成データ）", size=16)
+        self.Text(80, h - 200, "プログラムの名称：" + PROGRAM_NAME, size=10)
+        self.Text(80, h - 220, "プログラムバージョン：" + PROGRAM_VERSION, size=10)
+        self.EndPage()
+    #end def
+
+    def CheckSheet(self, member):
+        # 柱・梁の断面検定表（「検定比」の列の下に数値が並ぶ表）
+        w, h = self.PaperSize
+        prefix = "C" if member == "柱" else "G"
+        self.Text(40, h - 40, "{}の断面検定表".format(member), size=12)
+        self.Text(40, h - 58, "RC{}".format(member))
+        headers = ["符号", "位置", "b×D", "主筋", "Ｍ", "Ｑ", "検定比"]
+        xs = [40 + 70 * i for i in range(len(headers))]
+        y = h - 80
+        for x, t in zip(xs, headers):
+            self.Text(x, y, t)
+        #next
+        self.Rule(36, y - 4, xs[-1] + 40, y - 4)
+        for r in range(self.rows):
+            y -= (h - 120) / max(self.rows, 1)
+            row = ["{}{}".format(prefix, r % 12 + 1),
+                   "{}F".format(r % 9 + 1),
+                   "{}x{}".format(self.random.choice((500, 600, 700, 800)), self.random.choice((600, 700, 800, 900))),
+                   "{}-D{}".format(self.random.randint(4, 12), self.random.choice((22, 25, 29))),
+                   "{:.1f}".format(self.random.uniform(10, 900)),
+                   "{:.1f}".format(self.random.uniform(10, 500)),
+                   "{:.2f}".format(self.Ratio())]
+            for x, t in zip(xs, row):
+                self.Text(x, y, t)
+            #next
+        #next
+        # 符号の右側の縦罫線（これより左の文字を部材の符号として読み取る）
+        self.Rule(xs[1] - 6, y - 4, xs[1] - 6, h - 70)
+        self.EndPage()
+    #end def
+
+    def RatioDiagram(self):
+        # 検定比図（軸組の線に沿って回転したラベル）
+        w, h = self.PaperSize
+        self.Text(40, h - 40, "検定比図", size=12)
+        nx = max(self.grid[1], 2)
+        ny = max(self.grid[0], 2)
+        x0, x1 = 80, w - 80
+        y0, y1 = 80, h - 100
+        dx = (x1 - x0) / (nx - 1)
+        dy = (y1 - y0) / (ny - 1)
+        for i in range(nx):
+            x = x0 + dx * i
+            self.Rule(x, y0, x, y1)
+            for j in range(ny - 1):
+                # 柱の検定比（90度回転）
+                self.Text(x + 4, y0 + dy * j + dy / 3, "({:.2f})".format(self.Ratio()), angle=90)
+            #next
+        #next
+        for j in range(ny):
+            y = y0 + dy * j
+            self.Rule(x0, y, x1, y)
+            for i in range(nx - 1):
+                # 梁の検定比（水平）
+                self.Text(x0 + dx * i + dx / 3, y + 3, "{:.2f}".format(self.Ratio()))
+            #next
+        #next
+        self.EndPage()
+    #end def
+
+    def SectionList(self):
+        # 断面リスト（罫線で区切った表）
+        w, h = self.PaperSize
+        self.Text(40, h - 40, "構造計算書", size=10)
+        self.Text(140, h - 40, "断面リスト", size=12)
+        self.Text(260, h - 40, "【大梁】", size=12)
+        nr, nc = self.grid
+        x0, x1 = 40, w - 40
+        y0, y1 = 40, h - 60
+        cw = (x1 - x0) / (nc + 1)
+        ch = (y1 - y0) / (nr * 4)
+        for j in range(nr * 4 + 1):
+            self.Rule(x0, y1 - ch * j, x1, y1 - ch * j)
+        #next
+        for i in range(nc + 2):
+            self.Rule(x0 + cw * i, y0, x0 + cw * i, y1)
+        #next
+        labels = ["符号", "b×D", "上端筋", "下端筋"]
+        for r in range(nr):
+            for k, label in enumerate(labels):
+                y = y1 - ch * (r * 4 + k) - ch + 3
+                self.Text(x0 + 3, y, label)
+                for c in range(nc):
+                    if k == 0:
+                        t = "{}G{}".format(r % 9 + 1, c + 1)
+                    elif k == 1:
+                        t = "{}x{}".format(self.random.choice((300, 350, 400)), self.random.choice((600, 700, 800)))
+                    else:
+                        t = "{}-D{}".format(self.random.randint(3, 8), self.random.choice((22, 25)))
+                    #end if
+                    self.Text(x0 + cw * (c + 1) + 3, y, t)
+                #next
+            #next
+        #next
+        self.EndPage()
+    #end def
+
+    def Page(self, kind):
+        if kind in ("柱", "梁"):
+            self.CheckSheet(kind)
+        elif kind == "検定比図":
+            self.RatioDiagram()
+        elif kind == "断面リスト":
+            self.SectionList()
+        else:
+            raise ValueError("不明なページの種類: {}".format(kind))
+        #end if
+    #end def
+
+    def Save(self):
+        self.cv.save()
+        return {"file": self.filename, "pages": self.pages, "glyphs": self.glyphs,
+                "rules": self.rules, "hits": self.hits}
+    #end def
+#end class
+
+
+#============================================================================
+#  合成計算書を1冊作成する関数
+#============================================================================
+
+def MakeSampleBook(filename, pages=50, kinds=PAGE_KINDS, rows=30, grid=(4, 6), ratio=0.3, seed=0):
+    book = SampleBook(filename, rows=rows, grid=grid, ratio=ratio, seed=seed)
+    book.Cover()
+    i = 0
+    while book.pages < pages:
+        book.Page(kinds[i % len(kinds)])
+        i += 1
+    #end while
+    return book.Save()
+#end def
+
+def ParseGrid(text):
+    r, c = text.lower().split("x")
+    return int(r), int(c)
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成構造計算書（SS7形式）の作成")
+    parser.add_argument("pdf", help="作成するPDFファイル")
+    parser.add_argument("--pages", type=int, default=50, help="ページ数（表紙を含む）")
+    parser.add_argument("--kinds", default=",".join(PAGE_KINDS), help="繰り返すページの種類（カンマ区切り）")
+    parser.add_argument("--rows", type=int, default=30, help="検定表の行数")
+    parser.add_argument("--grid", type=ParseGrid, default=(4, 6), help="断面リスト・検定比図の大きさ（行x列）")
+    parser.add_argument("--ratio", type=float, default=0.3, help="0.90以上の検定比を混ぜる割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    args = parser.parse_args(argv)
+
+    info = MakeSampleBook(args.pdf, pages=args.pages, kinds=args.kinds.split(","), rows=args.rows,
+                          grid=args.grid, ratio=args.ratio, seed=args.seed)
+    print("{file} : {pages} ページ、文字 {glyphs}、罫線 {rules}、0.90以上の検定比 {hits}".format(**info))
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
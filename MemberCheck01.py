@@ -20,20 +20,41 @@ from pdfminer.pdfpage import PDFPage
 # from pdfminer.layout import LAParams, LTTextContainer
 from pdfminer.layout import LAParams, LTTextContainer, LTContainer, LTTextBox, LTTextLine, LTChar,LTLine,LTRect
 
+# pdfrw と reportlab は検出結果PDFを描画する時にだけ読み込む（起動時間の短縮）
 # pip install pdfrw
-from pdfrw import PdfReader
-from pdfrw.buildxobj import pagexobj
-from pdfrw.toreportlab import makerl
-
 # pip install reportlab
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
+from FontSetup import RegisterFonts, FONTNAME1, FONTNAME2
+
+# PDFの入力レイヤー（mmapで一度だけ読み込み、pdfminer・pdfrwで共有）
+from PdfInput import PdfSource, TimedPageInterpreter
+
+# 回転した文字（縦書きのラベル）のランの作成
+from RotatedText import RotatedRuns
+
+# 床伏図・軸組図の文字列の字句解析
+from SheetLexer import PLAN_LEXER, ELEVATION_LEXER, MEMBER_LEXER, DIMENSION_LEXER
 
-# pip install PyPDF2
-from PyPDF2 import PdfReader as PR2 # 名前が上とかぶるので別名を使用
+# ページのレイアウトを一度の走査で文字・線などに分ける処理
+from LayoutPartition import PartitionOf
+
+# 文字と罫線だけを記録するデバイス（レイアウトの木を作らない）
+from RecordingDevice import RecordingDevice
+
+# 構造計算プログラムの種類とバージョンの判定（メタデータ・ページのヘッダー）
+import ProgramDetect
+# 計算書ごとのページの種類の索引（2回目からはページの判定を省略する）
+import PageIndex
+# ページごとの結果のジャーナル（中断した実行の再開）
+import RunJournal
+# 重いページを監視付きの子プロセスで処理する仕組み
+import PageWatchdog
+# 次のページのストリームを先読みして展開するパイプライン
+import PagePipeline
+
+# 処理段階ごとの時間と件数の計測（既定では無効）
+import Instrument
+# 処理状況・検出した数値のイベントログ（print の代わり）
+import EventLog
 
 # その他のimport
 import os,time
@@ -41,9 +62,8 @@ import sys
 import numpy as np
 import logging
 import re
-
-kind = ""
-version = ""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 #============================================================================
 #  浮動小数点数値を表しているかどうかを判定する関数
@@ -71,6 +91,56 @@ def isint(s):
     #end if
 #end def
 
+#============================================================================
+#  検出結果を描画したPDFのファイル名を返す関数
+#============================================================================
+def MakeOutFileName(pdf_file, limit):
+    return os.path.splitext(pdf_file)[0] + '[検出結果(閾値={:.2f}'.format(limit)+')].pdf'
+#end def
+
+#============================================================================
+#
+#   1つの計算書のチェック結果（実行ごとの状態）を保持するclass
+#
+#============================================================================
+
+class CheckResult():
+
+    def __init__(self, filename, limit=0.95, stpage=0, edpage=0):
+        self.filename = filename
+        self.limit = limit
+        self.stpage = stpage
+        self.edpage = edpage
+        self.out_file = MakeOutFileName(filename, limit) if filename else ""
+        self.kind = "不明"          # 表紙から読み取った構造計算プログラムの名称
+        self.version = "不明"       # 同じくバージョン
+        self.detect = None          # 種類の判定方法（ProgramDetect.DetectProgram の結果）
+        self.resumed = 0            # ジャーナルから再生したページの数
+        self.cancelled = False      # CheckTool.Cancel で中止した場合は True
+        self.isolated = 0           # 監視付きの子プロセスで処理したページの数
+        self.skipped = []           # 上限を超えて読み飛ばしたページと診断情報
+        self.pipeline = None        # 先読みのパイプラインの統計（PagePipeline.Stats）
+        self.pageNo = []            # 検出のあったページ
+        self.hits = 0               # 検出した箇所の数
+        self.ok = False
+        self.error = None
+        self.time = 0.0
+    #end def
+
+    def __bool__(self):
+        return self.ok
+    #end def
+
+    def ToDict(self):
+        return {"file": self.filename, "output": self.out_file, "ok": self.ok, "kind": self.kind,
+                "version": self.version, "detect": self.detect, "pages": list(self.pageNo), "hits": self.hits,
+                "resumed": self.resumed, "cancelled": self.cancelled, "isolated": self.isolated,
+                "skipped": list(self.skipped), "pipeline": self.pipeline, "error": self.error, "time": round(self.time, 3)}
+    #end def
+#end class
+#*********************************************************************************
+
+
 #============================================================================
 #
 #   構造計算書のチェックを行うclass
@@ -84,22 +154,38 @@ class CheckTool():
     
     def __init__(self):
 
+        self.ResetMemberData()
+        self.makePattern()
+        # 源真ゴシック等幅フォントおよびIPAexゴシックフォント
+        # （フォントの登録は描画の直前にプロセスで一度だけ行う）
+        self.fontname1 = FONTNAME1
+        self.fontname2 = FONTNAME2
+        # 構造計算プログラムの判定結果のキャッシュ（None の場合は毎回判定する）
+        self.DetectCache = ProgramDetect.CACHE_FILE
+        # ページの種類の索引を使うかどうかと、索引を保存するフォルダ（None の場合は計算書と同じフォルダ）
+        self.UsePageIndex = True
+        self.IndexDir = None
+        # ページごとの結果をジャーナルに記録し、中断した実行を再開するかどうか
+        self.UseJournal = True
+        # 実行中のチェックの中止の要求（Cancel で設定し、次のページの前に止まる）
+        self.CancelEvent = threading.Event()
+        # 1ページの処理時間とメモリの上限（PageWatchdog.PageBudget。None の場合は隔離しない）
+        self.PageBudget = None
+        # 先読みするページ数（0 の場合は先読みしないで1ページずつ順番に処理する）
+        self.PrefetchDepth = PagePipeline.DEPTH
+    #end def
+    #*********************************************************************************
+
+
+    #==================================================================================
+    #   計算書ごとに蓄積する部材データを初期化する関数
+    #   （同じインスタンスで別の計算書を続けて処理する場合に使用）
+    #==================================================================================
+
+    def ResetMemberData(self):
         self.MemberPosition = {}    # 部材符号と諸元データの辞書
         self.memberData = {}
         self.memberName = []
-        self.makePattern()
-        # 源真ゴシック等幅フォント
-        # GEN_SHIN_GOTHIC_MEDIUM_TTF = "/Library/Fonts/GenShinGothic-Monospace-Medium.ttf"
-        GEN_SHIN_GOTHIC_MEDIUM_TTF = "./Fonts/GenShinGothic-Monospace-Medium.ttf"
-        self.fontname1 = 'GenShinGothic'
-        # IPAexゴシックフォント
-        # IPAEXG_TTF = "/Library/Fonts/ipaexg.ttf"
-        IPAEXG_TTF = "./Fonts/ipaexg.ttf"
-        self.fontname2 = 'ipaexg'
-        
-        # フォント登録
-        pdfmetrics.registerFont(TTFont(self.fontname1, GEN_SHIN_GOTHIC_MEDIUM_TTF))
-        pdfmetrics.registerFont(TTFont(self.fontname2, IPAEXG_TTF))
     #end def
     #*********************************************************************************
 
@@ -108,36 +194,20 @@ class CheckTool():
     #   表紙の文字から構造計算プログラムの種類とバージョンを読み取る関数
     #==================================================================================
 
+    @Instrument.Timed("cover")
     def CoverCheck(self, page, interpreter, device):
-        global kind, version
 
         interpreter.process_page(page)
         # １文字ずつのレイアウトデータを取得
         layout = device.get_result()
 
-        CharData = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                m1 = lt.matrix
-                if m1[1] == 0.0 :  # 回転していない文字のみを抽出
-                    CharData.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
+        # 文字（回転の有無）・線などに分ける（RecordingDevice の結果はそのまま使う）
+        part = PartitionOf(layout)
+        CharData = part.chars
 
         # その際、CharData2をY座標の高さ順に並び替えるためのリスト「CY」を作成
-        CharData2=[]
-        CY = []
-        for cdata in CharData:
-            char2 = cdata[0]
-            x0 = cdata[1]
-            x1 = cdata[2]
-            y0 = cdata[3]
-            y1 = cdata[4]
-            CharData2.append(cdata)
-            CY.append(int(y0))
-        #next
+        CharData2 = list(CharData)
+        CY = part.CharBoxes()[:, 2].astype(int)    # 文字の座標の配列の y0 の整数部分
         
         # リスト「CY」から降順の並び替えインデックッスを取得
         y=np.argsort(np.array(CY))[::-1]
@@ -203,57 +273,13 @@ class CheckTool():
             #next
         #end if
 
-        CharData2 = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                if lt.matrix[1] > 0.0 : # 正の回転している文字のみを抽出
-                    CharData2.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                if lt.matrix[1] < 0.0 : # 正の回転している文字のみを抽出
-                    CharData2.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
+        # 回転した文字を列ごとのランにまとめて追加
+        RotLines, RotChars = RotatedRuns(part.rotated)
+        t1 += RotLines
+        CharData5 += RotChars
 
-        fline = []
-        Sflag = False
-        tt2 = ""
-
-        fline = []
-        Sflag = False
-        tt2 = ""
-        for F1 in CharData2:
-            if not Sflag:
-                if F1[0] != " ":
-                    fline.append(F1)
-                    tt2 += F1[0]
-                    Sflag = True
-            else:
-                if F1[0] == " ":
-                    CharData5.append(fline)
-                    t1.append([tt2])
-                    fline = []
-                    tt2 = ""
-                    Sflag = False
-                else:
-                    fline.append(F1)
-                    tt2 += F1[0]
-                #end if
-            #end if
-        #next
-
-        if len(fline)>0:
-            CharData5.append(fline)
-            t1.append([tt2])
-        #end if
         kind ="不明"
-        vesion = "不明"
+        version = "不明"
         for line in t1:
             # 全角の'：'と'／'を半角に置換
             t2 = line[0].replace(" ","").replace("：",":").replace("／","/")
@@ -277,68 +303,24 @@ class CheckTool():
     #   各ページから１文字ずつの文字と座標データを抽出し、行毎の文字配列および座標配列を戻す関数
     #==================================================================================
 
+    @Instrument.Timed("MakeChar")
     def MakeChar(self, page, interpreter, device):
 
         interpreter.process_page(page)
         # １文字ずつのレイアウトデータを取得
         layout = device.get_result()
 
-        CharData = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                m1 = lt.matrix
-                if m1[1] == 0.0 :  # 回転していない文字のみを抽出
-                    CharData.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
+        # 文字（回転の有無）・線などに分ける（RecordingDevice の結果はそのまま使う）
+        part = PartitionOf(layout)
+        CharData = part.chars
+        Instrument.Count("glyphs", len(CharData))
 
 
-        LineData = []
-        RectData = []
-        for lt in layout:
-            if isinstance(lt, LTLine):  # レイアウトデータうち、LTLineのみを取得
-                lineDic = {}
-                lineDic["x0"] = lt.x0
-                lineDic["x1"] = lt.x1
-                lineDic["y0"] = lt.y0
-                lineDic["y1"] = lt.y1
-                lineDic["height"] = lt.height
-                lineDic["width"] = lt.width
-                lineDic["linewidth"] = lt.linewidth
-                lineDic["pts"] = lt.pts
-                if lt.x0 == lt.x1 :
-                    lineAngle = "V"
-                else:
-                    lineAngle = "H"
-                #end if
-                lineDic["angle"] = lineAngle
-                LineData.append(lineDic)
-            #end if
-            if isinstance(lt, LTRect):
-                RectDic = {}
-                RectDic["x0"] = lt.x0
-                RectDic["x1"] = lt.x1
-                RectDic["y0"] = lt.y0
-                RectDic["y1"] = lt.y1
-                RectData.append(RectDic)
-            #end if
-        #next
+        LineData = part.LineDicts()
 
         # その際、CharData2をY座標の高さ順に並び替えるためのリスト「CY」を作成
-        CharData2=[]
-        CY = []
-        for cdata in CharData:
-            char2 = cdata[0]
-            x0 = cdata[1]
-            x1 = cdata[2]
-            y0 = cdata[3]
-            y1 = cdata[4]
-            
-            CharData2.append(cdata)
-            CY.append(int(y0))
-        #next
+        CharData2 = list(CharData)
+        CY = part.CharBoxes()[:, 2].astype(int)    # 文字の座標の配列の y0 の整数部分
         
         # リスト「CY」から降順の並び替えインデックッスを取得
         y=np.argsort(np.array(CY))[::-1]
@@ -407,58 +389,12 @@ class CheckTool():
             #next
         #end if
 
-        CharData2 = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                if lt.matrix[1] > 0.0 : # 正の回転している文字のみを抽出
-                    CharData2.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #nexr
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                if lt.matrix[1] < 0.0 : # 正の回転している文字のみを抽出
-                    CharData2.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end iuf
-        #next
-        
-        fline = []
-        Sflag = False
-        tt2 = ""
-        
-        fline = []
-        Sflag = False
-        tt2 = ""
-        for F1 in CharData2:
-            if not Sflag:
-                if F1[0] != " ":
-                    fline.append(F1)
-                    tt2 += F1[0]
-                    Sflag = True
-                #end if
-            else:
-                if F1[0] == " ":
-                    CharData5.append(fline)
-                    t1.append([tt2])
-                    fline = []
-                    tt2 = ""
-                    Sflag = False
-                else:
-                    fline.append(F1)
-                    tt2 += F1[0]
-                #end if
-            #end if
-        #next
-
-        if len(fline)>0:
-            tt2=tt2.replace(" ","").replace("　","")
-            CharData5.append(fline)
-            t1.append([tt2])
-        #end if
+        # 回転した文字（検定比図の縦書きのラベルなど）を列ごとのランにまとめて追加
+        RotLines, RotChars = RotatedRuns(part.rotated)
+        t1 += RotLines
+        CharData5 += RotChars
 
+        Instrument.Count("lines", len(LineData))
         return t1 , CharData5, LineData
     #end def
     #*********************************************************************************
@@ -467,58 +403,23 @@ class CheckTool():
 #   各ページから１文字ずつの文字と座標データを抽出し、行毎の文字配列および座標配列を戻す関数
 #==================================================================================
 
+    @Instrument.Timed("MakeCharPlus")
     def MakeCharPlus(self, page, interpreter, device):
 
         interpreter.process_page(page)
         # １文字ずつのレイアウトデータを取得
         layout = device.get_result()
 
-        CharData = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                m1 = lt.matrix
-                if m1[1] == 0.0 :  # 回転していない文字のみを抽出
-                    CharData.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
+        # 文字（回転の有無）・線などに分ける（RecordingDevice の結果はそのまま使う）
+        part = PartitionOf(layout)
+        CharData = part.chars
+        Instrument.Count("glyphs", len(CharData))
 
-        LineData = []
-        for lt in layout:
-            if isinstance(lt, LTLine):  # レイアウトデータうち、LTLineのみを取得
-                lineDic = {}
-                lineDic["x0"] = lt.x0
-                lineDic["x1"] = lt.x1
-                lineDic["y0"] = lt.y0
-                lineDic["y1"] = lt.y1
-                lineDic["height"] = lt.height
-                lineDic["width"] = lt.width
-                lineDic["linewidth"] = lt.linewidth
-                lineDic["pts"] = lt.pts
-                if lt.x0 == lt.x1 :
-                    lineAngle = "V"
-                else:
-                    lineAngle = "H"
-                #end if
-                lineDic["angle"] = lineAngle
-                LineData.append(lineDic)
-            #end if
-        #next
+        LineData = part.LineDicts()
 
         # その際、CharData2をY座標の高さ順に並び替えるためのリスト「CY」を作成
-        CharData2=[]
-        CY = []
-        for cdata in CharData:
-            char2 = cdata[0]
-            x0 = cdata[1]
-            x1 = cdata[2]
-            y0 = cdata[3]
-            y1 = cdata[4]
-            
-            CharData2.append(cdata)
-            CY.append(int(y0))
-        #next
+        CharData2 = list(CharData)
+        CY = part.CharBoxes()[:, 2].astype(int)    # 文字の座標の配列の y0 の整数部分
         
         # リスト「CY」から昇順の並び替えインデックッスを取得
         y=np.argsort(np.array(CY))  #[::-1]
@@ -598,15 +499,9 @@ class CheckTool():
             #next
         #end if
 
-        CharData = []
-        for lt in layout:
-            if isinstance(lt, LTChar):  # レイアウトデータうち、LTCharのみを取得
-                char1 = lt.get_text()   # レイアウトデータに含まれる全文字を取得
-                if lt.matrix[1] != 0.0 : # 回転している文字のみを抽出
-                    CharData.append([char1, lt.x0, lt.x1, lt.y0, lt.y1,lt.matrix])
-                #end if
-            #end if
-        #next
+        # 回転している文字（走査済みの分割結果から）
+        CharData = list(part.rotated)
+        Instrument.Count("glyphs", len(CharData))
         
 
         # その際、CharData2をX座標の順に並び替えるためのリスト「CX」を作成
@@ -712,6 +607,7 @@ class CheckTool():
         #end if
 
 
+        Instrument.Count("lines", len(LineData))
         return t1H , CharDataH, t1V , CharDataV, LineData
     #end def
     #*********************************************************************************
@@ -719,6 +615,7 @@ class CheckTool():
 #==================================================================================
 #   床伏図から部材の符号と配置を検出する関数
 #==================================================================================
+    @Instrument.Timed("BeamMemberSearch")
     def BeamMemberSearch(self,CharLinesH , CharDataH, CharLinesV , CharDataV):
 
         dv = 20
@@ -754,30 +651,27 @@ class CheckTool():
                 # i += 1
                 line = CharLinesH[i][0]
                 # print(line)
-                items = line.split()
-                line2 = line.replace(" ","")
-                st = 0
-                for item in items:
-                    if re.match('X\d+', item):  # X1,X2,・・・・X通りの座標
+                tokens = PLAN_LEXER.Tokens(line)
+                for kind, item, n, e in tokens:
+                    if kind == "xaxis":  # X1,X2,・・・・X通りの座標
                         CharData = CharDataH[i]            
-                        n = line2.find(item, st)
                         x0 = CharData[n][1]
-                        x1 = CharData[n+len(item)-1][2]
+                        x1 = CharData[e][2]
                         X.append((x0+x1)/2.0)
                         Xname.append(item)
-                        st = n + len(item)
 
-                    elif re.match('\d+FL\S+', item) or re.match('RFL\S+', item):   # 階高
+                    elif kind == "level":   # 階高
                         FloorName = item.replace("層","")
 
-                    elif re.match('S=\d+/\d+', item):   # スケールの読取り
-                        n = line2.find("/",st)
-                        Scale = int(line2[n+1:])
-                        st = n + len(item)
+                    elif kind == "scale":   # スケールの読取り
+                        a = item[item.find("/")+1:]
+                        if isint(a):
+                            Scale = int(a)
+                        #end if
                             
-                    elif re.match('\d+\Z', item):     # X方向寸法の読取り
+                    elif kind == "dim":     # X方向寸法の読取り
                         if isint(item):
-                            if len(items)>1:    # 寸法が複数横並びの場合は柱間
+                            if len(tokens)>1:    # 寸法が複数横並びの場合は柱間
                                 if int(item)>=1000:
                                     Xlength2.append(int(item))
                                 #end if
@@ -788,14 +682,12 @@ class CheckTool():
                             #end if
                         #end if
 
-                    elif re.match('Y\d+', item):  # Y1,Y2,・・・・Y通りの座標
+                    elif kind == "yaxis":  # Y1,Y2,・・・・Y通りの座標
                         CharData = CharDataH[i]            
-                        n = line2.find(item, st)
                         y0 = CharData[n][3]
                         y1 = CharData[n][4]
                         Y.append((y0+y1)/2.0)
                         Yname.append(item)
-                        st = n + len(item)
                     #end if
                 #next
             #next
@@ -815,13 +707,11 @@ class CheckTool():
                 #next
                 # line = CharLinesV[i][0]
                 # print(line)
-                items = line.split()
-                line2 = line.replace(" ","")
-                st = 0
-                for item in items:
-                    if re.match('\d+', item):     # Y方向寸法の読取り
+                tokens = DIMENSION_LEXER.Tokens(line)
+                for kind, item, n, e in tokens:
+                    if kind == "dim":     # Y方向寸法の読取り
                         if isint(item):
-                            if len(items)>1:    # 寸法が複数横並びの場合は柱間
+                            if len(tokens)>1:    # 寸法が複数横並びの場合は柱間
                                 if int(item)>=1000:
                                     Ylength2.append(int(item))
                                 #end if
@@ -837,23 +727,18 @@ class CheckTool():
                 # i += 1
                 line = CharLinesH[i][0]
                 # print(line)
-                items = line.split()
-                line2 = line.replace(" ","")
-                st = 0
-                for item in items:
+                tokens = MEMBER_LEXER.Tokens(line)
+                for kind, item, n, e in tokens:
                     CharData = CharDataH[i]            
-                    n = line2.find(item, st)
                     x0 = CharData[n][1]
-                    x1 = CharData[n+len(item)-1][2]
+                    x1 = CharData[e][2]
                     xm = (x0+x1)/2.0
                     y0 = CharData[n][3]
-                    y1 = CharData[n+len(item)-1][4]
+                    y1 = CharData[e][4]
                     ym = (y0+y1)/2.0
-                    st = n + len(item)
-                    # if re.match('\d+G\d+', item) or re.match('-\d+G\d+', item) or re.match('B\d+', item) or re.match('RG\d+', item) or re.match('-RG\d+', item):     # 大梁
-                    if re.match('\S*\d+G\d+', item) or re.match('B\d+', item) or re.match('\S*RG\d+', item) or re.match('\S*FG\d+', item) :     # 大梁
+                    if kind == "beam":     # 大梁
                         position = []
-                        if len(items)==1: 
+                        if len(tokens)==1: 
                             position.append(FloorName)
                             position.append(Xname[0])
                             position.append(Xname[len(Xname)-1])
@@ -949,7 +834,6 @@ class CheckTool():
 
             # Ylength1 = 0
             # Ylength2 = []
-            st = 0
             for i in range(len(CharLinesV)):
                 line = ""
                 yy= CharDataV[i][0][4]
@@ -967,26 +851,19 @@ class CheckTool():
                 # print(line)
                 if "FG4A" in line:
                         a=0
-                items = line.split()
-                line2 = line.replace(" ","")
-                st = 0
-                # print(items)
-                for item in items:
-                    # if item == '2G4A':
-                    #     a=0
+                tokens = MEMBER_LEXER.Tokens(line)
+                for kind, item, n, e in tokens:
                     CharData = CharDataV[i]            
-                    n = line2.find(item, st)
                     x0 = CharData[n][1]
-                    x1 = CharData[n+len(item)-1][2]
+                    x1 = CharData[e][2]
                     xm = (x0+x1)/2.0
                     y0 = CharData[n][3]
-                    y1 = CharData[n+len(item)-1][4]
+                    y1 = CharData[e][4]
                     ym = (y0+y1)/2.0
-                    st = n + len(item)
 
-                    if re.match('\S*\d+G\d+', item) or re.match('B\d+', item) or re.match('\S*RG\d+', item) or re.match('\S*FG\d+', item):     # 大梁、小梁
+                    if kind == "beam":     # 大梁、小梁
                         position = []
-                        if len(items)==1:
+                        if len(tokens)==1:
                             position.append(FloorName)
                             position.append(Yname[0])
                             position.append(Yname[len(Yname)-1])
@@ -1140,9 +1017,61 @@ class CheckTool():
             #next
         #next
 
+#==================================================================================
+#   行毎の文字配列を「GL」の位置で区切った縦の帯（スラブ）に分ける関数
+#       帯 s は SectionN[s] < x0 かつ x1 < SectionN[s+1]（最後の帯は 2000.0）の文字
+#       戻り値は帯ごとの [(元の行番号, 帯の中の文字のリスト)]（行・文字の順番は元のまま）
+#==================================================================================
+    def SlabChars(self, CharDataLines, SectionN, xmax=2000.0):
+
+        slabs = [[] for s in SectionN]
+        Chars = [Char for CharLine in CharDataLines for Char in CharLine]
+        if len(SectionN) == 0 or len(Chars) == 0:
+            return slabs
+        #end if
+        L = np.repeat(np.arange(len(CharDataLines)), [len(CharLine) for CharLine in CharDataLines]).tolist()
+        X0 = np.fromiter((Char[1] for Char in Chars), dtype=np.float64, count=len(Chars))
+        X1 = np.fromiter((Char[2] for Char in Chars), dtype=np.float64, count=len(Chars))
+        lo = np.array(SectionN, dtype=np.float64)
+        hi = np.append(lo[1:], xmax)
+
+        def Add(k, J):
+            # 文字の番号の順に、元の行ごとにまとめて帯 k に追加
+            slab = slabs[k]
+            for j in J:
+                li = L[j]
+                if len(slab) > 0 and slab[-1][0] == li:
+                    slab[-1][1].append(Chars[j])
+                else:
+                    slab.append((li, [Chars[j]]))
+                #end if
+            #next
+        #end def
+
+        if np.all(np.diff(lo) >= 0.0):
+            # 区切りが左から順に並んでいる場合は、一度の二分探索で各文字の帯の番号を求める
+            K = np.searchsorted(lo, X0, side="left") - 1
+            ok = (K >= 0) & (X1 < hi[np.maximum(K, 0)])
+            J = np.flatnonzero(ok)
+            K = K[J]
+            order = np.argsort(K, kind="stable")
+            bounds = np.searchsorted(K[order], np.arange(len(lo) + 1), side="left")
+            for k in range(len(lo)):
+                Add(k, J[order[bounds[k]:bounds[k+1]]].tolist())
+            #next
+        else:
+            # 区切りの順番が乱れている場合は帯ごとに判定する
+            for k in range(len(lo)):
+                Add(k, np.flatnonzero((X0 > lo[k]) & (X1 < hi[k])).tolist())
+            #next
+        #end if
+        return slabs
+    #end def
+
 #==================================================================================
 #   軸組図から部材の符号と配置を検出する関数
 #==================================================================================
+    @Instrument.Timed("ColumnMemberSearch")
     def ColumnMemberSearch(self, CharLinesH , CharDataH, CharLinesV , CharDataV):
 
         
@@ -1172,51 +1101,40 @@ class CheckTool():
 
         
         
+        # 文字を「GL」の位置で区切った帯に一度だけ分ける
+        SlabH = self.SlabChars(CharDataH, SectionN)
+        SlabV = self.SlabChars(CharDataV, SectionN)
+
         for s1 in range(len(SectionN)):
             CharDataH2=[]
             CharLinesH2 =[] 
             CharLinesV2 = [] 
             CharDataV2 = []
 
-            xxx0 = SectionN[s1]
-            if s1 < len(SectionN)-1:
-                xxx1 = SectionN[s1+1]
-            else:
-                xxx1 = 2000.0
-            #end if
-            for CharLine in CharDataH:
-                Cdata = []
+            for li, Cdata in SlabH[s1]:
                 line = ""
-                xx1 = CharLine[0][2]
-                for Char in CharLine:
-                    if Char[1]>xxx0 and Char[2]<xxx1:
-                        Cdata.append(Char)
-                        if Char[1]>xx1+7:
-                            line += " "+Char[0]
-                        else:
-                            line += Char[0]
-                        xx1 = Char[2]
-                        
-                    #end if
+                xx1 = CharDataH[li][0][2]
+                for Char in Cdata:
+                    if Char[1]>xx1+7:
+                        line += " "+Char[0]
+                    else:
+                        line += Char[0]
+                    xx1 = Char[2]
                 #next
                 if line != "":
                     CharDataH2.append(Cdata)
                     CharLinesH2.append([line])
                 #end if
             # next
-            for CharLine in CharDataV:
-                Cdata = []
+            for li, Cdata in SlabV[s1]:
                 line = ""
-                yy1 = CharLine[0][4]
-                for Char in CharLine:
-                    if Char[1]>xxx0 and Char[2]<xxx1:
-                        Cdata.append(Char)
-                        if Char[3]>yy1+7:
-                            line += " "+Char[0]
-                        else:
-                            line += Char[0]
-                        yy1 = Char[4]
-                    #end if
+                yy1 = CharDataV[li][0][4]
+                for Char in Cdata:
+                    if Char[3]>yy1+7:
+                        line += " "+Char[0]
+                    else:
+                        line += Char[0]
+                    yy1 = Char[4]
                 #next
                 if line != "":
                     CharDataV2.append(Cdata)
@@ -1239,7 +1157,7 @@ class CheckTool():
                     items = line[0].split()
                     flag = True
                     for item in items:
-                        if re.match('X\d{1}\w*',item) or re.match('Y\d{1}\w*',item):
+                        if ELEVATION_LEXER.Kind(item) in ("frame", "axis"):
                             flag = flag and True
                         else:
                             flag = flag and False
@@ -1280,42 +1198,28 @@ class CheckTool():
                     # i += 1
                     line = CharLinesH2[i][0]
                     # print(line)
-                    items = line.split()
-                    line2 = line.replace(" ","")
-                    st = 0
-                    for item in items:
-                        if re.match('X\d+フレーム', item) or re.match('Y\d+\w?フレーム', item):   # 階高
+                    tokens = ELEVATION_LEXER.Tokens(line)
+                    for kind, item, n, e in tokens:
+                        if kind == "frame":   # 階高
                             FloorName = item.replace("フレーム","")
 
-                        elif re.match('X\d+\w?', item) or re.match('Y\d+\w?', item):  # X1,X2,・・・・X通りの座標
+                        elif kind == "axis":  # X1,X2,・・・・X通りの座標
                             CharData = CharDataH2[i]            
-                            n = line2.find(item, st)
                             x0 = CharData[n][1]
-                            x1 = CharData[n+len(item)-1][2]
+                            x1 = CharData[e][2]
                             X.append((x0+x1)/2.0)
                             Xname.append(item)
-                            st = n + len(item)
 
                         
-                        elif re.match('S=1/\d+', item):   # スケールの読取り
-                            # n = line2.find("/",st)
-                            # n2 = line2.find("S=",n+2)
-                            # if n2>0 :
-                            #     Scale = int(line2[n+1:n2])
-                            # else:
-                            #     Scale = int(line2[n+1:])
-                            # st = n + len(item)
-
-                            n = item.find("/",0)
-                            a=item[n+1:]
+                        elif kind == "scale":   # スケールの読取り
+                            a = item[item.find("/")+1:]
                             # print(a)
                             if isint(a):
-                                Scale = int(item[n+1:])
-                            st += len(item)
+                                Scale = int(a)
                                 
-                        elif re.match('[0-9]+\Z', item):     # X方向寸法の読取り
+                        elif kind == "dim":     # X方向寸法の読取り
                             if isint(item):
-                                if len(items)>1:    # 寸法が複数横並びの場合は柱間
+                                if len(tokens)>1:    # 寸法が複数横並びの場合は柱間
                                     if int(item)>=1000:
                                         Xlength2.append(int(item))
                                     #end if
@@ -1326,14 +1230,12 @@ class CheckTool():
                                 #end if
                             #end if
 
-                        elif re.match('\d+FL\Z', item)or re.match('RFL\Z', item):  #　層番号の読み取り
+                        elif kind == "level":  #　層番号の読み取り
                             CharData = CharDataH2[i]            
-                            n = line2.find(item, st)
                             y0 = CharData[n][3]
                             y1 = CharData[n][4]
                             Y.append((y0+y1)/2.0)
                             Yname.append(item)
-                            st = n + len(item)
                         #end if
                     #next
                 #next
@@ -1358,13 +1260,11 @@ class CheckTool():
                     #next
                     # line = CharLinesV[i][0]
                     # print(line)
-                    items = line.split()
-                    line2 = line.replace(" ","")
-                    st = 0
-                    for item in items:
-                        if re.match('\d+', item):     # Y方向寸法の読取り
+                    tokens = DIMENSION_LEXER.Tokens(line)
+                    for kind, item, n, e in tokens:
+                        if kind == "dim":     # Y方向寸法の読取り
                             if isint(item):
-                                if len(items)>2:    # 寸法が複数横並びの場合は柱間
+                                if len(tokens)>2:    # 寸法が複数横並びの場合は柱間
                                     if int(item)>=1000:
                                         Ylength2.append(int(item))
                                     #end if
@@ -1380,23 +1280,18 @@ class CheckTool():
                     # i += 1
                     line = CharLinesH2[i][0]
                     # print(line)
-                    items = line.split()
-                    line2 = line.replace(" ","")
-                    st = 0
-                    for item in items:
+                    tokens = MEMBER_LEXER.Tokens(line)
+                    for kind, item, n, e in tokens:
                         CharData = CharDataH2[i]            
-                        n = line2.find(item, st)
                         x0 = CharData[n][1]
-                        x1 = CharData[n+len(item)-1][2]
+                        x1 = CharData[e][2]
                         xm = (x0+x1)/2.0
                         y0 = CharData[n][3]
-                        y1 = CharData[n+len(item)-1][4]
+                        y1 = CharData[e][4]
                         ym = (y0+y1)/2.0
-                        st = n + len(item)
-                        # if re.match('\d+G\d+', item) or re.match('-\d+G\d+', item) or re.match('B\d+', item) or re.match('RG\d+', item) or re.match('-RG\d+', item):     # 大梁
-                        if re.match('\S*\d+G\d+', item) or re.match('B\d+', item) or re.match('\S*RG\d+', item) or re.match('\S*FG\d+', item) :     # 大梁
+                        if kind == "beam":     # 大梁
                             position = []
-                            if len(items)==1: 
+                            if len(tokens)==1: 
                                 position.append(FloorName)
                                 position.append(Xname[0])
                                 # position.append(Xname[len(Xname)-1])
@@ -1487,7 +1382,7 @@ class CheckTool():
                             #end if
 
 
-                        if re.match('\d+C\d+', item) or re.match('\d+P\d+', item)  :     # 柱
+                        if kind == "column":     # 柱
                             position = []
                             item2 = item.replace("-","")
                             for j in range(len(Y)-1):
@@ -1540,7 +1435,7 @@ class CheckTool():
                         #end if
 
 
-                        if re.match('EW\d+\w?\(\d+\)', item) or re.match('EW\d+\w?', item) :     # 柱
+                        if kind == "wall":     # 耐震壁
                             
                             n = item.find("(",0)
                             if n>0:
@@ -1550,7 +1445,7 @@ class CheckTool():
                             #end if
                             # item2 = item.replace("-","")
                             position = []
-                            if len(items)<=1: 
+                            if len(tokens)<=1: 
                                 position.append(FloorName)
                                 position.append(Xname[0])
                                 # position.append(Xname[len(Xname)-1])
@@ -1867,6 +1762,7 @@ class CheckTool():
         return ""
     #end def
 
+    @Instrument.Timed("BeamSectionSearch")
     def BeamSectionSearch(self,CharLines , CharData ,LineDatas):
         dx = 3.0
         # CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -2200,6 +2096,7 @@ class CheckTool():
         #next
             
 
+    @Instrument.Timed("ColumnSectionSearch")
     def ColumnSectionSearch(self,CharLines , CharData ,LineDatas):
         dx = 3.0
         # CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -2546,28 +2443,11 @@ class CheckTool():
 
 
     #==================================================================================
-    #   各ページの数値を検索し、閾値を超える数値を四角で囲んだPDFファイルを作成する関数
-    #   （SS7用の関数）
+    #   SS7のページに含まれる見出しの文字からページの種類（モード）を判定する関数
+    #   （SS7の処理と、ページを先に分類しておく並列処理の両方で使用する）
     #==================================================================================
 
-    def SS7(self, page, limit, interpreter, device,interpreter2, device2):
-        
-        #============================================================
-        # 構造計算書がSS7の場合の処理
-        #============================================================
-        pageFlag = False
-        ResultData = []
-        pageFlag2 = False
-        ResultData2 = []
-        limit1 = limit
-        limit2 = limit
-        limit3 = limit
-        interpreter.process_page(page)
-        layout = device.get_result()
-        #
-        #   このページに「柱の断面検定表」、「梁の断面検定表」、「壁の断面検定表」、「検定比図」の
-        #   文字が含まれている場合のみ数値の検索を行う。
-        #
+    def SS7PageMode(self, layout):
         QDL_Flag = False
         検定表_Flag = False
         柱_Flag = False
@@ -2582,8 +2462,6 @@ class CheckTool():
         断面リスト壁_Flag = False
         軸組図_Flag = False
     
-        xd = 3      #  X座標の左右に加える余白のサイズ（ポイント）を設定
-
         mode = ""
         texts = ""
         for lt in layout:
@@ -2690,10 +2568,16 @@ class CheckTool():
             mode = "断面リスト柱"
         #end if
 
+        Flags = {"柱": 柱_Flag, "梁": 梁_Flag, "壁": 壁_Flag, "杭": 杭_Flag, "ブレース": ブレース_Flag,
+                 "検定比図": 検定比図_Flag, "床伏図": 床伏図_Flag, "軸組図": 軸組図_Flag,
+                 "断面リスト梁": 断面リスト梁_Flag, "断面リスト柱": 断面リスト柱_Flag,
+                 "断面リスト壁": 断面リスト壁_Flag}
+        return mode, Flags
+    #end def
 
-
-        
-        i = 0
+    def SS7PageInfo(self, layout):
+        # 検索モード・フラグと構造種別（SS7 の処理と PageIndex に記録する項目）
+        mode, Flags = self.SS7PageMode(layout)
         B_kind = ""
         for lt in layout:
             # LTTextContainerの場合だけ標準出力　断面算定表(杭基礎)
@@ -2713,19 +2597,75 @@ class CheckTool():
                 #end if
             #end if
         #next
+        return {"mode": mode, "flags": Flags, "B_kind": B_kind}
+    #end def
+    #*********************************************************************************
+
+
+    #==================================================================================
+    #   各ページの数値を検索し、閾値を超える数値を四角で囲んだPDFファイルを作成する関数
+    #   （SS7用の関数）
+    #==================================================================================
+
+    def SS7(self, page, limit, interpreter, device,interpreter2, device2, layout=None, info=None):
+        
+        #============================================================
+        # 構造計算書がSS7の場合の処理
+        #============================================================
+        pageFlag = False
+        ResultData = []
+        pageFlag2 = False
+        ResultData2 = []
+        limit1 = limit
+        limit2 = limit
+        limit3 = limit
+        #
+        #   このページに「柱の断面検定表」、「梁の断面検定表」、「壁の断面検定表」、「検定比図」の
+        #   文字が含まれている場合のみ数値の検索を行う。
+        #   （info : ページの種類の索引に記録した SS7PageInfo の結果。ある場合はページを解析しない）
+        #
+        if info is None:
+            if layout is None:
+                interpreter.process_page(page)
+                layout = device.get_result()
+            #end if
+            with Instrument.Stage("classify"):
+                info = self.SS7PageInfo(layout)
+            #end with
+        #end if
+        mode = info["mode"]
+        Flags = info["flags"]
+        B_kind = info["B_kind"]
+        柱_Flag = Flags["柱"]
+        梁_Flag = Flags["梁"]
+        壁_Flag = Flags["壁"]
+        杭_Flag = Flags["杭"]
+        ブレース_Flag = Flags["ブレース"]
+        検定比図_Flag = Flags["検定比図"]
+        床伏図_Flag = Flags["床伏図"]
+        軸組図_Flag = Flags["軸組図"]
+        断面リスト梁_Flag = Flags["断面リスト梁"]
+        断面リスト柱_Flag = Flags["断面リスト柱"]
+    
+        xd = 3      #  X座標の左右に加える余白のサイズ（ポイント）を設定
+
+        i = 0
 
         if mode == "" :     # 該当しない場合はこのページの処理は飛ばす。
-            print("No Data")
+            EventLog.Info("skip", reason="No Data")
+            Instrument.Count("pages_skipped")
             return False,[],False,[]
         else:
-            print(mode)
+            EventLog.Info("mode", mode=mode)
         #end if
+        lap = Instrument.Lap("check:")
 
 
         #=================================================================================================
         #   床伏図の部材寸法チェック
         #=================================================================================================
         
+        lap.Next("床伏図", 床伏図_Flag)
         if 床伏図_Flag :
             CharLinesH , CharDataH, CharLinesV , CharDataV ,LineDatas = self.MakeCharPlus(page, interpreter2,device2)
             self.BeamMemberSearch(CharLinesH , CharDataH, CharLinesV , CharDataV)
@@ -2741,6 +2681,7 @@ class CheckTool():
         #   軸組図の部材寸法チェック
         #=================================================================================================
         
+        lap.Next("軸組図", 軸組図_Flag)
         if 軸組図_Flag :
             CharLinesH , CharDataH, CharLinesV , CharDataV ,LineDatas = self.MakeCharPlus(page, interpreter2,device2)
             self.ColumnMemberSearch(CharLinesH , CharDataH, CharLinesV , CharDataV)
@@ -2757,6 +2698,7 @@ class CheckTool():
         #   断面リスト梁のチェック
         #=================================================================================================
         
+        lap.Next("断面リスト梁", 断面リスト梁_Flag)
         if 断面リスト梁_Flag :
             dx = 3.0
             CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -2766,6 +2708,7 @@ class CheckTool():
         #   断面リスト柱のチェック
         #=================================================================================================
         
+        lap.Next("断面リスト柱", 断面リスト柱_Flag)
         if 断面リスト柱_Flag :
             dx = 3.0
             CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -2776,6 +2719,7 @@ class CheckTool():
         #   検定比図のチェック
         #=================================================================================================
         
+        lap.Next("検定比図", 検定比図_Flag)
         if 検定比図_Flag :
 
             CharLines , CharData ,LineData = self.MakeChar(page, interpreter2,device2)
@@ -2842,7 +2786,7 @@ class CheckTool():
                                     flag = True
                                     pageFlag = True
                                     val = a
-                                    print('val={:.2f}'.format(val))
+                                    EventLog.Debug("hit", val=val)
                                 #end if
                             #end if
 
@@ -2857,6 +2801,7 @@ class CheckTool():
         #   柱の検定表のチェック
         #=================================================================================================
                         
+        lap.Next("柱", 柱_Flag)
         if 柱_Flag : 
 
             CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -2909,7 +2854,7 @@ class CheckTool():
                                     flag = True
                                     pageFlag = True
                                     val = a
-                                    print('val={:.2f}'.format(val))
+                                    EventLog.Debug("hit", val=val)
 
                     i = -1
                     for CarDataOfline in CharLines:
@@ -2948,7 +2893,7 @@ class CheckTool():
                                             flag = True
                                             pageFlag = True
                                             val = a
-                                            print('val={:.2f}'.format(val))
+                                            EventLog.Debug("hit", val=val)
                                         #end if
                                     #end if
                                     
@@ -3013,7 +2958,7 @@ class CheckTool():
                                                     flag = True
                                                     pageFlag = True
                                                     val = a
-                                                    print('val={:.2f}'.format(val))
+                                                    EventLog.Debug("hit", val=val)
                                                 #end if
                                             #end if
                                             
@@ -3084,7 +3029,7 @@ class CheckTool():
                     for name in tt3:
                         name = name.replace(" ","").replace("[","").replace("]","")
                         kind = self.checkPattern(name)
-                        print(name,kind)
+                        EventLog.Debug("word", name=name, kind=kind)
                         if kind == "符号名":
                             if flag1 :
                                 edline.append(i-1)
@@ -3471,6 +3416,7 @@ class CheckTool():
         #   梁の検定表のチェック
         #=================================================================================================
                             
+        lap.Next("梁", 梁_Flag)
         if 梁_Flag : 
             # keys = list(self.MemberPosition.keys())
             # for key in keys:
@@ -3517,7 +3463,7 @@ class CheckTool():
                                             flag = True
                                             pageFlag = True
                                             val = a
-                                            print('val={:.2f}'.format(val))
+                                            EventLog.Debug("hit", val=val)
                                         #end if
                                     #end if
 
@@ -3584,7 +3530,7 @@ class CheckTool():
                                                 flag = True
                                                 pageFlag = True
                                                 val = a
-                                                print('val={:.2f}'.format(val))
+                                                EventLog.Debug("hit", val=val)
                                             #end if
                                         #end if
                                         st = t3.find(w1,st)+ len(w1)
@@ -4020,6 +3966,7 @@ class CheckTool():
         #   耐力壁の検定表のチェック
         #=================================================================================================
 
+        lap.Next("壁", 壁_Flag)
         if 壁_Flag:
             outtext1 , CharData1 ,LineDatas = self.MakeChar(page, interpreter2,device2)
             
@@ -4080,7 +4027,7 @@ class CheckTool():
                                 flag = True
                                 pageFlag = True
                                 val = a
-                                print('val={:.2f}'.format(val))
+                                EventLog.Debug("hit", val=val)
 
                         i += 1
                         t3 = outtext1[i][0]
@@ -4129,13 +4076,14 @@ class CheckTool():
                                 flag = True
                                 pageFlag = True
                                 val = a
-                                print('val={:.2f}'.format(val))
+                                EventLog.Debug("hit", val=val)
                             #end if
                         #end if
                     #end if
                 #end while
             #end if
 
+        lap.Next("杭", 杭_Flag)
         if 杭_Flag:
             pageFlag = False
 
@@ -4144,6 +4092,7 @@ class CheckTool():
         #   ブレースの検定表のチェック
         #=================================================================================================
                         
+        lap.Next("ブレース", ブレース_Flag)
         if ブレース_Flag : 
 
             CharLines , CharData ,LineDatas = self.MakeChar(page, interpreter2,device2)
@@ -4203,7 +4152,7 @@ class CheckTool():
                                                 flag = True
                                                 pageFlag = True
                                                 val = a
-                                                print('val={:.2f}'.format(val))
+                                                EventLog.Debug("hit", val=val)
                                             #end if
                                         #end if
                                         
@@ -4218,10 +4167,12 @@ class CheckTool():
         
         #==========================================================================
         #  検出結果を出力する
+        lap.Stop()
         return pageFlag, ResultData, pageFlag2, ResultData2
     #end def
     #*********************************************************************************
 
+    @Instrument.Timed("OtherSheet")
     def OtherSheet(self, page, limit, interpreter, device,interpreter2, device2):
         
         #============================================================
@@ -4256,10 +4207,11 @@ class CheckTool():
         #next
 
         if not 検定比_Flag  :     # 該当しない場合はこのページの処理は飛ばす。
-            print("No Data")
+            EventLog.Info("skip", reason="No Data")
+            Instrument.Count("pages_skipped")
             return False,[]
-        # else:
-        #     print(mode)
+        else:
+            EventLog.Info("mode", mode="検定比")
         #end if
 
         #=================================================================================================
@@ -4336,7 +4288,7 @@ class CheckTool():
                                     flag = True
                                     pageFlag = True
                                     val = a
-                                    print('val={:.2f}'.format(val))
+                                    EventLog.Debug("hit", val=val)
                                 #end if
                             #end if
 
@@ -4355,47 +4307,11 @@ class CheckTool():
     #*********************************************************************************
 
 
-    #============================================================================
-    #  プログラムのメインルーチン（外部から読み出す関数名）
-    #============================================================================
-
-    def CheckTool(self,filename, limit=0.95 ,stpage=0, edpage=0):
-        global flag1, fname, dir1, dir2, dir3, dir4, dir5, folderName, paraFileName
-        global ErrorFlag, ErrorMessage
-        global kind, verion
-
-        if filename =="" :
-            return False
-        #end if
-
-        pdf_file = filename
-        pdf_out_file = os.path.splitext(pdf_file)[0] + '[検出結果(閾値={:.2f}'.format(limit)+')].pdf'
+    #==================================================================================
+    #   検索するページの範囲（開始ページ・終了ページ）を決める関数
+    #==================================================================================
 
-        # PyPDF2のツールを使用してPDFのページ情報を読み取る。
-        # PDFのページ数と各ページの用紙サイズを取得
-        try:
-            with open(pdf_file, "rb") as input:
-                reader = PR2(input)
-                PageMax = len(reader.pages)     # PDFのページ数
-                PaperSize = []
-                for page in reader.pages:       # 各ページの用紙サイズの読取り
-                    p_size = page.mediabox
-                    page_xmin = float(page.mediabox.lower_left[0])
-                    page_ymin = float(page.mediabox.lower_left[1])
-                    page_xmax = float(page.mediabox.upper_right[0])
-                    page_ymax = float(page.mediabox.upper_right[1])
-                    PaperSize.append([page_xmax - page_xmin , page_ymax - page_ymin])
-            #end with
-        except OSError as e:
-            print(e)
-            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
-            return False, kind, version
-        except:
-            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
-            return False, kind, version
-        #end try
-        
-        #=============================================================
+    def PageRange(self, PageMax, stpage=0, edpage=0):
         if stpage <= 0 :      # 検索を開始する最初のページ
             startpage = 2
         elif stpage > PageMax:
@@ -4411,124 +4327,130 @@ class CheckTool():
         else:
             endpage = edpage
         #end if
+        return startpage, endpage
+    #end def
+    #*********************************************************************************
 
-        # PDFMinerのツールの準備
+
+    #==================================================================================
+    #   PDFMinerのツール（インタープリタとデバイス）を作成する関数
+    #==================================================================================
+
+    def MakeTools(self):
         resourceManager = PDFResourceManager()
         # PDFから単語を取得するためのデバイス
         device = PDFPageAggregator(resourceManager, laparams=LAParams())
-        # PDFから１文字ずつを取得するためのデバイス
-        device2 = PDFPageAggregator(resourceManager)
+        # PDFから１文字ずつと罫線を取得するためのデバイス（レイアウトの木を作らずに記録する）
+        device2 = RecordingDevice(resourceManager)
 
-        pageResultData = []
-        pageNo = []
-        pageResultData2 = []
-        pageNo2 = []
-        pageFlag = False
-        pageFlag2 = False
+        interpreter = TimedPageInterpreter(resourceManager, device)
+        interpreter2 = TimedPageInterpreter(resourceManager, device2)
+        return interpreter, device, interpreter2, device2
+    #end def
+    #*********************************************************************************
 
-        try:
-            with open(pdf_file, 'rb') as fp:
-                interpreter = PDFPageInterpreter(resourceManager, device)
-                interpreter2 = PDFPageInterpreter(resourceManager, device2)
-                pageI = 0
-                        
-                for page in PDFPage.get_pages(fp):
-                    pageI += 1
-
-                    ResultData = []
-                    print("page={}:".format(pageI), end="")
-                    if pageI == 1 :
-                        pageFlag = True
-                        kind, version = self.CoverCheck(page, interpreter2, device2)
-                        print()
-                        print("プログラムの名称：{}".format(kind))
-                        print("プログラムのバーsジョン：{}".format(version))
-
-                        with open("./kind.txt", 'w', encoding="utf-8") as fp2:
-                            print(kind, file=fp2)
-                            print(version, file=fp2)
-                            fp2.close()
 
-                    else:
+    #==================================================================================
+    #   構造計算プログラムの種類とバージョンを判定する関数（RunCheck と同じ順番）
+    #   メタデータ・先頭のページのヘッダーで判定できない場合だけ、表紙の文字を1文字ずつ読む
+    #==================================================================================
 
-                        if pageI < startpage:
-                            print()
-                            continue
-                        #end if
-                        if pageI > endpage:
-                            break
-                        #end if
+    def DetectKind(self, source, interpreter, device, interpreter2, device2):
+        info = ProgramDetect.DetectProgram(source, interpreter, device, cache=self.DetectCache)
+        if info["kind"] != ProgramDetect.UNKNOWN:
+            return info["kind"], info["version"]
+        #end if
+        return self.CoverCheck(source.Pages()[0], interpreter2, device2)
+    #end def
+    #*********************************************************************************
 
-                        if kind == "SuperBuild/SS7":
-                            #============================================================
-                            # 構造計算書がSS7の場合の処理
-                            #============================================================
 
-                            pageFlag, ResultData, pageFlag2, ResultData2 = self.SS7(page, limit, interpreter, device, interpreter2, device2)
-                            if pageFlag2:
-                                a=0
-                        # 他の種類の構造計算書を処理する場合はここに追加
-                        # elif kind == "****":
-                        #     pageFlag, ResultData = self.***(page, limit, interpreter, device, interpreter2, device2)
+    #==================================================================================
+    #   表紙以外の1ページの数値を検索する関数（プログラムの種類で処理を切り替える）
+    #==================================================================================
 
-                        else:
-                            #============================================================
-                            # 構造計算書の種類が不明の場合はフォーマットを無視して数値のみを検出
-                            #============================================================
+    def CheckPage(self, page, kind, limit, interpreter, device, interpreter2, device2, layout=None, info=None):
+        pageFlag2 = False
+        ResultData2 = []
+        if kind == "SuperBuild/SS7":
+            #============================================================
+            # 構造計算書がSS7の場合の処理
+            #============================================================
 
-                            pageFlag, ResultData = self.OtherSheet(page, limit, interpreter, device, interpreter2, device2)
+            pageFlag, ResultData, pageFlag2, ResultData2 = self.SS7(page, limit, interpreter, device, interpreter2, device2, layout, info)
 
-                            # return False
-                        #end if
+        # 他の種類の構造計算書を処理する場合はここに追加
+        # elif kind == "****":
+        #     pageFlag, ResultData = self.***(page, limit, interpreter, device, interpreter2, device2)
 
-                    if pageFlag or pageFlag2 : 
-                        pageNo.append(pageI)
-                        if pageFlag:
-                            pageResultData.append(ResultData)
-                        else:
-                            pageResultData.append([])
-                        #end if
-                        if pageFlag2 : 
-                            pageResultData2.append(ResultData2)
-                        else:
-                            pageResultData2.append([])
-                        #end if
-                    #end if
-                    
-                #next
+        else:
+            #============================================================
+            # 構造計算書の種類が不明の場合はフォーマットを無視して数値のみを検出
+            #============================================================
 
-                fp.close()
-            # end with
+            pageFlag, ResultData = self.OtherSheet(page, limit, interpreter, device, interpreter2, device2)
+        #end if
+        return pageFlag, ResultData, pageFlag2, ResultData2
+    #end def
+    #*********************************************************************************
 
-        except OSError as e:
-            print(e)
-            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
-            return False
-        except:
-            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
-            return False
-        #end try
 
+    #==================================================================================
+    #   部材データ（伏図・軸組図・断面リストから読み取った情報）を取り出す関数と
+    #   別のプロセスで読み取った部材データを統合する関数（ページ順に統合すること）
+    #==================================================================================
+
+    def GetMemberData(self):
+        return {"MemberPosition": self.MemberPosition,
+                "memberData": self.memberData,
+                "memberName": self.memberName}
+    #end def
 
-        # 使用したデバイスをクローズ
-        device.close()
-        device2.close()
+    def MergeMemberData(self, data):
+        for name, dic1 in data["MemberPosition"].items():
+            if not name in self.MemberPosition:
+                self.MemberPosition[name] = {}
+            #end if
+            dic2 = self.MemberPosition[name]
+            for key, value in dic1.items():
+                if key in dic2 and isinstance(dic2[key], list) and isinstance(value, list):
+                    dic2[key] = dic2[key] + value
+                else:
+                    dic2[key] = value
+                #end if
+            #next
+        #next
+        for name, value in data["memberData"].items():
+            self.memberData[name] = value
+        #next
+        self.memberName += data["memberName"]
+    #end def
+    #*********************************************************************************
+
+
+    #==================================================================================
+    #   数値検出結果を用いて各ページに四角形を描画したPDFファイルを作成する関数
+    #==================================================================================
+
+    @Instrument.Timed("annotate")
+    def MakeResultPdf(self, source, pdf_out_file, limit, PaperSize, pageNo, pageResultData, pageResultData2):
 
-        #============================================================================================
-        #
-        #   数値検出結果を用いて各ページに四角形を描画する
-        #
-        #============================================================================================
-        
         try:
-            in_path = pdf_file
+            from pdfrw.buildxobj import pagexobj
+            from pdfrw.toreportlab import makerl
+            from reportlab.pdfgen import canvas
+            from reportlab.lib.units import mm
+
+            # フォント登録（プロセスで一度だけ）
+            RegisterFonts()
+
             out_path = pdf_out_file
 
             # 保存先PDFデータを作成
             cc = canvas.Canvas(out_path)
             cc.setLineWidth(1)
-            # PDFを読み込む
-            pdf = PdfReader(in_path, decompress=False)
+            # PDFを読み込む（マップ済みのバッファから）
+            pdf = source.PdfrwReader(decompress=False)
 
             self.memberData = {}
             self.memberName = []
@@ -4645,27 +4567,410 @@ class CheckTool():
             # PDFの保存
             cc.save()
 
-            # time.sleep(1.0)
-            # # すべての処理がエラーなく終了したのでTrueを返す。
-            # return True
 
         except OSError as e:
-            print(e)
+            EventLog.Error("error", message=str(e))
             logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
             return False
         except:
             logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
             return False
-
         #end try
 
-        # すべての処理がエラーなく終了したのでTrueを返す。
         return True
+    #end def
+    #*********************************************************************************
+
+
+    #============================================================================
+    #  プログラムのメインルーチン（外部から読み出す関数名）
+    #       実行ごとの状態は CheckResult に保持するので、別々のインスタンスであれば
+    #       同じプロセスの複数のスレッドで同時に実行できる
+    #============================================================================
+
+    def CheckTool(self,filename, limit=0.95 ,stpage=0, edpage=0):
+        return self.Run(filename, limit=limit, stpage=stpage, edpage=edpage).ok
+    #end def
+
+    def IsolatedPage(self, watchdog, result, pageI, pageInfo, features):
+        # 戻り値 : (CheckPage の結果, 追加された部材データ, 読み飛ばしたかどうか)
+        status, value, diag = watchdog.Call(PageWatchdog.CheckPageTask,
+                                            (result.filename, pageI, result.kind, result.limit, self.GetMemberData(), pageInfo))
+        if status == "ok":
+            pageResult, delta = value
+            self.MergeMemberData(delta)
+            return pageResult, delta, False
+        #end if
+        if status == "error":
+            # ページの処理中の例外はこれまでどおりチェックのエラーにする
+            raise RuntimeError(value)
+        #end if
+        skip = dict(diag, page=pageI, reason=status, mode=pageInfo["mode"] if pageInfo else "")
+        skip.update(features or {})
+        result.skipped.append(skip)
+        EventLog.Error("skip", **skip)
+        Instrument.Count("pages_over_budget")
+        return (False, [], False, []), None, True
+    #end def
+
+    def Cancel(self):
+        # 別のスレッドから実行中のチェックを中止する（ジャーナルは残るので、次の実行で続きから処理する）
+        self.CancelEvent.set()
+    #end def
+
+    def Run(self,filename, limit=0.95 ,stpage=0, edpage=0):
+        time_sta = time.perf_counter()
+        result = CheckResult(filename, limit, stpage, edpage)
+        # ページごとの計測値を計算書ごとに分ける（CheckFiles で複数の計算書を同時に処理する場合）
+        document = Instrument.CurrentDocument()
+        Instrument.SetDocument(filename)
+        try:
+            if filename != "" :
+                result.ok = self.RunCheck(result)
+            #end if
+        finally:
+            Instrument.SetDocument(document)
+            self.CancelEvent.clear()
+            result.time = time.perf_counter() - time_sta
+        #end try
+        return result
+    #end def
+
+    def RunCheck(self, result):
+
+        pdf_file = result.filename
+        limit = result.limit
+        pdf_out_file = result.out_file
+
+        # PDFを一度だけメモリにマップし、pdfminerの文書（相互参照表）を以降の処理で共有する。
+        # PDFのページ数と各ページの用紙サイズを取得
+        source = None
+        try:
+            with Instrument.Stage("open"):
+                source = PdfSource(pdf_file)
+            #end with
+            with Instrument.Stage("paper_size"):
+                PaperSize = source.PaperSizes()     # 各ページの用紙サイズの読取り
+            #end with
+            PageMax = len(PaperSize)            # PDFのページ数
+        except OSError as e:
+            EventLog.Error("error", message=str(e))
+            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
+            result.error = str(e)
+            if source is not None:
+                source.close()      # 開けたが読めないPDF（マップとファイルを閉じる）
+            #end if
+            return False
+        except Exception as e:
+            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
+            result.error = "{}: {}".format(type(e).__name__, e)
+            if source is not None:
+                source.close()
+            #end if
+            return False
+        #end try
+        
+        #=============================================================
+        startpage, endpage = self.PageRange(PageMax, result.stpage, result.edpage)
+
+        # PDFMinerのツールの準備
+        interpreter, device, interpreter2, device2 = self.MakeTools()
+
+        pageResultData = []
+        pageNo = []
+        pageResultData2 = []
+        pageNo2 = []
+        pageFlag = False
+        pageFlag2 = False
+        journal = None
+        watchdog = None
+        pipeline = None
+
+        try:
+            # 構造計算プログラムの種類をメタデータ・先頭のページのヘッダーから判定
+            # （表紙が1ページ目に無い計算書でも、最初から正しい処理を選ぶ）
+            info = ProgramDetect.DetectProgram(source, interpreter, device, cache=self.DetectCache)
+            result.detect = info["method"]
+            if info["kind"] != ProgramDetect.UNKNOWN:
+                result.kind, result.version = info["kind"], info["version"]
+            #end if
+
+            # ページの種類の索引（SS7の計算書で、前回までに判定したページは解析せずに処理を決める）
+            index = None
+            if self.UsePageIndex and info["kind"] == "SuperBuild/SS7":
+                index = PageIndex.Open(source, pdf_file, self.IndexDir, kind=info["kind"])
+            #end if
+
+            # 同じ条件の前回の実行が途中で止まっていれば、記録済みのページを再生して続きから処理する
+            if self.UseJournal:
+                header = {"sha1": source.Sha1(), "limit": limit, "stpage": startpage,
+                          "edpage": endpage, "kind": info["kind"]}
+                try:
+                    journal = RunJournal.RunJournal(RunJournal.JournalFile(pdf_out_file), header)
+                except OSError as e:
+                    # 書込みできない場所ではジャーナルなしで処理する
+                    EventLog.Warning("journal", message=str(e))
+                #end try
+                if journal is not None and journal.Resumed():
+                    EventLog.Info("resume", pages=len(journal.done), journal=journal.filename)
+                #end if
+            #end if
+
+            # 重いページを監視付きの子プロセスで処理する（子プロセスは最初の重いページで起動する）
+            if self.PageBudget is not None:
+                watchdog = PageWatchdog.PageWatchdog(self.PageBudget)
+            #end if
+
+            def Wanted(pageN):
+                # 先読みするページ（読み飛ばすページ・記録済みのページは展開しない）
+                if pageN == 1:
+                    return info["kind"] == ProgramDetect.UNKNOWN
+                #end if
+                if pageN < startpage or pageN > endpage:
+                    return False
+                #end if
+                if journal is not None and journal.Get(pageN) is not None:
+                    return False
+                #end if
+                return index is None or index.Get(pageN, "mode") != ""
+            #end def
+
+            if self.PrefetchDepth > 0:
+                pipeline = PagePipeline.PagePipeline(source, self.PrefetchDepth, Wanted)
+                pages = pipeline
+            else:
+                pages = enumerate(source.GetPages(), 1)
+            #end if
+                    
+            for pageI, page in pages:
+                Instrument.SetPage(pageI)
+
+                ResultData = []
+                if pageI == 1 :
+                    pageFlag = True
+                    if info["kind"] == ProgramDetect.UNKNOWN:
+                        # 判定できない場合は従来どおり表紙の文字を1文字ずつ読む
+                        result.kind, result.version = self.CoverCheck(page, interpreter2, device2)
+                        result.detect = "cover-chars"
+                    #end if
+                    EventLog.Info("cover", kind=result.kind, version=result.version, method=result.detect)
+
+                else:
+
+                    if pageI < startpage:
+                        EventLog.Debug("skip", reason="before start page")
+                        Instrument.Count("pages_skipped")
+                        continue
+                    #end if
+                    if pageI > endpage:
+                        break
+                    #end if
+
+                    if self.CancelEvent.is_set():
+                        EventLog.Info("cancel")
+                        result.cancelled = True
+                        break
+                    #end if
+
+                    rec = journal.Get(pageI) if journal is not None else None
+                    if rec is not None:
+                        # ジャーナルに記録済みのページ（部材データの差分を戻す）
+                        if rec["member"]:
+                            self.MergeMemberData(rec["member"])
+                        #end if
+                        pageFlag, ResultData, pageFlag2, ResultData2 = rec["result"]
+                        result.resumed += 1
+                    elif journal is not None and journal.Failing(pageI):
+                        # 前回までに続けて完了しなかったページは読み飛ばす
+                        EventLog.Error("skip", reason="failed in previous runs")
+                        pageFlag, ResultData, pageFlag2, ResultData2 = False, [], False, []
+                        journal.Done(pageI, (pageFlag, ResultData, pageFlag2, ResultData2), skipped=True)
+                    else:
+                        layout = None
+                        pageInfo = None
+                        if result.kind == "SuperBuild/SS7":
+                            pageInfo = index.Get(pageI) if index is not None else None
+                            if pageInfo is None or not "mode" in pageInfo:
+                                interpreter.process_page(page)
+                                layout = device.get_result()
+                                with Instrument.Stage("classify"):
+                                    pageInfo = self.SS7PageInfo(layout)
+                                #end with
+                                if index is not None:
+                                    index.Record(pageI, **pageInfo)
+                                #end if
+                            else:
+                                Instrument.Count("pages_indexed")
+                            #end if
+                        #end if
+                        if journal is not None:
+                            journal.Start(pageI)
+                        #end if
+                        risky, features = (False, None)
+                        if watchdog is not None:
+                            risky, features = watchdog.budget.Risky(page, pageInfo)
+                        #end if
+                        skipped = False
+                        if risky:
+                            # 監視付きの子プロセスで処理する（上限を超えた場合は読み飛ばす）
+                            pageResult, delta, skipped = self.IsolatedPage(watchdog, result, pageI, pageInfo, features)
+                        else:
+                            before = None
+                            if journal is not None and RunJournal.IsProducer(pageInfo):
+                                before = RunJournal.Snapshot(self)
+                            #end if
+                            pageResult = self.CheckPage(page, result.kind, limit, interpreter, device, interpreter2, device2, layout, pageInfo)
+                            delta = RunJournal.Delta(self, before)
+                        #end if
+                        pageFlag, ResultData, pageFlag2, ResultData2 = pageResult
+                        if journal is not None:
+                            journal.Done(pageI, pageResult, delta, skipped=skipped)
+                        #end if
+                    #end if
+                #end if
+
+                if pageFlag or pageFlag2 : 
+                    pageNo.append(pageI)
+                    if pageFlag:
+                        pageResultData.append(ResultData)
+                    else:
+                        pageResultData.append([])
+                    #end if
+                    if pageFlag2 : 
+                        pageResultData2.append(ResultData2)
+                    else:
+                        pageResultData2.append([])
+                    #end if
+                #end if
+                
+            #next
+
+            if index is not None:
+                index.SaveQuietly()
+            #end if
+
+        except OSError as e:
+            EventLog.Error("error", message=str(e))
+            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
+            result.error = str(e)
+            source.close()
+            return False
+        except Exception as e:
+            logging.exception(sys.exc_info())#エラーをlog.txtに書き込む
+            result.error = "{}: {}".format(type(e).__name__, e)
+            source.close()
+            return False
+        finally:
+            Instrument.SetPage(None)
+            EventLog.Flush()
+            if journal is not None:
+                journal.close()
+            #end if
+            if watchdog is not None:
+                watchdog.close()
+                result.isolated = watchdog.isolated
+            #end if
+            if pipeline is not None:
+                pipeline.close()
+                result.pipeline = pipeline.Stats()
+                EventLog.Debug("pipeline", **result.pipeline)
+            #end if
+        #end try
+
+
+        # 使用したデバイスをクローズ
+        device.close()
+        device2.close()
+
+        if result.cancelled:
+            # 中止した場合は検出結果のPDFを作らない（ジャーナルは次の実行で再開するために残す）
+            result.error = "cancelled"
+            source.close()
+            return False
+        #end if
+
+        # 検出のあったページ（表紙を除く）と検出した箇所の数
+        result.pageNo = [pageN for pageN in pageNo if pageN > 1]
+        result.hits = sum(len(pageResultData[i]) + len(pageResultData2[i]) for i in range(len(pageNo)) if pageNo[i] > 1)
+
+        #============================================================================================
+        #
+        #   数値検出結果を用いて各ページに四角形を描画する
+        #
+        #============================================================================================
+        
+        try:
+            ok = self.MakeResultPdf(source, pdf_out_file, limit, PaperSize, pageNo, pageResultData, pageResultData2)
+        finally:
+            source.close()
+            EventLog.Flush()
+        #end try
+        if ok and journal is not None:
+            journal.Remove()
+        #end if
+        return ok
 
     #end def    
     #*********************************************************************************
 
 
+#============================================================================
+#
+#   複数の計算書を1つのプロセスのスレッドプールで同時にチェックする関数
+#       スレッドごとに CheckTool のインスタンスを作り（makePattern は一度だけ）、
+#       計算書ごとに部材データを初期化して CheckTool.Run を実行する。
+#       jobs : ファイル名、または {"file":, "limit":, "stpage":, "edpage":} のリスト
+#       戻り値は jobs と同じ順番の CheckResult のリスト
+#
+#============================================================================
+
+_local = threading.local()
+
+def ThreadCheckTool():
+    # このスレッドの CheckTool（初回だけ作成）
+    CT = getattr(_local, "CheckTool", None)
+    if CT is None:
+        CT = CheckTool()
+        _local.CheckTool = CT
+    #end if
+    return CT
+#end def
+
+def CheckOne(job, limit=0.95, stpage=0, edpage=0):
+    if isinstance(job, dict):
+        filename = job["file"]
+        limit = float(job.get("limit", limit))
+        stpage = int(job.get("stpage", stpage))
+        edpage = int(job.get("edpage", edpage))
+    else:
+        filename = job
+    #end if
+    CT = ThreadCheckTool()
+    CT.ResetMemberData()
+    return CT.Run(filename, limit=limit, stpage=stpage, edpage=edpage)
+#end def
+
+def CheckFiles(jobs, limit=0.95, stpage=0, edpage=0, workers=4, report=None):
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for i, job in enumerate(jobs):
+            futures[executor.submit(CheckOne, job, limit, stpage, edpage)] = i
+        #next
+        # 終わった順に受け取る（report に途中経過を伝える。結果は jobs の順に並べる）
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if report is not None:
+                report(results[i])
+            #end if
+        #next
+    #end with
+    return results
+#end def
+#*********************************************************************************
+
+
 #==================================================================================
 #   このクラスを単独でテストする場合のメインルーチン
 #==================================================================================
@@ -0,0 +1,300 @@
+#==========================================================================================
+#   計算書ごとのページの種類の索引（ページ → 検索モード・構造種別・断面リストの表の種類）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+CheckTool は毎回すべてのページを LAParams で解析して SS7PageMode で検索モード（検定比図、柱・梁・壁・ブレースの検定表、
+床伏図、軸組図、断面リスト梁・柱）を判定し、ChartEngine（Read_Elements_from_pdf）は毎回すべてのページを
+ChartDevider で調べて断面リストの表のページを探していた。
+PageIndex はその判定結果をページごとに保存し、2回目からは判定済みのページを解析せずに処理を決める。
+
+・CheckTool : 検索モードが "" のページは読み飛ばし、それ以外のページも判定（LAParams の解析）を省略する。
+・ChartEngine : 同じ読取り方式で断面リストの表が無かったページ（"chart": {方式: false}）は ChartDevider を呼ばない。
+  他の方式の結果では読み飛ばさない（方式によって表を読み取れるページが異なるため）。
+・索引は計算書と同じフォルダの <計算書名>.pageindex.json（cache_dir を指定した場合はそのフォルダの <SHA-1>.json）。
+  ファイルの内容のハッシュ（SHA-1）が一致しない索引（計算書が差し替えられた場合）は使わない。
+・各ツールは自分が判定したページの項目だけを書き足す。記録の無いページはこれまでどおり処理する。
+
+    python PageIndex.py build 計算書.pdf [--dir キャッシュのフォルダ]   # 全ページの索引を作る
+    python PageIndex.py show 計算書.pdf [--json]                        # 索引の内容（ページの構成）を表示する
+
+索引の項目（ページ番号 : 項目）
+    mode   : SS7PageMode の検索モード（"" は検索対象外のページ）
+    flags  : SS7PageMode のフラグ
+    B_kind : 構造種別（"RC造"・"SRC造"・"S造"・""）
+    tables : 断面リストの表の部材の種類（"【大梁】"・"【基礎大梁】"・"【柱】"。ChartEngine は読み取れた場合だけ記録する）
+    chart  : 読取り方式 : ChartDevider で断面リストの表を読み取ったかどうか
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+
+import ProgramDetect
+
+# 索引のファイルの形式のバージョン（項目の意味を変えた場合は上げる）
+#   2 : chart を読取り方式ごとの辞書に変更
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".pageindex.json"
+
+# 断面リストの表の部材の種類（ChartEngine.ELEMENT_KIND と同じ）
+ELEMENT_KIND = ["【大梁】", "【基礎大梁】", "【柱】"]
+
+_lock = threading.Lock()
+
+
+#============================================================================
+#  索引のファイル名
+#============================================================================
+
+def IndexFile(pdf_file, sha1, cache_dir=None):
+    if cache_dir:
+        return os.path.join(cache_dir, sha1 + ".json")
+    #end if
+    return os.path.splitext(pdf_file)[0] + INDEX_SUFFIX
+#end def
+
+
+#============================================================================
+#  ページの種類の索引のクラス
+#============================================================================
+
+class PageIndex():
+
+    def __init__(self, filename, sha1, pages=0, kind=None):
+        self.filename = filename
+        self.sha1 = sha1
+        self.pages = pages          # 計算書のページ数
+        self.kind = kind            # 構造計算プログラムの種類
+        self.entries = {}           # ページ番号（文字列） : 項目の辞書
+        self.changed = False
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename, encoding="utf-8") as fp:
+                    data = json.load(fp)
+                #end with
+                if data.get("version") == INDEX_VERSION and data.get("sha1") == sha1:
+                    self.entries = data.get("entries", {})
+                    self.kind = data.get("kind") or kind
+                #end if
+            except ValueError:
+                # 壊れた索引は使わない（全ページを判定し直す）
+                self.entries = {}
+            #end try
+        #end if
+    #end def
+
+    def Get(self, pageN, key=None):
+        # ページの項目（key を指定した場合はその値）。記録が無い場合は None
+        entry = self.entries.get(str(pageN))
+        if entry is None or key is None:
+            return entry
+        #end if
+        return entry.get(key)
+    #end def
+
+    def Record(self, pageN, **fields):
+        entry = self.entries.setdefault(str(pageN), {})
+        for key, value in fields.items():
+            if entry.get(key) != value:
+                entry[key] = value
+                self.changed = True
+            #end if
+        #next
+        return entry
+    #end def
+
+    def ChartFound(self, pageN, strategy):
+        # 読取り方式 strategy で表を読み取ったかどうか（その方式の記録が無い場合は None）
+        charts = self.Get(pageN, "chart") or {}
+        return charts.get(strategy)
+    #end def
+
+    def RecordChart(self, pageN, strategy, found, tables=None):
+        charts = dict(self.Get(pageN, "chart") or {})
+        charts[strategy] = bool(found)
+        fields = {"chart": charts}
+        if found and tables:
+            # 表の種類は読み取れた場合だけ書き換える（読み取れなかった方式の結果で消さない）
+            fields["tables"] = tables
+        #end if
+        return self.Record(pageN, **fields)
+    #end def
+
+    def Pages(self):
+        return sorted(int(p) for p in self.entries)
+    #end def
+
+    def Summary(self):
+        # 検索モードごとのページ数
+        counts = {}
+        for entry in self.entries.values():
+            if "mode" in entry:
+                mode = entry["mode"] or "（対象外）"
+                counts[mode] = counts.get(mode, 0) + 1
+            #end if
+        #next
+        return counts
+    #end def
+
+    def ToDict(self):
+        return {"version": INDEX_VERSION, "sha1": self.sha1, "pages": self.pages, "kind": self.kind,
+                "entries": {p: self.entries[p] for p in sorted(self.entries, key=int)}}
+    #end def
+
+    def Save(self):
+        if not self.filename or not self.changed:
+            return
+        #end if
+        with _lock:
+            tmp = "{}.{}.tmp".format(self.filename, os.getpid())
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(self.ToDict(), fp, ensure_ascii=False, indent=1)
+            #end with
+            os.replace(tmp, self.filename)
+        #end with
+        self.changed = False
+    #end def
+
+    def SaveQuietly(self):
+        # 書込みできない場所（読取り専用のフォルダ）でもチェックは続ける
+        try:
+            self.Save()
+        except OSError:
+            pass
+        #end try
+    #end def
+#end class
+
+
+def Open(source, pdf_file=None, cache_dir=None, kind=None):
+    # source : PdfSource。計算書の内容のハッシュが一致する索引を読み込む（無い場合は空の索引）
+    pdf_file = pdf_file or source.filename
+    sha1 = source.Sha1()
+    return PageIndex(IndexFile(pdf_file, sha1, cache_dir), sha1, pages=source.PageCount(), kind=kind)
+#end def
+
+
+#============================================================================
+#  全ページの索引を作る関数（レビュー画面でのページの構成の表示用）
+#============================================================================
+
+def TableKinds(layout):
+    # テキストボックスの文字列（空白を除く）に含まれる断面リストの表の部材の種類
+    from pdfminer.layout import LTTextContainer
+
+    texts = ""
+    for lt in layout:
+        if isinstance(lt, LTTextContainer):
+            texts += lt.get_text()
+        #end if
+    #next
+    texts = texts.replace(" ", "").replace("　", "")
+    if not "断面リスト" in texts:
+        return []
+    #end if
+    return [EK for EK in ELEMENT_KIND if EK in texts]
+#end def
+
+def Build(pdf_file, cache_dir=None, report=None):
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from pdfminer.converter import PDFPageAggregator
+    from PdfInput import PdfSource
+    from MemberCheck01 import CheckTool
+
+    CT = CheckTool()
+    resourceManager = PDFResourceManager()
+    device = PDFPageAggregator(resourceManager, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resourceManager, device)
+    with PdfSource(pdf_file) as source:
+        info = ProgramDetect.DetectProgram(source, interpreter, device)
+        index = Open(source, pdf_file, cache_dir, kind=info["kind"])
+        index.kind = info["kind"]
+        pageN = 0
+        for page in source.GetPages():
+            pageN += 1
+            if index.Get(pageN, "mode") is not None and index.Get(pageN, "tables") is not None:
+                continue
+            #end if
+            interpreter.process_page(page)
+            layout = device.get_result()
+            fields = CT.SS7PageInfo(layout)
+            if index.Get(pageN, "tables") is None:
+                # ChartEngine が記録した表の種類（読み取った結果）はそのまま
+                fields["tables"] = TableKinds(layout)
+            #end if
+            index.Record(pageN, **fields)
+            if report is not None:
+                report(pageN, index.Get(pageN))
+            #end if
+        #next
+    #end with
+    device.close()
+    index.changed = True
+    index.Save()
+    return index
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算書のページの種類の索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="全ページの索引を作る（判定済みのページはそのまま）")
+    p.add_argument("pdf", nargs="+")
+    p.add_argument("--dir", help="索引を保存するフォルダ（省略時は計算書と同じフォルダ）")
+
+    p = sub.add_parser("show", help="索引の内容を表示する")
+    p.add_argument("pdf")
+    p.add_argument("--dir", help="索引を保存したフォルダ")
+    p.add_argument("--json", action="store_true", help="JSONで出力する")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        for filename in args.pdf:
+            index = Build(filename, args.dir)
+            print("{} : {} ({} ページ)".format(index.filename, index.kind, index.pages))
+            for mode, n in sorted(index.Summary().items()):
+                print("    {:<16} {:>5}".format(mode, n))
+            #next
+        #next
+        return 0
+    #end if
+
+    from PdfInput import PdfSource
+
+    with PdfSource(args.pdf) as source:
+        index = Open(source, args.pdf, args.dir)
+    #end with
+    if args.json:
+        json.dump(index.ToDict(), sys.stdout, ensure_ascii=False, indent=1)
+        print()
+        return 0
+    #end if
+    if len(index.entries) == 0:
+        print("索引がありません: {}".format(index.filename), file=sys.stderr)
+        return 1
+    #end if
+    print("{} : {} ({} ページ)".format(args.pdf, index.kind, index.pages))
+    for pageN in index.Pages():
+        entry = index.Get(pageN)
+        found = [strategy for strategy, chart in sorted((entry.get("chart") or {}).items()) if chart]
+        print("{:>5}  {:<16} {:<6} {} {}".format(
+            pageN, entry.get("mode", "?") or "-", entry.get("B_kind", "") or "-",
+            " ".join(entry.get("tables", [])), "表({})".format(",".join(found)) if found else ""))
+    #next
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
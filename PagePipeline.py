@@ -0,0 +1,263 @@
+#==========================================================================================
+#   ページのコンテンツストリームを先読みして展開するパイプライン（読込みと解析の並行処理）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+CheckTool・ChartEngine は「ページを取り出す → ストリームを展開する → 解釈する → 解析する → 次のページ」を
+1つずつ順番に行うため、ネットワーク上の計算書や圧縮の大きいストリームでは、読込みの間CPUが遊んでいた。
+PagePipeline は読込みのスレッドで次の depth ページのコンテンツストリームとフォームXObjectを
+取り出して zlib で展開し（展開の間は GIL を離すので解析のスレッドと並行に動く）、上限付きのキューに入れる。
+解析のスレッドはキューからページを受け取ったときに、展開済みのデータをストリームに設定してから処理する。
+
+    pipeline = PagePipeline(source, depth=4, wanted=lambda pageN: pageN >= startpage)
+    try:
+        for pageN, page in pipeline:
+            interpreter.process_page(page)     # 展開済みのストリームはそのまま使われる
+            ...
+    finally:
+        pipeline.close()
+    pipeline.Stats()    # {"depth": 4, "pages": 120, "stalls": 3, "stall_time": 0.21, "queue_mean": 3.6, ...}
+
+・pdfminer の文書（PDFDocument）のオブジェクトの読込み（getobj）はスレッドに対して安全でないので、
+  LockDocument で再入可能なロックを掛ける。ストリームの展開はロックの外で行う。
+・読込みのスレッドはストリームを書き換えない（展開したデータは解析のスレッドが設定する）。
+  設定するのは FlateDecode だけで予測子（Predictor）や暗号化の無いストリームに限り、
+  それ以外は従来どおり pdfminer が解釈のときに展開する。
+・wanted(pageN) が False のページ（読み飛ばすページ）は展開しないで、順番どおりに渡す。
+・統計 : stalls（解析のスレッドがキューが空で待った回数）・stall_time（その合計秒）・
+  queue_mean / queue_max（受け取るときのキューの長さ）・streams・bytes_in・bytes_out・decode_time
+"""
+
+import time
+import zlib
+import queue
+import threading
+
+from pdfminer.pdftypes import resolve1, PDFStream
+from pdfminer.psparser import LIT
+
+DEPTH = 4                   # 先読みするページ数（キューの上限）
+LITERAL_FORM = LIT("Form")
+FLATE = ("FlateDecode", "Fl")
+
+
+#============================================================================
+#  pdfminer の文書のオブジェクトの読込みにロックを掛ける関数
+#============================================================================
+
+def LockDocument(document):
+    if getattr(document, "_pipeline_lock", None) is not None:
+        return document._pipeline_lock
+    #end if
+    lock = threading.RLock()
+    getobj = document.getobj
+
+    def LockedGetobj(objid):
+        with lock:
+            return getobj(objid)
+        #end with
+    #end def
+
+    document.getobj = LockedGetobj
+    document._pipeline_lock = lock
+    return lock
+#end def
+
+
+#============================================================================
+#  ページのストリームを取り出して展開する関数（読込みのスレッドで実行）
+#============================================================================
+
+def PageStreams(page):
+    # コンテンツストリームと、ページのリソースのフォームXObject
+    streams = []
+    for obj in page.contents:
+        stream = resolve1(obj)
+        if isinstance(stream, PDFStream):
+            streams.append(stream)
+        #end if
+    #next
+    resources = resolve1(page.resources) or {}
+    if isinstance(resources, dict):
+        xobjects = resolve1(resources.get("XObject")) or {}
+        if isinstance(xobjects, dict):
+            for obj in xobjects.values():
+                stream = resolve1(obj)
+                if isinstance(stream, PDFStream) and stream.get("Subtype") is LITERAL_FORM:
+                    streams.append(stream)
+                #end if
+            #next
+        #end if
+    #end if
+    return streams
+#end def
+
+def Inflatable(stream, lock):
+    # FlateDecode だけで、予測子と暗号化の無いストリームの元のデータ（それ以外は None）
+    raw = stream.rawdata
+    if raw is None or stream.data is not None or stream.decipher is not None:
+        return None
+    #end if
+    with lock:
+        filters = stream.get_filters()
+    #end with
+    if len(filters) != 1:
+        return None
+    #end if
+    f, params = filters[0]
+    if getattr(f, "name", None) not in FLATE:
+        return None
+    #end if
+    if isinstance(params, dict) and "Predictor" in params:
+        return None
+    #end if
+    return raw
+#end def
+
+
+#============================================================================
+#  先読みのパイプライン
+#============================================================================
+
+class PagePipeline():
+
+    def __init__(self, source, depth=DEPTH, wanted=None, first=1):
+        # source : PdfSource。first ページから最後のページまでを順番に渡す
+        self.pages = source.Pages()
+        self.depth = max(1, depth)
+        self.wanted = wanted
+        self.first = first
+        self.lock = LockDocument(source.Document())
+        self.queue = queue.Queue(maxsize=self.depth)
+        self.stop = threading.Event()
+        self.stats = {"depth": self.depth, "pages": 0, "stalls": 0, "stall_time": 0.0,
+                      "queue_sum": 0, "queue_max": 0, "streams": 0, "bytes_in": 0, "bytes_out": 0,
+                      "decode_time": 0.0, "errors": 0}
+        self.thread = threading.Thread(target=self.Reader, daemon=True)
+        self.thread.start()
+    #end def
+
+    #==================================================================================
+    #   読込みのスレッド
+    #==================================================================================
+
+    def Reader(self):
+        try:
+            for pageN in range(self.first, len(self.pages) + 1):
+                page = self.pages[pageN - 1]
+                if not self.Put((pageN, page, self.Decode(pageN, page))):
+                    return
+                #end if
+            #next
+        finally:
+            self.Put(None)      # 終わりの印（解析のスレッドが待ち続けないように必ず入れる）
+        #end try
+    #end def
+
+    def Put(self, item):
+        # キューに空きができるまで待つ（close された場合は False）
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+            #end try
+        #end while
+        return False
+    #end def
+
+    def Decode(self, pageN, page):
+        stats = self.stats
+        decoded = []
+        try:
+            if self.wanted is not None and not self.wanted(pageN):
+                return decoded
+            #end if
+            with self.lock:
+                streams = PageStreams(page)
+            #end with
+            for stream in streams:
+                raw = Inflatable(stream, self.lock)
+                if raw is None:
+                    continue
+                #end if
+                t0 = time.perf_counter()
+                try:
+                    data = zlib.decompress(raw)
+                except zlib.error:
+                    continue    # 壊れたストリームは pdfminer の展開に任せる
+                #end try
+                stats["decode_time"] += time.perf_counter() - t0
+                stats["streams"] += 1
+                stats["bytes_in"] += len(raw)
+                stats["bytes_out"] += len(data)
+                decoded.append((stream, raw, data))
+            #next
+        except Exception:
+            # 先読みできないページは解析のスレッドで従来どおり読む
+            stats["errors"] += 1
+        #end try
+        return decoded
+    #end def
+
+    #==================================================================================
+    #   解析のスレッド（ページを順番に受け取る）
+    #==================================================================================
+
+    def __iter__(self):
+        stats = self.stats
+        while True:
+            size = self.queue.qsize()
+            if size == 0:
+                t0 = time.perf_counter()
+                item = self.queue.get()
+                if item is not None:
+                    stats["stalls"] += 1
+                    stats["stall_time"] += time.perf_counter() - t0
+                #end if
+            else:
+                item = self.queue.get()
+            #end if
+            if item is None:
+                return
+            #end if
+            pageN, page, decoded = item
+            stats["pages"] += 1
+            stats["queue_sum"] += size
+            stats["queue_max"] = max(stats["queue_max"], size)
+            for stream, raw, data in decoded:
+                # pdfminer の PDFStream.decode と同じ状態にする（その間に展開されていない場合だけ）
+                if stream.data is None and stream.rawdata is raw:
+                    stream.data = data
+                    stream.rawdata = None
+                #end if
+            #next
+            yield pageN, page
+        #end while
+    #end def
+
+    def close(self):
+        self.stop.set()
+        # 読込みのスレッドがキューの空きを待っている場合に備えて取り出しておく
+        try:
+            while True:
+                self.queue.get_nowait()
+            #end while
+        except queue.Empty:
+            pass
+        #end try
+        self.thread.join(1.0)
+    #end def
+
+    def Stats(self):
+        stats = dict(self.stats)
+        stats["queue_mean"] = round(stats.pop("queue_sum") / stats["pages"], 2) if stats["pages"] > 0 else 0.0
+        stats["stall_time"] = round(stats["stall_time"], 4)
+        stats["decode_time"] = round(stats["decode_time"], 4)
+        return stats
+    #end def
+#end class
+
@@ -0,0 +1,538 @@
+#==========================================================================================
+#   ページの重みを考慮した並列処理のスケジューラ（ワークスティーリング）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+構造計算書のページは、表紙や文章のページと、伏図・軸組図・断面リストのページとで処理時間が
+数桁違うため、ページ数で均等に分けるとワーカーが遊んでしまう。
+
+このモジュールでは、
+・各ページの重みをコンテンツストリームの大きさやXObject・フォントの数から安く見積もり（EstimatePageFeatures）、
+・重い仕事から順に、ワーカーごとの仕事の列（重い順のヒープ）に振り分け、
+・自分の列が空になったワーカーには、残りの重みが最も大きい列から仕事を横取り（スティール）させる。
+ページごとの見積りと実際の処理時間はCSVに記録し、係数を最小二乗法で調整できる（FitCostModel）。
+
+    python PageScheduler.py estimate 計算書.pdf          # 各ページの特徴量と重みを表示
+    python PageScheduler.py fit cost.csv -o model.json   # 記録から重みの係数を求める
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import heapq
+import pickle
+import argparse
+import threading
+import traceback
+import multiprocessing
+
+# 重みの既定の係数（秒 = base + bytes*コンテンツの大きさ + xobjects*XObject数 + fonts*フォント数）
+DEFAULT_MODEL = {"base": 0.02, "bytes": 2.0e-6, "xobjects": 0.01, "fonts": 0.005}
+
+FEATURES = ("bytes", "xobjects", "fonts")
+
+WATCH_INTERVAL = 1.0    # 異常終了したワーカーを調べる間隔（秒）
+MAX_RESPAWNS = 3        # ワーカー1つあたりの起動し直す回数の上限
+
+
+#============================================================================
+#  ページの特徴量（コンテンツストリームの大きさ、XObject・フォントの数）を求める関数
+#  （ストリームは展開せず、辞書の Length だけを読むので安い）
+#============================================================================
+
+def EstimatePageFeatures(page):
+    from pdfminer.pdftypes import resolve1
+
+    size = 0
+    contents = page.contents
+    if not isinstance(contents, list):
+        contents = [contents]
+    #end if
+    for obj in contents:
+        stream = resolve1(obj)
+        if stream is None:
+            continue
+        #end if
+        try:
+            size += int(resolve1(stream.attrs.get("Length", 0)) or 0)
+        except (AttributeError, TypeError, ValueError):
+            rawdata = getattr(stream, "rawdata", None)
+            if rawdata is not None:
+                size += len(rawdata)
+            #end if
+        #end try
+    #next
+
+    xobjects = 0
+    fonts = 0
+    resources = resolve1(page.resources) or {}
+    if isinstance(resources, dict):
+        xobjects = len(resolve1(resources.get("XObject")) or {})
+        fonts = len(resolve1(resources.get("Font")) or {})
+    #end if
+    return {"bytes": size, "xobjects": xobjects, "fonts": fonts}
+#end def
+
+def PageWeight(features, model=None):
+    model = model or DEFAULT_MODEL
+    w = model.get("base", 0.0)
+    for key in FEATURES:
+        w += model.get(key, 0.0) * features.get(key, 0)
+    #next
+    return max(w, 1.0e-6)
+#end def
+
+def LoadCostModel(filename):
+    model = dict(DEFAULT_MODEL)
+    if filename:
+        with open(filename, "r", encoding="utf-8") as fp:
+            model.update(json.load(fp))
+        #end with
+    #end if
+    return model
+#end def
+
+
+#============================================================================
+#  ページごとの処理時間の記録（CSV）
+#============================================================================
+
+class CostLog():
+    COLUMNS = ["file", "page", "mode", "bytes", "xobjects", "fonts", "weight", "seconds"]
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self.fp = open(filename, "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.fp)
+        if new:
+            self.writer.writerow(self.COLUMNS)
+        #end if
+    #end def
+
+    def Write(self, filename, page, mode, features, weight, seconds):
+        with self.lock:
+            self.writer.writerow([filename, page, mode, features.get("bytes", 0), features.get("xobjects", 0),
+                                  features.get("fonts", 0), "{:.6f}".format(weight), "{:.6f}".format(seconds)])
+            self.fp.flush()
+        #end with
+    #end def
+
+    def close(self):
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+            #end if
+        #end with
+    #end def
+#end class
+
+
+#============================================================================
+#  記録したCSVから重みの係数を最小二乗法で求める関数
+#============================================================================
+
+def FitCostModel(filename):
+    import numpy as np
+
+    rows = []
+    secs = []
+    with open(filename, "r", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            try:
+                rows.append([1.0] + [float(row[key]) for key in FEATURES])
+                secs.append(float(row["seconds"]))
+            except (KeyError, ValueError):
+                continue
+            #end try
+        #next
+    #end with
+    if len(rows) < len(FEATURES) + 1:
+        raise ValueError("not enough samples in {} ({})".format(filename, len(rows)))
+    #end if
+    A = np.array(rows)
+    b = np.array(secs)
+    coef, residual, rank, sv = np.linalg.lstsq(A, b, rcond=None)
+    # 負の係数は重みの逆転を起こすので0に丸める
+    coef = np.maximum(coef, 0.0)
+    model = {"base": float(coef[0])}
+    for i, key in enumerate(FEATURES):
+        model[key] = float(coef[i + 1])
+    #next
+    pred = A.dot(coef)
+    model["samples"] = len(rows)
+    model["mean_abs_error"] = float(np.mean(np.abs(pred - b)))
+    return model
+#end def
+
+
+#============================================================================
+#  ワーカープロセスのメインループ
+#============================================================================
+
+def WorkerLoop(wid, conn, initializer, initargs):
+    # conn : 親とのパイプ（ワーカーごと。送信はこのスレッドで済ませるので、途中で落ちても他のワーカーに影響しない）
+    if initializer is not None:
+        initializer(*initargs)
+    #end if
+    conn.send(("ready", None, True, None, 0.0))
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        #end if
+        tid, func, args = task
+        t0 = time.perf_counter()
+        try:
+            result = func(*args)
+            ok = True
+        except Exception as e:
+            result = "{}: {}".format(type(e).__name__, e)
+            ok = False
+        #end try
+        try:
+            conn.send(("done", tid, ok, result, time.perf_counter() - t0))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            # pickle できない結果はエラーとして返す（送信は pickle の後なので途中までは書かれない）
+            conn.send(("done", tid, False, "{}: {}".format(type(e).__name__, e), time.perf_counter() - t0))
+        #end try
+    #end while
+#end def
+
+
+#============================================================================
+#  重みを考慮したワークスティーリングのスケジューラ
+#  （multiprocessing.Pool の apply_async と同じ形で仕事を投入する）
+#============================================================================
+
+class PageScheduler():
+
+    def __init__(self, processes=2, initializer=None, initargs=()):
+        self.processes = max(1, processes)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.lock = threading.Lock()
+        self.heaps = [[] for i in range(self.processes)]   # 各ワーカーの仕事の列（重い順のヒープ）
+        self.loads = [0.0] * self.processes     # 各列に残っている重みの合計
+        self.idle = []                          # 仕事を待っているワーカー
+        self.running = {}                       # tid : (wid, task)
+        self.affinity = {}                      # group : wid（同じ計算書は同じワーカーに寄せる）
+        self.nexttid = 0
+        self.closed = False
+        self.failed = None                      # ワーカーを起動し直せなくなった理由
+        self.steals = 0
+        self.respawns = 0
+        self.checked = time.monotonic()
+
+        self.ctx = multiprocessing.get_context()
+        self.conns = [None] * self.processes
+        self.procs = [None] * self.processes
+        # join から Dispatcher を止めるためのパイプ（終わりの印）
+        self.stopper, self.stopsend = self.ctx.Pipe(duplex=False)
+        for wid in range(self.processes):
+            self.Spawn(wid)
+        #next
+        self.thread = threading.Thread(target=self.Dispatcher, daemon=True)
+        self.thread.start()
+    #end def
+
+    def Spawn(self, wid):
+        conn, child = self.ctx.Pipe()
+        proc = self.ctx.Process(target=WorkerLoop, args=(wid, child, self.initializer, self.initargs), daemon=True)
+        proc.start()
+        child.close()
+        self.conns[wid] = conn
+        self.procs[wid] = proc
+    #end def
+
+    #==================================================================================
+    #   仕事を投入する関数（weight: 見積りの重み、group: 同じワーカーに寄せたい仕事のまとまり）
+    #==================================================================================
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None, weight=1.0, group=None):
+        with self.lock:
+            if self.closed:
+                raise ValueError("scheduler is closed")
+            #end if
+            tid = self.nexttid
+            self.nexttid += 1
+            task = {"tid": tid, "func": func, "args": args, "callback": callback,
+                    "error_callback": error_callback, "weight": float(weight)}
+            if self.failed is not None:
+                unsent = [(task, self.failed)]
+            else:
+                wid = self.affinity.get(group) if group is not None else None
+                if wid is None:
+                    # 残りの重みが最も小さい列に入れる
+                    wid = min(range(self.processes), key=lambda i: self.loads[i])
+                    if group is not None:
+                        self.affinity[group] = wid
+                    #end if
+                #end if
+                self.Push(wid, task)
+                unsent = self.Dispatch()
+            #end if
+        #end with
+        for failed, reason in unsent:
+            self.Callback(failed, False, reason)
+        #next
+    #end def
+
+    def Pending(self):
+        return sum(len(h) for h in self.heaps)
+    #end def
+
+    def Push(self, wid, task):
+        # 列は重い順（同じ重みは投入順）に取り出す
+        heapq.heappush(self.heaps[wid], (-task["weight"], task["tid"], task))
+        self.loads[wid] += task["weight"]
+    #end def
+
+    def Take(self, wid):
+        # 自分の列から取り出し、空の場合は最も重みの残っている列から横取りする
+        heap = self.heaps[wid]
+        if len(heap) == 0:
+            victim = max(range(self.processes), key=lambda i: self.loads[i])
+            if len(self.heaps[victim]) == 0:
+                return None
+            #end if
+            heap = self.heaps[victim]
+            wid = victim
+            self.steals += 1
+        #end if
+        task = heapq.heappop(heap)[2]
+        self.loads[wid] -= task["weight"]
+        if len(heap) == 0:
+            self.loads[wid] = 0.0
+        #end if
+        return task
+    #end def
+
+    def Dispatch(self):
+        # 戻り値 : ワーカーに渡せなかった仕事 [(task, 理由), ...]（コールバックはロックの外で呼ぶ）
+        unsent = []
+        while len(self.idle) > 0:
+            wid = self.idle[0]
+            task = self.Take(wid)
+            if task is None:
+                break
+            #end if
+            self.idle.pop(0)
+            try:
+                self.conns[wid].send((task["tid"], task["func"], task["args"]))
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # pickle できない引数の仕事はエラーとして返す（送信は pickle の後なので、ワーカーはそのまま使える）
+                self.idle.insert(0, wid)
+                unsent.append((task, "cannot send task: {}: {}".format(type(e).__name__, e)))
+                continue
+            except OSError:
+                # 前回の CheckWorkers の後にワーカーが止まった（パイプが閉じた）。
+                # 仕事は列に戻し、ワーカーは Dispatcher が EOF を受けて CheckWorkers で起動し直す
+                self.Push(wid, task)
+                if self.procs[wid].is_alive():
+                    self.procs[wid].kill()
+                #end if
+                continue
+            #end try
+            self.running[task["tid"]] = (wid, task)
+        #end while
+        return unsent
+    #end def
+
+    #==================================================================================
+    #   ワーカーからの結果を受け取り、次の仕事を渡すスレッド
+    #==================================================================================
+
+    def Dispatcher(self):
+        from multiprocessing.connection import wait
+
+        while True:
+            if time.monotonic() - self.checked >= WATCH_INTERVAL:
+                self.CheckWorkers()
+            #end if
+            # 起動し直せなかったワーカーのパイプは閉じている
+            wids = {self.conns[wid]: wid for wid in range(self.processes) if not self.conns[wid].closed}
+            ready = wait(list(wids) + [self.stopper], timeout=WATCH_INTERVAL)
+            if self.stopper in ready:
+                break       # join が送る終わりの印
+            #end if
+            for conn in ready:
+                wid = wids[conn]
+                try:
+                    kind, tid, ok, result, elapsed = conn.recv()
+                except (EOFError, OSError):
+                    # ワーカーが異常終了した（パイプが閉じた）。同じ回の CheckWorkers で既に起動し直した
+                    # ワーカーの古いパイプの場合は、新しいワーカーを止めない
+                    if self.conns[wid] is conn:
+                        self.procs[wid].join(WATCH_INTERVAL)
+                        if self.procs[wid].is_alive():
+                            self.procs[wid].kill()
+                            self.procs[wid].join()
+                        #end if
+                    #end if
+                    self.CheckWorkers()
+                    continue
+                #end try
+                task = None
+                with self.lock:
+                    if kind == "done":
+                        task = self.running.pop(tid, (None, None))[1]
+                    #end if
+                    self.idle.append(wid)
+                    unsent = self.Dispatch()
+                #end with
+                if task is not None:
+                    self.Callback(task, ok, result)
+                #end if
+                for task, reason in unsent:
+                    self.Callback(task, False, reason)
+                #next
+            #next
+        #end while
+    #end def
+
+    def Callback(self, task, ok, result):
+        # コールバックはロックの外で呼ぶ（コールバックから次の仕事を投入できるように）
+        try:
+            if ok:
+                if task["callback"] is not None:
+                    task["callback"](result)
+                #end if
+            else:
+                if task["error_callback"] is not None:
+                    task["error_callback"](RuntimeError(result))
+                #end if
+            #end if
+        except Exception:
+            traceback.print_exc()
+        #end try
+    #end def
+
+    def CheckWorkers(self):
+        # 異常終了したワーカーが持っていた仕事はエラーとして返し、ワーカーを起動し直す。
+        # 起動し直す回数が上限を超えた場合は、残りの仕事もすべてエラーとして返す
+        self.checked = time.monotonic()
+        lost = []
+        with self.lock:
+            for wid, proc in enumerate(self.procs):
+                if proc.is_alive():
+                    continue
+                #end if
+                reason = "worker {} exited with code {}".format(wid, proc.exitcode)
+                for tid, (w, task) in list(self.running.items()):
+                    if w == wid:
+                        self.running.pop(tid)
+                        lost.append((task, reason))
+                    #end if
+                #next
+                if wid in self.idle:
+                    self.idle.remove(wid)
+                #end if
+                self.conns[wid].close()
+                if self.failed is None and self.respawns < MAX_RESPAWNS * self.processes:
+                    self.respawns += 1
+                    self.Spawn(wid)
+                elif self.failed is None:
+                    self.failed = reason + " (respawn limit reached)"
+                #end if
+            #next
+            if self.failed is not None:
+                for wid in range(self.processes):
+                    while len(self.heaps[wid]) > 0:
+                        lost.append((heapq.heappop(self.heaps[wid])[2], self.failed))
+                    #end while
+                    self.loads[wid] = 0.0
+                #next
+            #end if
+        #end with
+        for task, reason in lost:
+            self.Callback(task, False, reason)
+        #next
+    #end def
+
+    #==================================================================================
+    #   終了処理（Pool と同じく close → join の順に呼ぶ）
+    #==================================================================================
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        #end with
+    #end def
+
+    def join(self):
+        while True:
+            with self.lock:
+                busy = len(self.running) > 0 or self.Pending() > 0
+            #end with
+            if not busy or not self.thread.is_alive():
+                break
+            #end if
+            time.sleep(0.05)
+        #end while
+        self.stopsend.send(None)
+        self.thread.join()
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass    # 起動し直せずに止まったワーカー
+            #end try
+        #next
+        for proc in self.procs:
+            proc.join()
+        #next
+    #end def
+#end class
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ページの重みの見積りと係数の調整")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p1 = sub.add_parser("estimate", help="各ページの特徴量と重みを表示する")
+    p1.add_argument("pdf")
+    p1.add_argument("--cost-model", help="重みの係数（JSON）")
+    p2 = sub.add_parser("fit", help="処理時間の記録（CSV）から重みの係数を求める")
+    p2.add_argument("csv")
+    p2.add_argument("-o", "--output", help="係数を保存するJSONファイル")
+    args = parser.parse_args(argv)
+
+    if args.command == "estimate":
+        from PdfInput import PdfSource
+        model = LoadCostModel(args.cost_model)
+        with PdfSource(args.pdf) as source:
+            total = 0.0
+            for i, page in enumerate(source.Pages()):
+                features = EstimatePageFeatures(page)
+                w = PageWeight(features, model)
+                total += w
+                print("page={:4d}  bytes={:9d}  xobjects={:4d}  fonts={:3d}  weight={:.4f}".format(
+                    i + 1, features["bytes"], features["xobjects"], features["fonts"], w))
+            #next
+            print("total weight = {:.3f}".format(total))
+        #end with
+    else:
+        model = FitCostModel(args.csv)
+        text = json.dumps(model, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as fp:
+                fp.write(text + "\n")
+            #end with
+        #end if
+        print(text)
+    #end if
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
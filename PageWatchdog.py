@@ -0,0 +1,349 @@
+#==========================================================================================
+#   ページごとの処理時間（CPU秒）とメモリ（RSS）の上限を監視し、重いページを隔離して処理する仕組み
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+密な床伏図や LTCurve の多いページは、MakeCharPlus・ChartDevider で他のページの数桁の時間がかかり、
+コンテナのメモリの上限を超えたこともある。PageWatchdog は、危ないページ（床伏図・軸組図・断面リストのページ、
+または PageScheduler の見積りの重みが大きいページ）を監視付きの子プロセスで処理し、
+CPU時間・常駐メモリの上限（PageBudget）を超えたページは子プロセスを止めて「読み飛ばし」として記録する。
+残りのページはそのまま処理を続ける（止めた子プロセスは次の危ないページで作り直す）。
+
+    import MemberCheck01, PageWatchdog
+    CT = MemberCheck01.CheckTool()
+    CT.PageBudget = PageWatchdog.PageBudget(cpu=60.0, rss_mb=2048)
+    result = CT.Run("計算書.pdf", limit=0.95)
+    # result.skipped : [{"page": 812, "reason": "cpu", "cpu": 60.1, "rss_mb": 930.2, "wall": 61.0, "mode": "床伏図", ...}]
+
+    python PageWatchdog.py 計算書.pdf --cpu 60 --rss 2048 [--all]
+
+・子プロセスのCPU時間と常駐メモリは /proc から POLL 秒ごとに読む（/proc の無い環境では経過時間で代用する）。
+  急なメモリの増加に備えて、子プロセスの仮想メモリにも上限（起動時の大きさ＋rss_mb の AS_FACTOR 倍）を設ける。
+・子プロセスは計算書を自分で開き、部材データは処理の前に親から受け取り、追加された分（RevisionDiff.MemberDelta）を返す。
+・ページの処理中の例外は、これまでどおりチェックのエラーとする（上限を超えた場合と子プロセスの異常終了だけを読み飛ばす）。
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+from PageScheduler import EstimatePageFeatures, PageWeight
+
+DEFAULT_CPU = 120.0         # 1ページのCPU時間の上限（秒）
+DEFAULT_RSS = 4096.0        # 1ページの処理中の常駐メモリの上限（MB）
+RISK_WEIGHT = 1.0           # 隔離する見積りの重み（PageWeight、秒の目安）
+AS_FACTOR = 2.0             # 仮想メモリの上限（常駐メモリの上限に対する倍率）
+POLL = 0.05                 # 子プロセスを監視する間隔（秒）
+
+# 隔離する検索モード（SS7PageMode）
+RISKY_MODES = ("床伏図", "軸組図", "断面リスト梁", "断面リスト柱")
+
+# 子プロセスで保持するインスタンス（開いている計算書とツール）
+_worker = {}
+
+
+#============================================================================
+#  1ページの上限と、隔離するページの判定
+#============================================================================
+
+class PageBudget():
+
+    def __init__(self, cpu=DEFAULT_CPU, rss_mb=DEFAULT_RSS, risk_weight=RISK_WEIGHT, modes=RISKY_MODES,
+                 isolate="risky", model=None):
+        # isolate : "risky"（危ないページだけ）または "all"（すべてのページ）
+        self.cpu = cpu
+        self.rss_mb = rss_mb
+        self.risk_weight = risk_weight
+        self.modes = tuple(modes)
+        self.isolate = isolate
+        self.model = model      # PageScheduler の重みの係数（None は既定値）
+    #end def
+
+    def Risky(self, page, pageInfo=None):
+        # 戻り値 : (隔離するかどうか, ページの特徴量)
+        features = EstimatePageFeatures(page)
+        if self.isolate == "all":
+            return True, features
+        #end if
+        if pageInfo is not None and pageInfo.get("mode") in self.modes:
+            return True, features
+        #end if
+        return PageWeight(features, self.model) >= self.risk_weight, features
+    #end def
+#end class
+
+
+#============================================================================
+#  子プロセスのCPU時間と常駐メモリ（Linux の /proc）
+#============================================================================
+
+_CLK_TCK = None
+_PAGESIZE = None
+
+def ProcessUsage(pid):
+    # 戻り値 : (CPU秒, 常駐メモリMB)。読めない場合は (None, None)
+    global _CLK_TCK, _PAGESIZE
+    try:
+        if _CLK_TCK is None:
+            _CLK_TCK = float(os.sysconf("SC_CLK_TCK"))
+            _PAGESIZE = float(os.sysconf("SC_PAGESIZE"))
+        #end if
+        with open("/proc/{}/stat".format(pid)) as fp:
+            fields = fp.read().rsplit(")", 1)[1].split()
+        #end with
+        with open("/proc/{}/statm".format(pid)) as fp:
+            resident = int(fp.read().split()[1])
+        #end with
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None, None
+    #end try
+    cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK     # utime + stime
+    return cpu, resident * _PAGESIZE / (1024.0 * 1024.0)
+#end def
+
+
+#============================================================================
+#  子プロセスのメインループ
+#============================================================================
+
+def WorkerLoop(conn, rss_mb):
+    try:
+        import resource
+        # 親から引き継いだ仮想メモリの大きさに上乗せする
+        with open("/proc/self/statm") as fp:
+            size = int(fp.read().split()[0]) * os.sysconf("SC_PAGESIZE")
+        #end with
+        limit = size + int(rss_mb * AS_FACTOR * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError, IndexError):
+        pass    # 上限を設定できない環境では /proc の監視だけで止める
+    #end try
+    sys.stdout = open(os.devnull, "w")
+    import EventLog
+    EventLog.SetConsole(None)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        #end try
+        if task is None:
+            break
+        #end if
+        func, args = task
+        try:
+            conn.send(("ok", func(*args)))
+        except MemoryError:
+            conn.send(("memory", None))
+        except Exception as e:
+            conn.send(("error", "{}: {}".format(type(e).__name__, e)))
+        #end try
+    #end while
+#end def
+
+
+#============================================================================
+#  監視付きの子プロセスで1ページずつ処理するクラス
+#============================================================================
+
+class PageWatchdog():
+
+    def __init__(self, budget=None):
+        self.budget = budget or PageBudget()
+        self.proc = None
+        self.conn = None
+        self.isolated = 0       # 子プロセスで処理したページの数
+        self.killed = 0         # 上限を超えて止めた回数
+    #end def
+
+    def Start(self):
+        ctx = multiprocessing.get_context()
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=WorkerLoop, args=(child, self.budget.rss_mb), daemon=True)
+        self.proc.start()
+        child.close()
+    #end def
+
+    def Kill(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.join()
+            self.proc = None
+        #end if
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        #end if
+    #end def
+
+    def close(self):
+        if self.proc is not None and self.proc.is_alive():
+            try:
+                self.conn.send(None)
+                self.proc.join(5.0)
+            except OSError:
+                pass
+            #end try
+        #end if
+        self.Kill()
+    #end def
+
+    def Call(self, func, args=()):
+        # 戻り値 : (状態, 結果, 診断情報)
+        #   状態 : "ok"・"error"（例外）・"cpu"・"memory"（上限超過）・"crash"（子プロセスの異常終了）
+        if self.proc is None or not self.proc.is_alive():
+            self.Kill()
+            self.Start()
+        #end if
+        self.isolated += 1
+        budget = self.budget
+        pid = self.proc.pid
+        cpu0, rss = ProcessUsage(pid)
+        t0 = time.perf_counter()
+        diag = {"cpu": 0.0, "rss_mb": rss or 0.0, "wall": 0.0}
+        self.conn.send((func, args))
+        while True:
+            ready = self.conn.poll(POLL)
+            wall = time.perf_counter() - t0
+            cpu, rss = ProcessUsage(pid)
+            diag["wall"] = round(wall, 3)
+            if cpu is not None and cpu0 is not None:
+                diag["cpu"] = round(cpu - cpu0, 3)
+                diag["rss_mb"] = round(max(diag["rss_mb"], rss), 1)
+            else:
+                diag["cpu"] = diag["wall"]     # /proc が無い環境では経過時間で判定する
+            #end if
+            if ready:
+                try:
+                    status, value = self.conn.recv()
+                except (EOFError, OSError):
+                    status, value = "crash", None
+                    self.proc.join(1.0)
+                    diag["exitcode"] = self.proc.exitcode
+                #end try
+                if status != "ok" and status != "error":
+                    self.Kill()
+                    self.killed += 1
+                #end if
+                return status, value, diag
+            #end if
+            reason = None
+            if not self.proc.is_alive():
+                reason = "crash"
+                diag["exitcode"] = self.proc.exitcode
+            elif diag["cpu"] > budget.cpu:
+                reason = "cpu"
+            elif rss is not None and rss > budget.rss_mb:
+                reason = "memory"
+            #end if
+            if reason is not None:
+                self.Kill()
+                self.killed += 1
+                return reason, None, diag
+            #end if
+        #end while
+    #end def
+#end class
+
+
+#============================================================================
+#  子プロセスで実行する仕事（CheckTool の1ページ・ChartEngine の1ページ）
+#============================================================================
+
+def OpenBook(filename):
+    # 同じ計算書のページが続くので、直前の計算書を開いたままにしておく
+    book = _worker.get("book")
+    if book is not None and book["filename"] == filename:
+        return book
+    #end if
+    if book is not None:
+        book["source"].close()
+    #end if
+    from PdfInput import PdfSource
+    book = {"filename": filename, "source": PdfSource(filename), "tools": {}}
+    _worker["book"] = book
+    return book
+#end def
+
+def CheckPageTask(filename, pageI, kind, limit, member, pageInfo):
+    # member : 親の部材データ。戻り値 : (CheckPage の結果, このページで追加された部材データ)
+    import copy
+    from RevisionDiff import MemberDelta
+
+    if not "CheckTool" in _worker:
+        import MemberCheck01
+        _worker["CheckTool"] = MemberCheck01.CheckTool()
+    #end if
+    CT = _worker["CheckTool"]
+    book = OpenBook(filename)
+    if not "check" in book["tools"]:
+        book["tools"]["check"] = CT.MakeTools()
+    #end if
+    interpreter, device, interpreter2, device2 = book["tools"]["check"]
+    CT.ResetMemberData()
+    CT.MergeMemberData(member)
+    before = copy.deepcopy(CT.GetMemberData())
+    page = book["source"].Pages()[pageI - 1]
+    result = CT.CheckPage(page, kind, limit, interpreter, device, interpreter2, device2, None, pageInfo)
+    return result, MemberDelta(before, CT.GetMemberData())
+#end def
+
+def ChartPageTask(filename, pageN, strategy, PageKind, EKind):
+    # 戻り値 : ChartEngine.Devide の結果 (dflag, element)
+    key = ("ChartEngine", strategy)
+    if not key in _worker:
+        from ChartEngine import ChartEngine
+        _worker[key] = ChartEngine(strategy)
+    #end if
+    engine = _worker[key]
+    engine.PageKind = list(PageKind)
+    engine.EKind = list(EKind)
+    book = OpenBook(filename)
+    return engine.Devide(book["source"].Pages()[pageN - 1])
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ページごとの上限を監視した計算書のチェック")
+    parser.add_argument("pdf", nargs="+")
+    parser.add_argument("--limit", type=float, default=0.95)
+    parser.add_argument("--stpage", type=int, default=0)
+    parser.add_argument("--edpage", type=int, default=0)
+    parser.add_argument("--cpu", type=float, default=DEFAULT_CPU, help="1ページのCPU時間の上限（秒）")
+    parser.add_argument("--rss", type=float, default=DEFAULT_RSS, help="1ページの常駐メモリの上限（MB）")
+    parser.add_argument("--risk-weight", type=float, default=RISK_WEIGHT, help="隔離する見積りの重み")
+    parser.add_argument("--all", action="store_true", help="すべてのページを隔離して処理する")
+    args = parser.parse_args(argv)
+
+    import MemberCheck01
+
+    CT = MemberCheck01.CheckTool()
+    CT.PageBudget = PageBudget(cpu=args.cpu, rss_mb=args.rss, risk_weight=args.risk_weight,
+                               isolate="all" if args.all else "risky")
+    status = 0
+    for filename in args.pdf:
+        CT.ResetMemberData()
+        result = CT.Run(filename, limit=args.limit, stpage=args.stpage, edpage=args.edpage)
+        print("{} : {} ({:.1f} 秒, 隔離 {} ページ, 読み飛ばし {} ページ)".format(
+            filename, "OK" if result.ok else "NG", result.time, result.isolated, len(result.skipped)),
+            file=sys.stderr)
+        for skip in result.skipped:
+            print("    page={page} {reason} cpu={cpu} rss={rss_mb}MB wall={wall}".format(**skip), file=sys.stderr)
+        #next
+        if not result.ok:
+            status = 1
+        #end if
+    #next
+    return status
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#==========================================================================================
+#   構造計算書PDFの入力レイヤー（メモリマップ）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+構造計算書（PDF）をmmapで一度だけメモリにマップし、pdfminer・pdfrw・PyPDF2 の各ライブラリへ
+ファイルを読み直さずにバッファのビューを渡すためのモジュール。
+
+・pdfminer の PDFDocument（相互参照表を解析済み）は1つのインスタンスを共有し、
+  用紙サイズの取得（従来の PyPDF2 による事前パス）にも同じ文書を使う。
+・pdfrw は内部で文字列（Latin-1）に変換するため、ディスクではなくマップ済みのバッファから渡す。
+"""
+
+# pip install pdfminer
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfinterp import PDFPageInterpreter
+
+import Instrument
+
+import os
+import io
+import mmap
+import hashlib
+
+
+#============================================================================
+#  マップ済みバッファの読み取り専用ビュー（ファイルオブジェクト互換）
+#============================================================================
+
+class PdfView(io.RawIOBase):
+    """
+    PdfSource のバッファを共有し、読み取り位置だけを個別に持つファイルオブジェクト。
+    読み取り位置が独立しているので、複数のライブラリに同時に渡すことができる。
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer    # mmap全体のmemoryview（コピーしない）
+        self.size = len(buffer)
+        self.pos = 0
+    #end def
+
+    def readable(self):
+        return True
+    #end def
+
+    def seekable(self):
+        return True
+    #end def
+
+    def tell(self):
+        return self.pos
+    #end def
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid whence ({})".format(whence))
+        #end if
+        if pos < 0:
+            raise ValueError("negative seek position {}".format(pos))
+        #end if
+        self.pos = pos
+        return self.pos
+    #end def
+
+    def read(self, size=-1):
+        if self.pos >= self.size:
+            return b""
+        #end if
+        if size is None or size < 0:
+            end = self.size
+        else:
+            end = min(self.size, self.pos + size)
+        #end if
+        data = self.buffer[self.pos:end].tobytes()
+        self.pos = end
+        return data
+    #end def
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+    #end def
+
+    def close(self):
+        # バッファは PdfSource が管理するので、ここでは参照を外すだけ
+        self.buffer = None
+        super().close()
+    #end def
+#end class
+
+
+#============================================================================
+#  PDFファイルを一度だけマップし、各ライブラリで共有するクラス
+#============================================================================
+
+class PdfSource():
+    #==================================================================================
+    #   オブジェクトのインスタンス化および初期化
+    #==================================================================================
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fp = open(filename, "rb")
+        try:
+            self.size = os.fstat(self.fp.fileno()).st_size
+            if self.size == 0:
+                raise OSError("empty PDF file: {}".format(filename))
+            #end if
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self.fp.close()
+            raise
+        #end try
+        self.buffer = memoryview(self.mm)
+        self.document = None    # 共有する pdfminer の PDFDocument
+        self.pages = None       # 共有する PDFPage のリスト
+        self.sha1 = None        # ファイルの内容のハッシュ（Sha1 で一度だけ求める）
+    #end def
+
+    def __enter__(self):
+        return self
+    #end def
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    #end def
+
+    #==================================================================================
+    #   ゼロコピーのビューを作成する関数
+    #==================================================================================
+
+    def View(self):
+        return PdfView(self.buffer)
+    #end def
+
+    #==================================================================================
+    #   pdfminer の文書（相互参照表を解析済み）を返す関数（一度だけ解析する）
+    #==================================================================================
+
+    def Document(self):
+        if self.document is None:
+            parser = PDFParser(self.View())
+            self.document = PDFDocument(parser)
+        #end if
+        return self.document
+    #end def
+
+    #==================================================================================
+    #   共有文書からページオブジェクトのリストを返す関数
+    #==================================================================================
+
+    def Pages(self):
+        if self.pages is None:
+            self.pages = list(PDFPage.create_pages(self.Document()))
+        #end if
+        return self.pages
+    #end def
+
+    def GetPages(self):
+        # PDFPage.get_pages(fp) の代わりに使用する
+        return iter(self.Pages())
+    #end def
+
+    def PageCount(self):
+        return len(self.Pages())
+    #end def
+
+    #==================================================================================
+    #   ファイルの内容のハッシュ（SHA-1）を返す関数（一度だけ求める）
+    #   判定結果のキャッシュ・ページの索引・ジャーナルの見出しで共有する（大きな計算書を何度も読まない）
+    #==================================================================================
+
+    def Sha1(self):
+        if self.sha1 is None:
+            with Instrument.Stage("sha1"):
+                self.sha1 = hashlib.sha1(self.buffer).hexdigest()
+            #end with
+        #end if
+        return self.sha1
+    #end def
+
+    #==================================================================================
+    #   各ページの用紙サイズ [幅, 高さ] のリストを返す関数（PyPDF2による事前パスの代替）
+    #==================================================================================
+
+    def PaperSizes(self):
+        PaperSize = []
+        for page in self.Pages():
+            (x0, y0, x1, y1) = page.mediabox
+            PaperSize.append([abs(float(x1) - float(x0)), abs(float(y1) - float(y0))])
+        #next
+        return PaperSize
+    #end def
+
+    #==================================================================================
+    #   注釈付きPDFの出力に使う pdfrw の PdfReader を返す関数
+    #==================================================================================
+
+    def PdfrwReader(self, decompress=False):
+        # pip install pdfrw
+        from pdfrw import PdfReader
+
+        # pdfrw は内部で文字列に変換するため、ここでのコピーは避けられない（ディスクからの再読込はしない）
+        return PdfReader(fdata=self.buffer.tobytes(), decompress=decompress)
+    #end def
+
+    #==================================================================================
+    #   PyPDF2 の PdfReader を返す関数（必要な場合のみ使用）
+    #==================================================================================
+
+    def PyPdf2Reader(self):
+        # pip install PyPDF2
+        from PyPDF2 import PdfReader as PR2
+
+        return PR2(self.View())
+    #end def
+
+    #==================================================================================
+    #   マップを解放する関数
+    #==================================================================================
+
+    def close(self):
+        self.document = None
+        self.pages = None
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+        #end if
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # 利用側がビューを保持している場合はGCに任せる
+                pass
+            #end try
+            self.mm = None
+        #end if
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        #end if
+    #end def
+#end class
+
+
+#============================================================================
+#  pdfminer のページ解釈の時間を計測するインタープリタ
+#============================================================================
+
+class TimedPageInterpreter(PDFPageInterpreter):
+
+    def process_page(self, page):
+        with Instrument.Stage("interpret"):
+            PDFPageInterpreter.process_page(self, page)
+        #end with
+    #end def
+#end class
@@ -0,0 +1,268 @@
+#==========================================================================================
+#   構造計算プログラムの種類とバージョンの判定（メタデータ・ページのヘッダー）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+CoverCheck は1ページ目の文字を1文字ずつ解析して「プログラムの名称」「プログラムバージョン」を読むため、
+表紙が1ページ目に無い計算書（断面リストだけを抜き出したPDFなど）では種類が「不明」になり、
+全ページが OtherSheet で処理されていた。DetectProgram は次の順番で種類とバージョンを判定する。
+
+  1. 文書情報（Info の Producer・Creator・Title・Subject）と XMP メタデータ
+  2. 先頭の SAMPLE_PAGES ページのテキストボックス（LAParams）の先頭 HEADER_BOXES 個
+     ・表紙の「プログラムの名称：～」「プログラムバージョン：～」
+     ・各ページの上端のヘッダー（例 "SuperBuild／SS7 Ver.1.1.1.18a"。ChartReader.ReadHeader と同じ読み方）
+
+判定結果はファイルの内容のハッシュ（SHA-1）ごとに CACHE_FILE に保存し、同じファイルは2回目から読まない。
+
+    import ProgramDetect
+    with PdfSource("計算書.pdf") as source:
+        info = ProgramDetect.DetectProgram(source)
+    # {"kind": "SuperBuild/SS7", "version": "1.1.1.18a", "method": "header", "page": 1}
+
+    python ProgramDetect.py 計算書.pdf [--pages 5] [--no-cache]
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+
+from pdfminer.layout import LAParams, LTTextContainer
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.pdftypes import resolve1, PDFStream
+from pdfminer.utils import decode_text
+
+from PdfInput import PdfSource
+import Instrument
+
+UNKNOWN = "不明"
+SAMPLE_PAGES = 3        # テキストを調べる先頭のページ数
+HEADER_BOXES = 6        # 1ページで調べるテキストボックスの数（ReadHeader と同じ）
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "program_cache.json")
+CACHE_SIZE = 1000       # キャッシュに残す件数
+
+# 種類の名前（CheckPage で使う名前）と、メタデータ・ヘッダーでの表記
+PROGRAMS = [
+    ("SuperBuild/SS7", re.compile(r"SuperBuild\s*[/／]\s*SS7")),
+]
+VERSION = re.compile(r"Ver(?:sion)?\.?\s*([0-9][0-9A-Za-z.\-]*)", re.IGNORECASE)
+
+_lock = threading.Lock()
+
+
+#============================================================================
+#  文字列から種類とバージョンを探す関数
+#============================================================================
+
+def MatchProgram(text):
+    # ヘッダーは文字の間に空白が入る（"Super Build／SS7  Ver. 1. 1. 1.18a"）ので、空白を除いて照合する
+    text = text.replace(" ","").replace("\u3000","")
+    for kind, pattern in PROGRAMS:
+        m = pattern.search(text)
+        if m is not None:
+            v = VERSION.search(text, m.end())
+            return kind, (v.group(1) if v is not None else UNKNOWN)
+        #end if
+    #next
+    return None, None
+#end def
+
+def MatchCover(text):
+    # 表紙の「プログラムの名称：～」「プログラムバージョン：～」（CoverCheck と同じ読み方）
+    t2 = text.replace(" ","").replace("：",":").replace("／","/")
+    kind = None
+    version = None
+    for line in t2.splitlines():
+        if "プログラムの名称" in line:
+            n = line.find(":",0)
+            kind = line[n+1:]
+        elif "プログラムバージョン" in line:
+            n = line.find(":",0)
+            version = line[n+1:]
+        #end if
+    #next
+    return kind, version
+#end def
+
+
+#============================================================================
+#  1. 文書情報とXMPメタデータ
+#============================================================================
+
+def MetadataTexts(document):
+    texts = []
+    for info in document.info:
+        for key in ("Producer", "Creator", "Title", "Subject"):
+            value = resolve1(info.get(key))
+            if isinstance(value, bytes):
+                texts.append(decode_text(value))
+            elif isinstance(value, str):
+                texts.append(value)
+            #end if
+        #next
+    #next
+    metadata = resolve1(document.catalog.get("Metadata"))
+    if isinstance(metadata, PDFStream):
+        try:
+            texts.append(metadata.get_data().decode("utf-8", "replace"))
+        except Exception:
+            pass    # 壊れたメタデータは無視してページのテキストで判定する
+        #end try
+    #end if
+    return texts
+#end def
+
+
+#============================================================================
+#  2. 先頭のページのテキストボックス
+#============================================================================
+
+def PageHeader(page, interpreter, device, count=HEADER_BOXES):
+    interpreter.process_page(page)
+    layout = device.get_result()
+    LineData = []
+    for lt in layout:
+        if isinstance(lt, LTTextContainer):
+            LineData.append(lt.get_text())
+            if len(LineData) >= count:
+                break
+            #end if
+        #end if
+    #next
+    return LineData
+#end def
+
+
+#============================================================================
+#  判定結果のキャッシュ（ファイルの内容のハッシュごと）
+#============================================================================
+
+def LoadCache(filename=CACHE_FILE):
+    if filename and os.path.exists(filename):
+        try:
+            with open(filename, encoding="utf-8") as fp:
+                return json.load(fp)
+            #end with
+        except ValueError:
+            return {}
+        #end try
+    #end if
+    return {}
+#end def
+
+def SaveCache(key, info, filename=CACHE_FILE):
+    with _lock:
+        data = LoadCache(filename)
+        data.pop(key, None)
+        data[key] = info
+        while len(data) > CACHE_SIZE:
+            data.pop(next(iter(data)))
+        #end while
+        tmp = "{}.{}.tmp".format(filename, os.getpid())
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False, indent=1)
+        #end with
+        os.replace(tmp, filename)
+    #end with
+#end def
+
+
+#============================================================================
+#  構造計算プログラムの種類とバージョンを判定する関数
+#============================================================================
+
+def Detect(source, interpreter=None, device=None, pages=SAMPLE_PAGES):
+    # 1. メタデータ
+    with Instrument.Stage("detect:metadata"):
+        for text in MetadataTexts(source.Document()):
+            kind, version = MatchProgram(text)
+            if kind is not None:
+                return {"kind": kind, "version": version, "method": "metadata", "page": 0}
+            #end if
+        #next
+    #end with
+
+    # 2. 先頭のページのテキストボックス
+    if interpreter is None:
+        resourceManager = PDFResourceManager()
+        device = PDFPageAggregator(resourceManager, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resourceManager, device)
+    #end if
+    with Instrument.Stage("detect:pages"):
+        kind = None
+        version = None
+        PageList = source.Pages()
+        for pageI in range(min(pages, len(PageList))):
+            for text in PageHeader(PageList[pageI], interpreter, device):
+                k, v = MatchCover(text)
+                if k:
+                    kind = k
+                #end if
+                if v:
+                    version = v
+                #end if
+                if kind and version:
+                    return {"kind": kind, "version": version, "method": "cover", "page": pageI + 1}
+                #end if
+                k, v = MatchProgram(text)
+                if k is not None and kind is None:
+                    return {"kind": k, "version": v, "method": "header", "page": pageI + 1}
+                #end if
+            #next
+            if kind:
+                return {"kind": kind, "version": version or UNKNOWN, "method": "cover", "page": pageI + 1}
+            #end if
+        #next
+    #end with
+    return {"kind": UNKNOWN, "version": UNKNOWN, "method": "none", "page": 0}
+#end def
+
+def DetectProgram(source, interpreter=None, device=None, pages=SAMPLE_PAGES, cache=CACHE_FILE):
+    key = None
+    if cache:
+        key = "{}:{}".format(source.Sha1(), pages)
+        info = LoadCache(cache).get(key)
+        if info is not None:
+            return dict(info, cached=True)
+        #end if
+    #end if
+    info = Detect(source, interpreter, device, pages)
+    if key is not None:
+        try:
+            SaveCache(key, info, cache)
+        except OSError:
+            pass    # 書込みできない場所でも判定結果は返す
+        #end try
+    #end if
+    return dict(info, cached=False)
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="構造計算プログラムの種類とバージョンの判定")
+    parser.add_argument("pdf", nargs="+")
+    parser.add_argument("--pages", type=int, default=SAMPLE_PAGES, help="テキストを調べる先頭のページ数")
+    parser.add_argument("--no-cache", action="store_true", help="判定結果のキャッシュを使わない")
+    args = parser.parse_args(argv)
+
+    for filename in args.pdf:
+        with PdfSource(filename) as source:
+            info = DetectProgram(source, pages=args.pages, cache=None if args.no_cache else CACHE_FILE)
+        #end with
+        print("{} : {kind} {version} ({method}, page={page}{c})".format(
+            filename, c=", cached" if info["cached"] else "", **info))
+    #next
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,71 +13,16 @@ from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import mm
+# 描画用フォントの登録（プロセスにつき一度だけ。./Fonts が無い場合の扱いも FontSetup に任せる）
+from FontSetup import RegisterFonts, FONTNAME1, FONTNAME2
 
 cc = 25.4/72.0
 
 def Read_Elements_from_pdf(pdf_path):
-    laparams = LAParams(line_margin=0.1,
-                word_margin=0.1,
-                boxes_flow=0.5,
-                detect_vertical=False,
-                all_texts=True)
-    
-    # PDFMinerのツールの準備
-    resourceManager = PDFResourceManager()
-    outfp = StringIO()
-    # PDFから単語を取得するためのデバイス
-    device = PDFPageAggregator(resourceManager, laparams=LAParams())
-    # PDFから１文字ずつを取得するためのデバイス
-    device2 = PDFPageAggregator(resourceManager)
-
-    interpreter = PDFPageInterpreter(resourceManager, device)
-    interpreter2 = PDFPageInterpreter(resourceManager, device2)
-    
-    fp = open(pdf_path, 'rb')
-    ElementData= {}
-    PageKind = ["構造計算書","断面リスト"]
-    # EKnd = ["壁"]
-    # EKnd = ["小梁","壁"]
-    # EKnd = ["【大梁】","【基礎大梁】","【柱】","【片持梁】","【小梁】","【基礎小梁】","【壁】"]
-    EKnd = ["【大梁】","【基礎大梁】","【柱】"]
-    # EKnd = ["大梁","柱"]
-    for EK in EKnd:
-        ElementData[EK] = {}
-    #next
-    # Elements= {}
-    pageN = 0
-    CR = ChartReader()
-    stopFlag = False
-    for page in PDFPage.get_pages(fp):
-        pageN += 1
-        print ("page={}:".format(pageN),end="")
-        # interpreter.process_page(page)
-        interpreter2.process_page(page)
-        
-        dflag, element = CR.ChartDevider(interpreter ,device ,interpreter2 ,device2 ,page,PageKind,EKnd)
-        if dflag :
-            for EK in EKnd:
-                if len(element[EK])>0:
-                    ElementData[EK]= ElementData[EK] | element[EK]
-                #end if
-            #next
-            if not stopFlag :
-                stopFlag = True
-            #enf if
-        else:
-            if stopFlag:
-                break
-            #end if
-        #en if
-        # else:
-        #     print("")
-        # #end if
-    #next
-    # ElementData[EK] = Elements
-    fp.close()
+    # ページ処理のループは ChartEngine に統合（この関数は「textbox2」方式での読取り）
+    from ChartEngine import ReadElements
 
-    return ElementData
+    return ReadElements(pdf_path, strategy="textbox2")
 #end def
 
 class ChartReader:
@@ -87,18 +32,12 @@ class ChartReader:
         self.memberData = {}
         self.memberName = []
         self.makePattern()
-        # 源真ゴシック等幅フォント
-        # GEN_SHIN_GOTHIC_MEDIUM_TTF = "/Library/Fonts/GenShinGothic-Monospace-Medium.ttf"
-        GEN_SHIN_GOTHIC_MEDIUM_TTF = "./Fonts/GenShinGothic-Monospace-Medium.ttf"
-        self.fontname1 = 'GenShinGothic'
-        # IPAexゴシックフォント
-        # IPAEXG_TTF = "/Library/Fonts/ipaexg.ttf"
-        IPAEXG_TTF = "./Fonts/ipaexg.ttf"
-        self.fontname2 = 'ipaexg'
-        
-        # フォント登録
-        pdfmetrics.registerFont(TTFont(self.fontname1, GEN_SHIN_GOTHIC_MEDIUM_TTF))
-        pdfmetrics.registerFont(TTFont(self.fontname2, IPAEXG_TTF))
+        # 源真ゴシック等幅フォント・IPAexゴシックフォント
+        self.fontname1 = FONTNAME1
+        self.fontname2 = FONTNAME2
+
+        # フォント登録（インスタンスを作るたびに TTF を読み込まない）
+        RegisterFonts()
     #end def
 
     def ChartDevider(self,interpreter ,device,interpreter2 ,device2 ,page,PageKind,EKind2):
@@ -6,82 +6,68 @@ from pdfminer.converter import PDFPageAggregator
 from pdfminer.pdfpage import PDFPage
 from io import StringIO
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import signal
+# matplotlib.pyplot と scipy.signal は下のコメントアウトした検討用コードでしか使わないため読み込まない
+# （必要な場合はその関数の中で import する）
 
 import sys,csv,os
-# pip install reportlab
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
-from ja_cvu_normalizer.ja_cvu_normalizer import JaCvuNormalizer
+import hashlib
+from collections import OrderedDict
+# 描画用フォント名（登録は FontSetup.RegisterFonts() で行う）
+from FontSetup import FONTNAME1, FONTNAME2
+# 罫線の正規化（固定小数点化・重複除去・同一直線上の線分の結合）
+from RuleNormalize import NormalizeRules, ToFixed
+# 処理段階ごとの時間と件数の計測（既定では無効）
+import Instrument
 
 cc = 25.4/72.0
 
 def Read_Elements_from_pdf(pdf_path):
-    laparams = LAParams(line_margin=0.1,
-                word_margin=0.1,
-                boxes_flow=0.5,
-                detect_vertical=False,
-                all_texts=True)
-    
-    # PDFMinerのツールの準備
-    resourceManager = PDFResourceManager()
-    outfp = StringIO()
-    # PDFから単語を取得するためのデバイス
-    device = PDFPageAggregator(resourceManager, laparams=LAParams())
-    # PDFから１文字ずつを取得するためのデバイス
-    device2 = PDFPageAggregator(resourceManager)
-
-    interpreter = PDFPageInterpreter(resourceManager, device)
-    interpreter2 = PDFPageInterpreter(resourceManager, device2)
-    
-    fp = open(pdf_path, 'rb')
-    ElementData= {}
-    PageKind = ["構造計算書","断面リスト"]
-    # EKnd = ["壁"]
-    # EKnd = ["小梁","壁"]
-    # EKnd = ["【大梁】","【基礎大梁】","【柱】","【片持梁】","【小梁】","【基礎小梁】","【壁】"]【⼤梁】 (1/4)
-    EKnd = ["【大梁】","【基礎大梁】","【柱】"]
-    # EKnd = ["大梁","柱"]
-    for EK in EKnd:
-        ElementData[EK] = {}
-    #next
-    # Elements= {}
-    pageN = 0
-    CR = ChartReader()
-    stopFlag = False
-    for page in PDFPage.get_pages(fp):
-        pageN += 1
-        print ("page={}:".format(pageN),end="")
-        # interpreter.process_page(page)
-        interpreter2.process_page(page)
-        
-        dflag, element = CR.ChartDevider(interpreter ,device ,interpreter2 ,device2 ,page,PageKind,EKnd)
-        if dflag :
-            for EK in EKnd:
-                if len(element[EK])>0:
-                    ElementData[EK]= ElementData[EK] | element[EK]
+    # ページ処理のループは ChartEngine に統合（この関数は「char」方式での読取り）
+    from ChartEngine import ReadElements
+
+    return ReadElements(pdf_path, strategy="char")
+#end def
+
+#============================================================================
+#  部材リストのデータをCSVの行（部材種類の行・見出し行・各部材の行）に変換する関数
+#============================================================================
+
+def ElementCsvRows(ElementData):
+    rows = []
+    ElementKind = ElementData.keys()
+    for Kind in ElementKind:
+        rows.append([Kind])     # 部材の種類
+
+        Elements = ElementData[Kind]    # 同じ部材種類のデータ
+        RowNames = list(Elements.keys())        # 符号名：断面位置
+        if len(RowNames) == 0:
+            continue
+        #end if
+        Edata = Elements[RowNames[0]]
+        ColumnNames =list(Edata.keys())
+        rows.append(["符号名：断面"] + ColumnNames)
+
+        for RowName in RowNames:
+            data = Elements[RowName]
+            cdata = [RowName]
+            for ColumnName in ColumnNames:
+                if ColumnName in data:
+                    cdata.append(data[ColumnName])
+                else:
+                    cdata.append("")
                 #end if
             #next
-            if not stopFlag :
-                stopFlag = True
-            #enf if
-        else:
-            if stopFlag:
-                break
-            #end if
-        #en if
-        # else:
-        #     print("")
-        # #end if
+            rows.append(cdata)
+        #next
     #next
-    # ElementData[EK] = Elements
-    fp.close()
+    return rows
+#end def
 
-    return ElementData
+def WriteElementCsv(ElementData, filename):
+    with open(filename, 'w', encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows(ElementCsvRows(ElementData))
+    #end with
 #end def
 
 class ChartReader:
@@ -91,20 +77,20 @@ class ChartReader:
         self.memberData = {}
         self.memberName = []
         self.makePattern()
-        # 源真ゴシック等幅フォント
-        # GEN_SHIN_GOTHIC_MEDIUM_TTF = "/Library/Fonts/GenShinGothic-Monospace-Medium.ttf"
-        GEN_SHIN_GOTHIC_MEDIUM_TTF = "./Fonts/GenShinGothic-Monospace-Medium.ttf"
-        self.fontname1 = 'GenShinGothic'
-        # IPAexゴシックフォント
-        # IPAEXG_TTF = "/Library/Fonts/ipaexg.ttf"
-        IPAEXG_TTF = "./Fonts/ipaexg.ttf"
-        self.fontname2 = 'ipaexg'
-        
-        # フォント登録
-        pdfmetrics.registerFont(TTFont(self.fontname1, GEN_SHIN_GOTHIC_MEDIUM_TTF))
-        pdfmetrics.registerFont(TTFont(self.fontname2, IPAEXG_TTF))
+        # MakeChar で罫線の線分を結合して返すかどうか
+        self.NormalizeRules = True
+        # 表の構造のキャッシュ（罫線の形状のハッシュ値 : SolveGrid の結果）
+        self.GridCache = OrderedDict()
+        self.GridCacheSize = 64
+        self.GridCacheHits = 0
+        self.GridCacheMisses = 0
+        # 源真ゴシック等幅フォントおよびIPAexゴシックフォント
+        # （描画する場合は FontSetup.RegisterFonts() でプロセスに一度だけ登録する）
+        self.fontname1 = FONTNAME1
+        self.fontname2 = FONTNAME2
     #end def
 
+    @Instrument.Timed("ChartDevider")
     def ChartDevider(self,interpreter ,device,interpreter2 ,device2 ,page,PageKind,EKind2):
         """
         ・すべての水平線および垂直線のデータを辞書にしてリストを作成
@@ -138,7 +124,8 @@ class ChartReader:
             return False,{}
         #end if
 
-        # 異体字正規化モジュール
+        # 異体字正規化モジュール（表のページでのみ必要なのでここで読み込む）
+        from ja_cvu_normalizer.ja_cvu_normalizer import JaCvuNormalizer
         ja_cvu_normalizer = JaCvuNormalizer()
                         
         DataFlag1 = []
@@ -195,9 +182,10 @@ class ChartReader:
         PageText = []
         PageTextYm = []
         rp = 3
+        # 行ごとの文字の辞書と文字列（ページの LineText・LineData を上書きしないように別の名前にする）
         for CharLine in CharData:
-            LineData = []
-            LineText = ""
+            LineChars = []
+            LineString = ""
             hmax = 0.0
             y1max = -10000.0
             y0min = 10000.0
@@ -212,8 +200,8 @@ class ChartReader:
                 cdata["y1"] = round(Char[4],rp)
                 cdata["height"] = round(abs(Char[4] - Char[3]),rp)
                 cdata["width"] = round(abs(Char[2] - Char[1]),rp)
-                LineData.append(cdata)
-                LineText += cdata["text"]
+                LineChars.append(cdata)
+                LineString += cdata["text"]
                 if hmax < cdata["height"]:
                     hmax = cdata["height"]
                 #end if
@@ -230,9 +218,9 @@ class ChartReader:
                     x0min = cdata["x0"]
                 #end if
             #next
-            PageTextData.append(LineData)
+            PageTextData.append(LineChars)
             t1 = {}
-            t1["text"] = LineText
+            t1["text"] = LineString
             t1["x0"] = x0min
             t1["x1"] = x1max
             t1["y0"] = y0min
@@ -244,12 +232,12 @@ class ChartReader:
         #next
         a=0
         PageWordData = []
-        for LineData in PageTextData:
+        for LineChars in PageTextData:
             LineWordData = []
             word = []
             text1 = ""
             pit = 0
-            for char in LineData:
+            for char in LineChars:
                 if pit == 0:
                     word = []
                     pit = char["width"]
@@ -835,460 +823,13 @@ class ChartReader:
                 print(text1)
                 # print(ChartXmin*cc,ChartXmax*cc,ChartYmin*cc,ChartYmax*cc)
 
-                # 表の行のヘッダーとデータの境界線を探す
-                Xpoint = ChartXmin
-                for L in VBLine:
-                    if L["x0"]>ChartXmin:
-                        Xpoint = L["x0"]
-                        break
-                    #end if
-                #next
-                # print(Xpoint*cc)
-                
-                # x0が境界線より左側にあるまたは接している水平線のみ抽出
-                HLine2 = []
-                HLine2Y1 = []
-                for L in HLine:
-                    if L["x0"] <= Xpoint:
-                        HLine2.append(L)
-                        HLine2Y1.append(L["y1"])
-                    #end if
-                #next
-
-                # 水平線をy1が高い順に並び替え
-                HLineArray = np.array(HLine2Y1)      # リストをNumpyの配列に変換
-                index1 = np.argsort(-HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
-                HLine22 = []                     # 高順位並び替えたLineデータ
-                for j in range(len(index1)):
-                    HLine22.append(HLine2[index1[j]])
-                #next
-                HLine2 = HLine22
-
-                # 抽出した水平線からy1が異なるものを抽出（表の水平罫線と判断）
-                HLinePoint = []
-                y01 = HLine2[0]["y1"]
-                Hxmax = HLine2[0]["x1"]
-                Hxmin = HLine2[0]["x0"]
-                HLinePoint.append(y01)
-                HLineTerminal = []
-                for L in HLine2:
-                    if L["y1"]<y01:
-                        HLineTerminal.append([Hxmin ,Hxmax])
-                        # print(y01*cc ,Hxmin*cc ,Hxmax*cc)
-                        y01 = L["y1"]
-                        HLinePoint.append(y01)
-                        Hxmin = L["x0"]
-                        # Hxmax = L["x1"]
-                        Hxmax = ChartXmax
-                    else:
-                        if L["x0"] < Hxmin:
-                            Hxmin = L["x0"]
-                        #end if
-                        # if L["x1"] > Hxmax:
-                        #     Hxmax = L["x1"]
-                        # #end if
-                    #end if
-                #next
-                if HLine2[len(HLine2)-1]["y1"]<=y01:
-                    HLineTerminal.append([HLine2[len(HLine2)-1]["x0"],HLine2[len(HLine2)-1]["x1"]])
-                #end if
-
-                MadeHLine = []
-                for y in HLinePoint:
-                    xmin1 = +10000.0
-                    xmax1 = -10000.0
-                    for H in HLine:
-                        if y == H["y0"]:
-                            if xmin1>H["x0"]:
-                                xmin1=H["x0"]
-                            #end if
-                            if xmax1<H["x1"]:
-                                xmax1=H["x1"]
-                            #end if
-                        #end if
-                    #next
-                    MadeHLine.append({"x0":xmin1,"x1":xmax1,"y0":y,"y1":y})
-                #next
-                a=0
-
-
-                # x0が境界線より左側にあるまたは接している太線水平線のみ抽出
-                HBLine2 = []
-                HBLine2Y1 = []
-                for L in HBLine:
-                    if L["x0"] <= Xpoint:
-                        HBLine2.append(L)
-                        HBLine2Y1.append(L["y1"])
-                    #end if
-                #next
-
-                # 水平線をy1が高い順に並び替え
-                HLineArray = np.array(HBLine2Y1)      # リストをNumpyの配列に変換
-                index1 = np.argsort(-HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
-                HBLine22 = []                     # 高順位並び替えたLineデータ
-                for j in range(len(index1)):
-                    HBLine22.append(HBLine2[index1[j]])
-                #next
-                HBLine2 = HBLine22
-
-                # 抽出した太線水平線からy1が異なるものを抽出（表の太線水平罫線と判断）
-                HBLinePoint = []
-                y01 = HBLine2[0]["y1"]
-                HBLinePoint.append(y01)
-                for L in HBLine2:
-                    if L["y1"]<y01:
-                        y01 = L["y1"]
-                        HBLinePoint.append(y01)
-                    #end if
-                #next
-                Ypoint = HBLinePoint[1]     # コラムのヘッダーとデータの境界のY座標
-                # print(Ypoint*cc)
-
-                VLine2 = []
-                VLine2X0 = []
-                for j in range(len(HLine2)-1):
-                    y1 = HLine2[j]["y1"]
-                    y0 = HLine2[j+1]["y1"]
-                    for L in VLine:
-                        if L["y0"]==y0 or L["y1"]== y1 :
-                            VLine2.append(L)
-                            VLine2X0.append(L["x0"])
-                        #end if
-                    #next
-                #next
-
-                # 垂直線をx0が小さい順に並び替え
-                HLineArray = np.array(VLine2X0)      # リストをNumpyの配列に変換
-                index1 = np.argsort(HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
-                VLine22 = []                     # 高順位並び替えたLineデータ
-                for j in range(len(index1)):
-                    VLine22.append(VLine2[index1[j]])
-                #next
-                VLine2 = VLine22
-
-                # 抽出した垂直線からx0が異なるものを抽出（表の垂直罫線と判断）
-                VLinePoint = []
-                VLinePoint.append(ChartXmin)
-                x01 = ChartXmin
-                for L in VLine2:
-                    if L["x0"]>x01:
-                        x01 = L["x0"]
-                        VLinePoint.append(x01)
-                    #end if
-                #next
-                VLinePoint.append(ChartXmax)
-
-                ColumnsN = len(VLinePoint) - 1
-                RowsN = len(HLinePoint) - 1
-                Celly0y1 = []
-                DataStartRn = 0     # データがスタートする行番号
-                for j in range(RowsN):
-                    Celly0y1.append([HLinePoint[j+1] ,HLinePoint[j]])
-                    if HLinePoint[j] == Ypoint:
-                        DataStartRn = j
-                    #end if
-                #next
-                Cellx0x1 = []
-                DataStartCn = 0    # データがスタートする列番号
-                for j in range(ColumnsN):
-                    Cellx0x1.append([VLinePoint[j] ,VLinePoint[j+1]])
-                    if VLinePoint[j] == Xpoint:
-                        DataStartCn = j
-                    #end if
-                #next
-
-                MadeVLine = []
-                for x in VLinePoint:
-                    L1 = []
-                    L2 = []
-                    for L in VLine:
-                        if L["x0"]==x:
-                            L1.append(L)
-                            L2.append(L["y1"])
-                        #end if
-                    #next
-                    
-                    if len(L1)>0:
-                        VArray = np.array(L2)      # リストをNumpyの配列に変換
-                        index1 = np.argsort(-VArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
-                        L22 = []                     # 高順位並び替えたLineデータ
-                        for j in range(len(index1)):
-                            L22.append(L1[index1[j]])
-                        #next
-                        L1 = L22
-                        ymax1 = L1[0]["y1"]
-                        ymin1 = L1[0]["y0"]
-                        for L in L1:
-                            if L["y1"] < ymin1:
-                                MadeVLine.append({"x0":x,"x1":x,"y0":ymin1,"y1":ymax1})
-                                ymax1 = L["y1"]
-                                ymin1 = L["y0"]
-                            else:
-                                ymin1 = L["y0"]
-                            #end if
-                        #next
-                        MadeVLine.append({"x0":x,"x1":x,"y0":ymin1,"y1":ymax1})
-                    #end if
-                #next
-                a=0
-
-                    #end if
-
-
-
-                # words = ChartWords[i]
-                # wordCell = []
-                # for w in words:
-                #     wx0 = w["x0"]
-                #     wx1 = w["x1"]
-                #     wy0 = w["y0"]
-                #     wy1 = w["y1"]
-                #     t1 = w["text"]
-                #     index1 = w["index"]
-                #     # cellX = []
-                #     # cellY = []
-                #     for j in range(ColumnsN):
-                #         [x0,x1] = Cellx0x1[j]
-                #         if wx0>=x0 and wx0<=x1 :
-                #             cellX=j
-                #         #end if
-                #     #next
-                #     for j in range(RowsN):
-                #         [y0,y1] = Celly0y1[j]
-                #         if wy0>=y0 and wx0<=y1 :
-                #             cellY=j
-                #         #end if
-                #     #next
-                #     wordCell.append([t1,index1,cellX,cellY])
-                # #next
-                
-                ChartData = []
-                ChartDataWithOrigin = []
-                for j in range(RowsN):
-                    CCell = []
-                    CCell2 = []
-                    for k in range(ColumnsN):
-                        CCell.append("")
-                        CCell2.append([])
-                    #next
-                    ChartData.append(CCell)
-                    ChartDataWithOrigin.append(CCell2)
-                #next
-
-                for CLine in Char:
-                    for C in CLine:
-                        t = C[0]
-                        Cx0 = C[1]
-                        Cx1 = C[2]
-                        Cy0 = C[3]
-                        Cy1 = C[4]
-                        cellX = -1
-                        cellY = -1
-                        for j in range(ColumnsN):
-                            [x0,x1] = Cellx0x1[j]
-                            if Cx0>=x0 and Cx0<=x1 :
-                                cellX=j
-                            #end if
-                        #next
-                        for j in range(RowsN):
-                            [y0,y1] = Celly0y1[j]
-                            if Cy1>=y0 and Cy1<=y1 :
-                                cellY=j
-                            #end if
-                        #next
-                        if cellX>-1 and cellY>-1:
-                            ChartData[cellY][cellX] += t
-                            # C2 = ChartDataWithOrigin[cellY][cellX]
-                            # C2.append(C)
-                            # ChartDataWithOrigin[cellY][cellX] = C2
-                            ChartDataWithOrigin[cellY][cellX].append(C)
-                        #end if
-                    #next
-                #next
-                
-                # セル毎に罫線の有無を調べる。
-                LineExist = []
-                CellFlag = []
-                for j in range(RowsN):
-                    List = []
-                    FlagLine = []
-                    for k in range(ColumnsN):
-                        LineE = {}
-                        LineE["Upper"] = False
-                        LineE["Lower"] = False
-                        LineE["Left"] = False
-                        LineE["Right"] = False
-                        List.append(LineE)
-                        FlagLine.append([-1,-1])
-                    #next
-                    LineExist.append(List)
-                    CellFlag.append(FlagLine)
-                #next
-
-                for j in range(RowsN):
-                    y0 = 0.0
-                    y1 = 0.0
-                    x0 = 0.0
-                    x1 = 0.0
-                    
-                    [y0,y1] = Celly0y1[j]
-                    for k in range(ColumnsN):
-                        [x0,x1] = Cellx0x1[k]
-                        flag = False
-                        # for L in HLine2:
-                        if j==9 and k==3:
-                            a=0
-                        # for L in HLine:
-                        for L in MadeHLine:
-                            Cy0 = L["y0"]
-                            Cy1 = L["y1"]
-                            Cx0 = L["x0"]
-                            Cx1 = L["x1"]
-                            if y1 == Cy1 :
-                                if x0>=Cx0 and x1<=Cx1 :
-                                    LineExist[j][k]["Upper"] = True
-                                #end if
-                            #end if
-                            if y0 == Cy0 :
-                                if x0>=Cx0 and x1<=Cx1 :
-                                    LineExist[j][k]["Lower"] = True
-                                #end if
-                            #end if
-                        #next
-                        # for L in VLine2:
-                        # for L in VLine:
-                        for L in MadeVLine:
-                            Cy0 = L["y0"]
-                            Cy1 = L["y1"]
-                            Cx0 = L["x0"]
-                            Cx1 = L["x1"]
-                            if x0 == Cx0 :
-                                if y1<=Cy1 and y0 >= Cy0:
-                                    LineExist[j][k]["Left"] = True
-                                #end if
-                            else:
-                                if x0 == ChartXmin :
-                                    LineExist[j][k]["Left"] = True
-                                #end if
-                            #end if
-                            if x1 == Cx1 :
-                                if y1<=Cy1 and y0 >= Cy0 :
-                                    LineExist[j][k]["Right"] = True
-                                #end if
-                            else:
-                                if x1 == ChartXmax :
-                                    LineExist[j][k]["Right"] = True
-                                #end if
-                            #end if
-                        #next
-                    #next
-                #next
-                a=0
-
-                CellInfo = []
-                CellNo = []
-                CellD = ""
-                for j in range(RowsN):
-                    for k in range(ColumnsN):
-                        if CellFlag[j][k] == [-1,-1]:
-                            CellFlag[j][k] = [j,k]
-                            CellNo.append([j,k])
-                            if ChartData[j][k] != "":
-                                CellD = ChartData[j][k]
-                            #end if
-                            cFlag = True
-                            l = 0
-                            while True:
-                                l += 1
-                                if k + l < ColumnsN:
-                                    if LineExist[j][k + l]["Left"] :
-                                        cFlag = True
-                                        break
-                                    else:
-                                        if CellFlag[j][k + l] == [-1,-1]:
-                                            CellFlag[j][k + l] = [j,k]
-                                            CellNo.append([j,k + l])
-                                            if ChartData[j][k + l] != "":
-                                                CellD += ChartData[j][k + l]
-                                            #end if
-                                        #end if
-                                    #end if
-                                else:
-                                    if len(CellNo)>0 :
-                                        CellInfo.append([CellNo,CellD.replace(" ","")])
-                                    #end if
-                                    CellNo = []
-                                    CellD = ""
-                                    cFlag = False
-                                    break
-                                #end if
-                            #end while
-                            # if len(CellNo)>0 :
-                            #     CellInfo.append([CellNo,CellD])
-                            # #end if
-                            # CellNo = []
-                            # CellD = ""
-
-                            if cFlag:
-                                m = 0
-                                while True:
-                                    m += 1
-                                    if j + m < RowsN:
-                                        if LineExist[j + m][k]["Upper"]:
-                                            if len(CellNo)>0 :
-                                                CellInfo.append([CellNo,CellD.replace(" ","")])
-                                            #end if
-                                            CellNo = []
-                                            CellD = ""
-                                            break
-                                        #end if
-                                        for l1 in range(l):
-                                            if CellFlag[j + m ][k + l1] == [-1,-1]:
-                                                CellFlag[j + m ][k + l1] = [j,k]
-                                                CellNo.append([j + m ,k + l1])
-                                                if ChartData[j + m][k + l1] != "":
-                                                    CellD += ChartData[j + m][k + l1]
-                                                #end if
-                                            #end if
-                                        #next
-                                        # l = 0
-                                    else:
-                                        if len(CellNo)>0 :
-                                            CellInfo.append([CellNo,CellD.replace(" ","")])
-                                        #end if
-                                        CellNo = []
-                                        CellD = ""
-                                        break
-                                        
-                                    #end if
-                                #end while
-                                if len(CellNo)>0 :
-                                    CellInfo.append([CellNo,CellD.replace(" ","")])
-                                #end if
-                                CellNo = []
-                                CellD = ""
-                            #end if
-                        # #end if
-                        # CellNo = []
-                        # CellD = ""
-                    #next
-                #next
-
-                ChartData2 = []
-                for j in range(RowsN):
-                    CCell = []
-                    for k in range(ColumnsN):
-                        CCell.append("")
-                    #next
-                    ChartData2.append(CCell)
-                #next
-                # ChartData2 = ChartData.copy()
-                for CellInfoD in CellInfo:
-                    [CellNo2, D2 ] = CellInfoD
-                    for C in CellNo2:
-                        ChartData2[C[0]][C[1]]=D2
-                    #next
-                #next
+                # 表の構造は罫線の形状が同じ表で共有し、文字だけをセルに割り当てる
+                grid = self.TableGrid(HLine, VLine, HBLine, VBLine, ChartXmin, ChartXmax)
+                RowsN = grid["RowsN"]
+                ColumnsN = grid["ColumnsN"]
+                DataStartRn = grid["DataStartRn"]
+                DataStartCn = grid["DataStartCn"]
+                ChartData, ChartData2 = self.FillGrid(grid, Char)
 
 
                 a=0
@@ -1462,6 +1003,524 @@ class ChartReader:
     #end def
 
 
+    #==================================================================================
+    #   表の罫線から行・列の区切りと結合セルを求める関数（文字には依存しない）
+    #==================================================================================
+
+    def SolveGrid(self, HLine, VLine, HBLine, VBLine, ChartXmin, ChartXmax):
+        # 表の行のヘッダーとデータの境界線を探す
+        Xpoint = ChartXmin
+        for L in VBLine:
+            if L["x0"]>ChartXmin:
+                Xpoint = L["x0"]
+                break
+            #end if
+        #next
+        # print(Xpoint*cc)
+        
+        # x0が境界線より左側にあるまたは接している水平線のみ抽出
+        HLine2 = []
+        HLine2Y1 = []
+        for L in HLine:
+            if L["x0"] <= Xpoint:
+                HLine2.append(L)
+                HLine2Y1.append(L["y1"])
+            #end if
+        #next
+
+        # 水平線をy1が高い順に並び替え
+        HLineArray = np.array(HLine2Y1)      # リストをNumpyの配列に変換
+        index1 = np.argsort(-HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
+        HLine22 = []                     # 高順位並び替えたLineデータ
+        for j in range(len(index1)):
+            HLine22.append(HLine2[index1[j]])
+        #next
+        HLine2 = HLine22
+
+        # 抽出した水平線からy1が異なるものを抽出（表の水平罫線と判断）
+        HLinePoint = []
+        y01 = HLine2[0]["y1"]
+        Hxmax = HLine2[0]["x1"]
+        Hxmin = HLine2[0]["x0"]
+        HLinePoint.append(y01)
+        HLineTerminal = []
+        for L in HLine2:
+            if L["y1"]<y01:
+                HLineTerminal.append([Hxmin ,Hxmax])
+                # print(y01*cc ,Hxmin*cc ,Hxmax*cc)
+                y01 = L["y1"]
+                HLinePoint.append(y01)
+                Hxmin = L["x0"]
+                # Hxmax = L["x1"]
+                Hxmax = ChartXmax
+            else:
+                if L["x0"] < Hxmin:
+                    Hxmin = L["x0"]
+                #end if
+                # if L["x1"] > Hxmax:
+                #     Hxmax = L["x1"]
+                # #end if
+            #end if
+        #next
+        if HLine2[len(HLine2)-1]["y1"]<=y01:
+            HLineTerminal.append([HLine2[len(HLine2)-1]["x0"],HLine2[len(HLine2)-1]["x1"]])
+        #end if
+
+        MadeHLine = []
+        for y in HLinePoint:
+            xmin1 = +10000.0
+            xmax1 = -10000.0
+            for H in HLine:
+                if y == H["y0"]:
+                    if xmin1>H["x0"]:
+                        xmin1=H["x0"]
+                    #end if
+                    if xmax1<H["x1"]:
+                        xmax1=H["x1"]
+                    #end if
+                #end if
+            #next
+            MadeHLine.append({"x0":xmin1,"x1":xmax1,"y0":y,"y1":y})
+        #next
+        a=0
+
+
+        # x0が境界線より左側にあるまたは接している太線水平線のみ抽出
+        HBLine2 = []
+        HBLine2Y1 = []
+        for L in HBLine:
+            if L["x0"] <= Xpoint:
+                HBLine2.append(L)
+                HBLine2Y1.append(L["y1"])
+            #end if
+        #next
+
+        # 水平線をy1が高い順に並び替え
+        HLineArray = np.array(HBLine2Y1)      # リストをNumpyの配列に変換
+        index1 = np.argsort(-HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
+        HBLine22 = []                     # 高順位並び替えたLineデータ
+        for j in range(len(index1)):
+            HBLine22.append(HBLine2[index1[j]])
+        #next
+        HBLine2 = HBLine22
+
+        # 抽出した太線水平線からy1が異なるものを抽出（表の太線水平罫線と判断）
+        HBLinePoint = []
+        y01 = HBLine2[0]["y1"]
+        HBLinePoint.append(y01)
+        for L in HBLine2:
+            if L["y1"]<y01:
+                y01 = L["y1"]
+                HBLinePoint.append(y01)
+            #end if
+        #next
+        Ypoint = HBLinePoint[1]     # コラムのヘッダーとデータの境界のY座標
+        # print(Ypoint*cc)
+
+        VLine2 = []
+        VLine2X0 = []
+        for j in range(len(HLine2)-1):
+            y1 = HLine2[j]["y1"]
+            y0 = HLine2[j+1]["y1"]
+            for L in VLine:
+                if L["y0"]==y0 or L["y1"]== y1 :
+                    VLine2.append(L)
+                    VLine2X0.append(L["x0"])
+                #end if
+            #next
+        #next
+
+        # 垂直線をx0が小さい順に並び替え
+        HLineArray = np.array(VLine2X0)      # リストをNumpyの配列に変換
+        index1 = np.argsort(HLineArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
+        VLine22 = []                     # 高順位並び替えたLineデータ
+        for j in range(len(index1)):
+            VLine22.append(VLine2[index1[j]])
+        #next
+        VLine2 = VLine22
+
+        # 抽出した垂直線からx0が異なるものを抽出（表の垂直罫線と判断）
+        VLinePoint = []
+        VLinePoint.append(ChartXmin)
+        x01 = ChartXmin
+        for L in VLine2:
+            if L["x0"]>x01:
+                x01 = L["x0"]
+                VLinePoint.append(x01)
+            #end if
+        #next
+        VLinePoint.append(ChartXmax)
+
+        ColumnsN = len(VLinePoint) - 1
+        RowsN = len(HLinePoint) - 1
+        Celly0y1 = []
+        DataStartRn = 0     # データがスタートする行番号
+        for j in range(RowsN):
+            Celly0y1.append([HLinePoint[j+1] ,HLinePoint[j]])
+            if HLinePoint[j] == Ypoint:
+                DataStartRn = j
+            #end if
+        #next
+        Cellx0x1 = []
+        DataStartCn = 0    # データがスタートする列番号
+        for j in range(ColumnsN):
+            Cellx0x1.append([VLinePoint[j] ,VLinePoint[j+1]])
+            if VLinePoint[j] == Xpoint:
+                DataStartCn = j
+            #end if
+        #next
+
+        MadeVLine = []
+        for x in VLinePoint:
+            L1 = []
+            L2 = []
+            for L in VLine:
+                if L["x0"]==x:
+                    L1.append(L)
+                    L2.append(L["y1"])
+                #end if
+            #next
+            
+            if len(L1)>0:
+                VArray = np.array(L2)      # リストをNumpyの配列に変換
+                index1 = np.argsort(-VArray)    # 縦の線をHeightの値で降順にソートするインデックスを取得
+                L22 = []                     # 高順位並び替えたLineデータ
+                for j in range(len(index1)):
+                    L22.append(L1[index1[j]])
+                #next
+                L1 = L22
+                ymax1 = L1[0]["y1"]
+                ymin1 = L1[0]["y0"]
+                for L in L1:
+                    if L["y1"] < ymin1:
+                        MadeVLine.append({"x0":x,"x1":x,"y0":ymin1,"y1":ymax1})
+                        ymax1 = L["y1"]
+                        ymin1 = L["y0"]
+                    else:
+                        ymin1 = L["y0"]
+                    #end if
+                #next
+                MadeVLine.append({"x0":x,"x1":x,"y0":ymin1,"y1":ymax1})
+            #end if
+        #next
+        a=0
+
+            #end if
+
+
+
+        # words = ChartWords[i]
+        # wordCell = []
+        # for w in words:
+        #     wx0 = w["x0"]
+        #     wx1 = w["x1"]
+        #     wy0 = w["y0"]
+        #     wy1 = w["y1"]
+        #     t1 = w["text"]
+        #     index1 = w["index"]
+        #     # cellX = []
+        #     # cellY = []
+        #     for j in range(ColumnsN):
+        #         [x0,x1] = Cellx0x1[j]
+        #         if wx0>=x0 and wx0<=x1 :
+        #             cellX=j
+        #         #end if
+        #     #next
+        #     for j in range(RowsN):
+        #         [y0,y1] = Celly0y1[j]
+        #         if wy0>=y0 and wx0<=y1 :
+        #             cellY=j
+        #         #end if
+        #     #next
+        #     wordCell.append([t1,index1,cellX,cellY])
+        # #next
+
+        # セル毎に罫線の有無を調べる。
+        LineExist = []
+        CellFlag = []
+        for j in range(RowsN):
+            List = []
+            FlagLine = []
+            for k in range(ColumnsN):
+                LineE = {}
+                LineE["Upper"] = False
+                LineE["Lower"] = False
+                LineE["Left"] = False
+                LineE["Right"] = False
+                List.append(LineE)
+                FlagLine.append([-1,-1])
+            #next
+            LineExist.append(List)
+            CellFlag.append(FlagLine)
+        #next
+
+        for j in range(RowsN):
+            y0 = 0.0
+            y1 = 0.0
+            x0 = 0.0
+            x1 = 0.0
+            
+            [y0,y1] = Celly0y1[j]
+            for k in range(ColumnsN):
+                [x0,x1] = Cellx0x1[k]
+                flag = False
+                # for L in HLine2:
+                if j==9 and k==3:
+                    a=0
+                # for L in HLine:
+                for L in MadeHLine:
+                    Cy0 = L["y0"]
+                    Cy1 = L["y1"]
+                    Cx0 = L["x0"]
+                    Cx1 = L["x1"]
+                    if y1 == Cy1 :
+                        if x0>=Cx0 and x1<=Cx1 :
+                            LineExist[j][k]["Upper"] = True
+                        #end if
+                    #end if
+                    if y0 == Cy0 :
+                        if x0>=Cx0 and x1<=Cx1 :
+                            LineExist[j][k]["Lower"] = True
+                        #end if
+                    #end if
+                #next
+                # for L in VLine2:
+                # for L in VLine:
+                for L in MadeVLine:
+                    Cy0 = L["y0"]
+                    Cy1 = L["y1"]
+                    Cx0 = L["x0"]
+                    Cx1 = L["x1"]
+                    if x0 == Cx0 :
+                        if y1<=Cy1 and y0 >= Cy0:
+                            LineExist[j][k]["Left"] = True
+                        #end if
+                    else:
+                        if x0 == ChartXmin :
+                            LineExist[j][k]["Left"] = True
+                        #end if
+                    #end if
+                    if x1 == Cx1 :
+                        if y1<=Cy1 and y0 >= Cy0 :
+                            LineExist[j][k]["Right"] = True
+                        #end if
+                    else:
+                        if x1 == ChartXmax :
+                            LineExist[j][k]["Right"] = True
+                        #end if
+                    #end if
+                #next
+            #next
+        #next
+        a=0
+
+        # 罫線で囲まれたセルをまとめ、結合セルごとのセル番号のリストを作成
+        CellGroups = []
+        CellNo = []
+        for j in range(RowsN):
+            for k in range(ColumnsN):
+                if CellFlag[j][k] == [-1,-1]:
+                    CellFlag[j][k] = [j,k]
+                    CellNo.append([j,k])
+                    cFlag = True
+                    l = 0
+                    while True:
+                        l += 1
+                        if k + l < ColumnsN:
+                            if LineExist[j][k + l]["Left"] :
+                                cFlag = True
+                                break
+                            else:
+                                if CellFlag[j][k + l] == [-1,-1]:
+                                    CellFlag[j][k + l] = [j,k]
+                                    CellNo.append([j,k + l])
+                                #end if
+                            #end if
+                        else:
+                            if len(CellNo)>0 :
+                                CellGroups.append(CellNo)
+                            #end if
+                            CellNo = []
+                            cFlag = False
+                            break
+                        #end if
+                    #end while
+                    # if len(CellNo)>0 :
+                    #     CellGroups.append(CellNo)
+                    # #end if
+                    # CellNo = []
+
+                    if cFlag:
+                        m = 0
+                        while True:
+                            m += 1
+                            if j + m < RowsN:
+                                if LineExist[j + m][k]["Upper"]:
+                                    if len(CellNo)>0 :
+                                        CellGroups.append(CellNo)
+                                    #end if
+                                    CellNo = []
+                                    break
+                                #end if
+                                for l1 in range(l):
+                                    if CellFlag[j + m ][k + l1] == [-1,-1]:
+                                        CellFlag[j + m ][k + l1] = [j,k]
+                                        CellNo.append([j + m ,k + l1])
+                                    #end if
+                                #next
+                                # l = 0
+                            else:
+                                if len(CellNo)>0 :
+                                    CellGroups.append(CellNo)
+                                #end if
+                                CellNo = []
+                                break
+                                
+                            #end if
+                        #end while
+                        if len(CellNo)>0 :
+                            CellGroups.append(CellNo)
+                        #end if
+                        CellNo = []
+                    #end if
+                # #end if
+                # CellNo = []
+            #next
+        #next
+
+        grid = {}
+        grid["RowsN"] = RowsN
+        grid["ColumnsN"] = ColumnsN
+        grid["Cellx0x1"] = Cellx0x1
+        grid["Celly0y1"] = Celly0y1
+        grid["DataStartRn"] = DataStartRn
+        grid["DataStartCn"] = DataStartCn
+        grid["LineExist"] = LineExist
+        grid["CellGroups"] = CellGroups
+        return grid
+    #end def
+    #*********************************************************************************
+
+
+    #==================================================================================
+    #   表の構造（SolveGrid）を罫線の形状のハッシュ値でキャッシュする関数
+    #   （同じ罫線の断面リストが続くページでは、表の構造を求め直さない）
+    #==================================================================================
+
+    def RuleSignature(self, *LineLists):
+        h = hashlib.sha1()
+        for Lines in LineLists:
+            keys = []
+            for L in Lines:
+                keys.append((L.get("angle", ""), ToFixed(L["x0"]), ToFixed(L["x1"]), ToFixed(L["y0"]), ToFixed(L["y1"]),
+                             ToFixed(L.get("linewidth", 0.0))))
+            #next
+            # SolveGrid は線の並び順にも依存するので、並び順もそのまま含める
+            h.update(repr(keys).encode("utf-8"))
+            h.update(b"|")
+        #next
+        return h.hexdigest()
+    #end def
+
+    @Instrument.Timed("TableGrid")
+    def TableGrid(self, HLine, VLine, HBLine, VBLine, ChartXmin, ChartXmax):
+        key = self.RuleSignature(HLine, VLine, HBLine, VBLine)
+        if key in self.GridCache:
+            self.GridCache.move_to_end(key)
+            self.GridCacheHits += 1
+            Instrument.Count("grid_cache_hits")
+            return self.GridCache[key]
+        #end if
+        self.GridCacheMisses += 1
+        Instrument.Count("grid_cache_misses")
+        grid = self.SolveGrid(HLine, VLine, HBLine, VBLine, ChartXmin, ChartXmax)
+        self.GridCache[key] = grid
+        if len(self.GridCache) > self.GridCacheSize:
+            self.GridCache.popitem(last=False)
+        #end if
+        return grid
+    #end def
+    #*********************************************************************************
+
+
+    #==================================================================================
+    #   求めた表の構造のセルに文字を割り当てる関数
+    #==================================================================================
+
+    def FillGrid(self, grid, Char):
+        RowsN = grid["RowsN"]
+        ColumnsN = grid["ColumnsN"]
+        Cellx0x1 = grid["Cellx0x1"]
+        Celly0y1 = grid["Celly0y1"]
+
+        ChartData = []
+        ChartDataWithOrigin = []
+        for j in range(RowsN):
+            CCell = []
+            CCell2 = []
+            for k in range(ColumnsN):
+                CCell.append("")
+                CCell2.append([])
+            #next
+            ChartData.append(CCell)
+            ChartDataWithOrigin.append(CCell2)
+        #next
+
+        for CLine in Char:
+            for C in CLine:
+                t = C[0]
+                Cx0 = C[1]
+                Cx1 = C[2]
+                Cy0 = C[3]
+                Cy1 = C[4]
+                cellX = -1
+                cellY = -1
+                for j in range(ColumnsN):
+                    [x0,x1] = Cellx0x1[j]
+                    if Cx0>=x0 and Cx0<=x1 :
+                        cellX=j
+                    #end if
+                #next
+                for j in range(RowsN):
+                    [y0,y1] = Celly0y1[j]
+                    if Cy1>=y0 and Cy1<=y1 :
+                        cellY=j
+                    #end if
+                #next
+                if cellX>-1 and cellY>-1:
+                    ChartData[cellY][cellX] += t
+                    # C2 = ChartDataWithOrigin[cellY][cellX]
+                    # C2.append(C)
+                    # ChartDataWithOrigin[cellY][cellX] = C2
+                    ChartDataWithOrigin[cellY][cellX].append(C)
+                #end if
+            #next
+        #next
+
+        # 結合セルの文字はセル番号の順に連結し、結合セル内のすべてのセルに入れる
+        ChartData2 = []
+        for j in range(RowsN):
+            CCell = []
+            for k in range(ColumnsN):
+                CCell.append("")
+            #next
+            ChartData2.append(CCell)
+        #next
+        for CellNo in grid["CellGroups"]:
+            D2 = ""
+            for C in CellNo:
+                D2 += ChartData[C[0]][C[1]]
+            #next
+            D2 = D2.replace(" ","")
+            for C in CellNo:
+                ChartData2[C[0]][C[1]]=D2
+            #next
+        #next
+        return ChartData, ChartData2
+    #end def
+    #*********************************************************************************
+
+
     def ReadHeader(self, page, interpreter, device):
 
         interpreter.process_page(page)
@@ -1488,6 +1547,7 @@ class ChartReader:
     #   各ページから１文字ずつの文字と座標データを抽出し、行毎の文字配列および座標配列を戻す関数
     #==================================================================================
 
+    @Instrument.Timed("chart:MakeChar")
     def MakeChar(self, page, interpreter, device):
 
         interpreter.process_page(page)
@@ -1655,6 +1715,11 @@ class ChartReader:
             #end if
         #next
 
+        # 短い線分の連続や四角形の辺の重なりを1本の罫線にまとめる
+        if self.NormalizeRules:
+            LineData = NormalizeRules(LineData)
+        #end if
+
         # その際、CharData2をY座標の高さ順に並び替えるためのリスト「CY」を作成
         CharData2=[]
         CY = []
@@ -2089,38 +2154,7 @@ if __name__ == '__main__':
     # pdfname = "02一貫計算書（一部）.pdf"
     ElementData = Read_Elements_from_pdf(pdfname)
     filename = os.path.splitext(pdfname)[0] + "_部材リスト" + ".csv"
-
-    with open(filename, 'w') as f:
-        writer = csv.writer(f)
-
-        ElementKind = ElementData.keys()
-        for Kind in ElementKind:
-            Kind2 = []
-            Kind2.append(Kind)  # 部材の種類
-            writer.writerow(Kind2)
-
-            Elements = ElementData[Kind]    # 同じ部材種類のデータ
-            RowNames = list(Elements.keys())        # 符号名：断面位置
-            Edata = Elements[RowNames[0]]
-            ColumnNames =list(Edata.keys())
-            cnames =["符号名：断面"] + ColumnNames
-            writer.writerow(cnames)
-
-            for RowName in RowNames:
-                data = Elements[RowName]
-                dlist = list(data.keys())
-                cdata = [RowName]
-                for ColumnName in ColumnNames:
-                    if ColumnName in dlist:
-                        cdata.append(data[ColumnName])
-                    else:
-                        cdata.append("")
-                    #end if
-                #next
-                writer.writerow(cdata)
-            #next
-        #next
-    #end with
+    WriteElementCsv(ElementData, filename)
     a=0
             
 
@@ -0,0 +1,153 @@
+#==========================================================================================
+#   レイアウトの木を作らずに文字と罫線だけを記録する pdfminer のデバイス
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+PDFPageAggregator はページごとに LTPage の木（LTChar・LTLine などのオブジェクト）を作り、
+MakeChar・MakeCharPlus はそれをすぐに文字と罫線のリストに戻していた。
+RecordingDevice はコンテンツストリームの解釈中に、チェックで使うものだけを
+LayoutPartition.PagePartition のリストに直接記録する。
+
+・文字 : [char, x0, x1, y0, y1, matrix]（回転の有無で chars と rotated に分ける）
+・線   : (x0, y0, x1, y1, linewidth, pts)、四角形・その他の図形 : (x0, y0, x1, y1)
+・文字の外形と図形の分類は pdfminer の LTChar・PDFLayoutAnalyzer.paint_path と同じ計算で求める。
+・フォームXObject（LTFigure）の中の要素は、その位置にそのまま記録する（PagePartition の走査と同じ順番）。
+・レイアウト解析（LAParams によるグループ化）は行わない。画像は記録しない。
+
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from RecordingDevice import RecordingDevice
+
+    resourceManager = PDFResourceManager()
+    device = RecordingDevice(resourceManager)
+    interpreter = PDFPageInterpreter(resourceManager, device)
+    interpreter.process_page(page)
+    part = device.get_result()          # PagePartition
+"""
+
+import re
+
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.utils import apply_matrix_pt, apply_matrix_rect, get_bound
+
+from LayoutPartition import PagePartition
+
+
+#============================================================================
+#  文字と罫線を記録するデバイス
+#============================================================================
+
+class RecordingDevice(PDFLayoutAnalyzer):
+
+    def __init__(self, rsrcmgr, pageno=1):
+        PDFLayoutAnalyzer.__init__(self, rsrcmgr, pageno=pageno, laparams=None)
+        self.result = None
+    #end def
+
+    def begin_page(self, page, ctm):
+        (x0, y0, x1, y1) = apply_matrix_rect(ctm, page.mediabox)
+        self.cur_item = PagePartition()
+        self.cur_item.bbox = (0, 0, abs(x0 - x1), abs(y0 - y1))
+    #end def
+
+    def end_page(self, page):
+        self.pageno += 1
+        self.result = self.cur_item
+    #end def
+
+    def get_result(self):
+        return self.result
+    #end def
+
+    # フォームXObjectの中の要素は座標変換済みなので、同じページにそのまま記録する
+    def begin_figure(self, name, bbox, matrix):
+        pass
+    #end def
+
+    def end_figure(self, name):
+        pass
+    #end def
+
+    def render_image(self, name, stream):
+        pass
+    #end def
+
+    #==================================================================================
+    #   文字（LTChar と同じ外形の計算）
+    #==================================================================================
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = self.handle_undefined_char(font, cid)
+        #end try
+        textwidth = font.char_width(cid)
+        adv = textwidth * fontsize * scaling
+        if font.is_vertical():
+            (vx, vy) = font.char_disp(cid)
+            vx = fontsize * 0.5 if vx is None else vx * fontsize * 0.001
+            vy = (1000 - vy) * fontsize * 0.001
+            bbox = (-vx, vy + rise + adv, -vx + fontsize, vy + rise)
+        else:
+            descent = font.get_descent() * fontsize
+            bbox = (0, descent + rise, adv, descent + rise + fontsize)
+        #end if
+        (x0, y0, x1, y1) = apply_matrix_rect(matrix, bbox)
+        if x1 < x0:
+            (x0, x1) = (x1, x0)
+        #end if
+        if y1 < y0:
+            (y0, y1) = (y1, y0)
+        #end if
+        if matrix[1] == 0.0:    # 回転していない文字
+            self.cur_item.chars.append([text, x0, x1, y0, y1, matrix])
+        else:
+            self.cur_item.rotated.append([text, x0, x1, y0, y1, matrix])
+        #end if
+        return adv
+    #end def
+
+    #==================================================================================
+    #   パス（PDFLayoutAnalyzer.paint_path と同じ分類で線・四角形・その他に分ける）
+    #==================================================================================
+
+    def paint_path(self, gstate, stroke, fill, evenodd, path):
+        shape = "".join(x[0] for x in path)
+        if shape[:1] != "m":
+            return
+        #end if
+        if shape.count("m") > 1:
+            # 複数のサブパスは1つずつ処理する
+            for m in re.finditer(r"m[^m]+", shape):
+                self.paint_path(gstate, stroke, fill, evenodd, path[m.start(0):m.end(0)])
+            #next
+            return
+        #end if
+
+        pts = [apply_matrix_pt(self.ctm, p[-2:] if p[0] != "h" else path[0][-2:]) for p in path]
+        # "h" で閉じたパスの重複した "l" を除く
+        if len(shape) > 3 and shape[-2:] == "lh" and pts[-2] == pts[0]:
+            shape = shape[:-2] + "h"
+            pts.pop()
+        #end if
+
+        part = self.cur_item
+        if shape in ("mlh", "ml"):
+            (x0, y0, x1, y1) = get_bound(pts[:2])
+            part.lines.append((x0, y0, x1, y1, gstate.linewidth, [pts[0], pts[1]]))
+            return
+        #end if
+        if shape in ("mlllh", "mllll"):
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3), _ = pts
+            if pts[0] == pts[4] and ((x0 == x1 and y1 == y2 and x2 == x3 and y3 == y0) or
+                                     (y0 == y1 and x1 == x2 and y2 == y3 and x3 == x0)):
+                part.rects.append(get_bound((pts[0], pts[2])))
+                return
+            #end if
+        #end if
+        part.curves.append(get_bound(pts))
+    #end def
+#end class
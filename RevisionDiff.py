@@ -0,0 +1,400 @@
+#==========================================================================================
+#   再提出された構造計算書の変更ページのみの再チェック
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+再提出された構造計算書では、1,500ページのうち数十ページしか変わっていないことが多い。
+各ページを「展開したコンテンツストリーム＋リソース」のハッシュ値（指紋）で識別し、
+前回までにチェックしたページの結果（検定比の検出結果、部材データ、断面データ）をキャッシュから再利用して、
+変更されたページだけを SS7 / OtherSheet で処理し直す。最後に検出結果のPDFを作り直す。
+
+    python RevisionDiff.py 計算書(第2版).pdf --limit 0.95 --cache 計算書.pagecache
+    python RevisionDiff.py 計算書(第2版).pdf --base 計算書(第1版).pdf     # 先に第1版でキャッシュを作る
+
+・柱・梁の検定表のページは、それまでのページで読み取った部材データに依存するため、
+  部材データのハッシュ値もキーに含める（伏図や断面リストが変わった場合は検定表のページも再チェックされる）。
+・伏図・軸組図・断面リストのページは、そのページで追加された部材データ（差分）もキャッシュする。
+・キャッシュは JSON で保存する（共有フォルダに置かれるので、読み込んでもコードを実行しない形式にする）。
+  同じフォルダの計算書で共有するので、最近使った CACHE_PAGES ページ分だけを残す。
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import hashlib
+import argparse
+
+SS7_KIND = "SuperBuild/SS7"
+
+# 部材データを作るページ（伏図・軸組図・断面リスト）と、部材データを使うページ（柱・梁の検定表）
+PRODUCER_FLAGS = ("床伏図", "軸組図", "断面リスト梁", "断面リスト柱")
+CONSUMER_FLAGS = ("柱", "梁")
+
+# キャッシュファイルの形式のバージョン（結果の形式を変えた場合は上げる）
+CACHE_VERSION = 2
+CACHE_PAGES = 20000     # キャッシュに残すページ数（古く使われていないものから捨てる）
+
+
+#============================================================================
+#  ページの指紋（展開したコンテンツストリームとリソースのハッシュ値）を求めるクラス
+#============================================================================
+
+class PageFingerprint():
+
+    def __init__(self):
+        self.streams = {}   # objid : ハッシュ値（複数ページで共有するフォントやXObjectは一度だけ展開）
+    #end def
+
+    def StreamDigest(self, stream, objid=None):
+        if objid is not None and objid in self.streams:
+            return self.streams[objid]
+        #end if
+        h = hashlib.sha1()
+        try:
+            h.update(stream.get_data())
+        except Exception:
+            # 展開できないフィルタの場合は元のデータを使う
+            h.update(stream.get_rawdata() or b"")
+        #end try
+        h.update(self.Serialize(stream.attrs, set()).encode("utf-8"))
+        digest = h.hexdigest()
+        if objid is not None:
+            self.streams[objid] = digest
+        #end if
+        return digest
+    #end def
+
+    def Serialize(self, obj, visiting):
+        # PDFのオブジェクトを参照先まで辿って、比較できる文字列に変換する
+        from pdfminer.pdftypes import PDFObjRef, PDFStream
+        from pdfminer.psparser import PSLiteral, PSKeyword
+
+        if isinstance(obj, PDFObjRef):
+            if obj.objid in visiting:
+                return "<loop>"
+            #end if
+            visiting = visiting | {obj.objid}
+            target = obj.resolve()
+            if isinstance(target, PDFStream):
+                return "S:" + self.StreamDigest(target, obj.objid)
+            #end if
+            return self.Serialize(target, visiting)
+        #end if
+        if isinstance(obj, PDFStream):
+            return "S:" + self.StreamDigest(obj)
+        #end if
+        if isinstance(obj, dict):
+            items = []
+            for key in sorted(obj.keys(), key=str):
+                if str(key) in ("Parent", "P"):     # 親への参照はページの内容ではない
+                    continue
+                #end if
+                items.append(str(key) + "=" + self.Serialize(obj[key], visiting))
+            #next
+            return "{" + ",".join(items) + "}"
+        #end if
+        if isinstance(obj, (list, tuple)):
+            return "[" + ",".join(self.Serialize(x, visiting) for x in obj) + "]"
+        #end if
+        if isinstance(obj, (PSLiteral, PSKeyword)):
+            return "/" + str(obj.name)
+        #end if
+        if isinstance(obj, bytes):
+            return "b" + obj.hex()
+        #end if
+        return repr(obj)
+    #end def
+
+    def Page(self, page):
+        from pdfminer.pdftypes import resolve1
+
+        h = hashlib.sha1()
+        contents = page.contents
+        if not isinstance(contents, list):
+            contents = [contents]
+        #end if
+        for obj in contents:
+            h.update(self.Serialize(obj, set()).encode("utf-8"))
+        #next
+        h.update(self.Serialize(resolve1(page.resources) or {}, set()).encode("utf-8"))
+        h.update(repr([float(v) for v in page.mediabox]).encode("utf-8"))
+        h.update(repr(page.attrs.get("Rotate", 0)).encode("utf-8"))
+        return h.hexdigest()
+    #end def
+#end class
+
+
+#============================================================================
+#  部材データの差分（あるページで追加・変更された分）を求める関数
+#============================================================================
+
+def MemberDelta(before, after):
+    delta = {"MemberPosition": {}, "memberData": {}, "memberName": []}
+    for name, dic1 in after["MemberPosition"].items():
+        dic0 = before["MemberPosition"].get(name, {})
+        d = {}
+        for key, value in dic1.items():
+            old = dic0.get(key)
+            if isinstance(value, list) and isinstance(old, list) and value[:len(old)] == old:
+                if len(value) > len(old):
+                    d[key] = value[len(old):]
+                #end if
+            elif value != old:
+                d[key] = value
+            #end if
+        #next
+        if len(d) > 0:
+            delta["MemberPosition"][name] = d
+        #end if
+    #next
+    for name, value in after["memberData"].items():
+        if not name in before["memberData"] or before["memberData"][name] != value:
+            delta["memberData"][name] = value
+        #end if
+    #next
+    delta["memberName"] = after["memberName"][len(before["memberName"]):]
+    return delta
+#end def
+
+def StateDigest(state):
+    text = json.dumps(state, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+#end def
+
+
+#============================================================================
+#  ページ単位の結果のキャッシュ（指紋 : 結果）
+#============================================================================
+
+class PageCache():
+
+    def __init__(self, filename, size=CACHE_PAGES):
+        self.filename = filename
+        self.size = size
+        self.pages = {}         # 指紋 : 記録（古く使われたものから順に並ぶ）
+        self.changed = False
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename, encoding="utf-8") as fp:
+                    data = json.load(fp)
+                #end with
+                if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+                    self.pages = data["pages"]
+                    for entry in self.pages.values():
+                        # JSON の配列をタプルに戻す（CheckPage の戻り値と同じ形）
+                        for key, result in entry["results"].items():
+                            entry["results"][key] = tuple(result)
+                        #next
+                    #next
+                #end if
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                # 壊れたキャッシュ（以前の形式を含む）は使わない（全ページを再チェックする）
+                self.pages = {}
+            #end try
+        #end if
+    #end def
+
+    def Get(self, fp):
+        entry = self.pages.pop(fp, None)
+        if entry is not None:
+            self.pages[fp] = entry      # 最近使ったものとして後ろに移す
+        #end if
+        return entry
+    #end def
+
+    def Entry(self, fp):
+        entry = self.pages.pop(fp, None)
+        if entry is None:
+            entry = {"results": {}}
+        #end if
+        self.pages[fp] = entry
+        while len(self.pages) > self.size:
+            self.pages.pop(next(iter(self.pages)))
+        #end while
+        self.changed = True
+        return entry
+    #end def
+
+    def Save(self):
+        if not self.filename or not self.changed:
+            return
+        #end if
+        tmp = "{}.{}.tmp".format(self.filename, os.getpid())
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump({"version": CACHE_VERSION, "pages": self.pages}, fp, ensure_ascii=False)
+        #end with
+        os.replace(tmp, self.filename)
+        self.changed = False
+    #end def
+#end class
+
+
+#============================================================================
+#  キャッシュを使って計算書をチェックする関数（CheckTool.CheckTool の差分版）
+#============================================================================
+
+def CheckRevision(CT, filename, limit=0.95, stpage=0, edpage=0, cache=None, out_file=None):
+    from MemberCheck01 import MakeOutFileName
+    from PdfInput import PdfSource
+
+    if cache is None:
+        cache = PageCache(None)
+    #end if
+    if out_file is None:
+        out_file = MakeOutFileName(filename, limit)
+    #end if
+
+    CT.ResetMemberData()
+    source = PdfSource(filename)
+    try:
+        PaperSize = source.PaperSizes()
+        PageMax = len(PaperSize)
+        startpage, endpage = CT.PageRange(PageMax, stpage, edpage)
+        interpreter, device, interpreter2, device2 = CT.MakeTools()
+        pages = source.Pages()
+        finger = PageFingerprint()
+
+        kind, version = CT.DetectKind(source, interpreter, device, interpreter2, device2)
+        limitKey = "{:.6f}".format(limit)
+
+        pageNo = [1]            # 表紙には検索結果の見出しを印字する
+        pageResultData = [[]]
+        pageResultData2 = [[]]
+        reused = []
+        changed = []
+        error = None
+        for pageI in range(startpage, endpage + 1):
+            page = pages[pageI - 1]
+            fp = finger.Page(page)
+            entry = cache.Get(fp)
+            result = None
+
+            if entry is not None and entry.get("kind") == kind:
+                # 部材データを使うページは、それまでの部材データが同じ場合だけ結果を再利用する
+                key = limitKey
+                if entry["consumer"]:
+                    key += ":" + StateDigest(CT.GetMemberData())
+                #end if
+                if key in entry["results"]:
+                    result = entry["results"][key]
+                    if entry["producer"]:
+                        CT.MergeMemberData(entry["member"])
+                    #end if
+                    reused.append(pageI)
+                #end if
+            #end if
+
+            if result is None:
+                changed.append(pageI)
+                layout = None
+                producer = False
+                consumer = False
+                if kind == SS7_KIND:
+                    interpreter.process_page(page)
+                    layout = device.get_result()
+                    mode, Flags = CT.SS7PageMode(layout)
+                    producer = any(Flags[k] for k in PRODUCER_FLAGS)
+                    consumer = any(Flags[k] for k in CONSUMER_FLAGS)
+                #end if
+                key = limitKey
+                if consumer:
+                    key += ":" + StateDigest(CT.GetMemberData())
+                #end if
+                before = copy.deepcopy(CT.GetMemberData()) if producer else None
+                try:
+                    result = CT.CheckPage(page, kind, limit, interpreter, device, interpreter2, device2, layout)
+                except Exception as e:
+                    # 読めないページで止める（それまでのページの結果はキャッシュに残す）
+                    error = "page {}: {}: {}".format(pageI, type(e).__name__, e)
+                    break
+                #end try
+
+                entry = cache.Entry(fp)
+                if entry.get("kind") != kind:
+                    entry["results"] = {}
+                #end if
+                entry["kind"] = kind
+                entry["producer"] = producer
+                entry["consumer"] = consumer
+                if producer:
+                    entry["member"] = MemberDelta(before, CT.GetMemberData())
+                #end if
+                entry["results"][key] = result
+            #end if
+
+            pageFlag, ResultData, pageFlag2, ResultData2 = result
+            if pageFlag or pageFlag2:
+                pageNo.append(pageI)
+                pageResultData.append(ResultData if pageFlag else [])
+                pageResultData2.append(ResultData2 if pageFlag2 else [])
+            #end if
+        #next
+
+        device.close()
+        device2.close()
+        cache.Save()
+
+        ok = False
+        if error is None:
+            ok = CT.MakeResultPdf(source, out_file, limit, PaperSize, pageNo, pageResultData, pageResultData2)
+        #end if
+    finally:
+        source.close()
+    #end try
+
+    return {"ok": bool(ok), "kind": kind, "version": version, "pages": PageMax,
+            "reused": reused, "changed": changed, "output": out_file, "error": error}
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="変更ページのみの再チェック")
+    parser.add_argument("pdf", help="チェックする構造計算書（新しい版）")
+    parser.add_argument("--base", help="先にチェックしてキャッシュを作る前の版の構造計算書")
+    parser.add_argument("--cache", help="ページ単位の結果のキャッシュファイル（省略時は計算書と同じフォルダの .pagecache）")
+    parser.add_argument("--limit", type=float, default=0.95, help="検定比の閾値")
+    parser.add_argument("--stpage", type=int, default=0, help="検索を開始するページ")
+    parser.add_argument("--edpage", type=int, default=0, help="検索を終了するページ")
+    args = parser.parse_args(argv)
+
+    import MemberCheck01
+
+    cachefile = args.cache
+    if cachefile is None:
+        cachefile = os.path.join(os.path.dirname(os.path.abspath(args.pdf)), ".pagecache")
+    #end if
+    cache = PageCache(cachefile)
+    CT = MemberCheck01.CheckTool()
+
+    files = []
+    if args.base:
+        files.append(args.base)
+    #end if
+    files.append(args.pdf)
+    for filename in files:
+        time_sta = time.time()
+        result = CheckRevision(CT, filename, limit=args.limit, stpage=args.stpage, edpage=args.edpage, cache=cache)
+        print()
+        print("{} : 再利用 {} ページ、再チェック {} ページ {}".format(
+            filename, len(result["reused"]), len(result["changed"]), result["changed"]))
+        print("time = {} sec".format(time.time() - time_sta))
+        if result["error"] is not None:
+            print("エラー : {}".format(result["error"]), file=sys.stderr)
+        #end if
+        if not result["ok"]:
+            return 1
+        #end if
+    #next
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#==========================================================================================
+#   回転した文字（縦書きのラベル）を文字列の並び（ラン）にまとめる処理
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+検定比図では、柱に沿って90度回転した検定比のラベルが列ごとに数千個並んでいる。
+回転した文字のデータ（LayoutPartition.PagePartition の rotated）を一度だけ走査して、「回転の向き・列（文字の左端のX座標）」のバケットに分け、
+バケットの中だけを読む順（正の回転は下から上、負の回転は上から下）に並べ替えて、
+空白または文字の間の隙間でランに区切る。
+
+戻り値は MakeChar の行の形式（文字列のリスト [[text], ...] と、文字データ
+[char, x0, x1, y0, y1, matrix] のリストのリスト）で、ランの先頭の文字から順に並んでいるので、
+検定比図のチェックでは先頭と末尾の文字の座標からそのまま四角形を求められる。
+"""
+
+GAP = 0.5       # 同じランとみなす文字の隙間（文字の送り方向の大きさに対する比）
+
+
+#============================================================================
+#  回転した文字をランにまとめる関数
+#============================================================================
+
+def RotatedRuns(chars, gap=GAP):
+    # chars : 文字データ [char, x0, x1, y0, y1, matrix] のリスト
+    # 回転の向きと列ごとのバケットに分ける（一度の走査）
+    buckets = {}
+    for c in chars:
+        b = c[5][1]
+        if b == 0.0:
+            continue
+        #end if
+        key = (1 if b > 0.0 else -1, int(round(c[1])))
+        if key in buckets:
+            buckets[key].append(c)
+        else:
+            buckets[key] = [c]
+        #end if
+    #next
+
+    Lines = []
+    CharLines = []
+    # 正の回転を先に、左の列から順に出力する
+    for key in sorted(buckets, key=lambda k: (-k[0], k[1])):
+        sign = key[0]
+        chars = buckets[key]
+        chars.sort(key=lambda c: c[3], reverse=(sign < 0))
+        run = []
+        text = ""
+        prev = None
+        for c in chars:
+            if c[0].strip() == "":
+                # 空白でランを区切る
+                if len(run) > 0:
+                    Lines.append([text])
+                    CharLines.append(run)
+                #end if
+                run = []
+                text = ""
+                prev = None
+                continue
+            #end if
+            if prev is not None:
+                size = prev[4] - prev[3]
+                if sign > 0:
+                    space = c[3] - prev[4]
+                else:
+                    space = prev[3] - c[4]
+                #end if
+                if space > gap * size:
+                    Lines.append([text])
+                    CharLines.append(run)
+                    run = []
+                    text = ""
+                #end if
+            #end if
+            run.append(c)
+            text += c[0]
+            prev = c
+        #next
+        if len(run) > 0:
+            Lines.append([text])
+            CharLines.append(run)
+        #end if
+    #next
+    return Lines, CharLines
+#end def
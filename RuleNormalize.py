@@ -0,0 +1,103 @@
+#==========================================================================================
+#   表の罫線データの正規化（固定小数点化・重複除去・同一直線上の線分の結合）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+SS7の断面リストのPDFでは、表の罫線1本が短い線分の連続や、四角形の辺の重なりとして描かれている。
+MakeChar が作成する線の辞書のリスト（x0, x1, y0, y1, angle, linewidth ...）を次のように整理する。
+
+・座標を 1/SCALE ポイント単位の整数（固定小数点）に丸め、以降の比較は整数で行う。
+・向き（H/V）、位置（Hはy、Vはx）、線幅が同じ線分を始点の順に並べ、
+  重なる線分や GAP 以内で接する線分を1本の線にまとめる（ソートと一方向の走査で O(n log n)）。
+・同じ辺が重複している場合もこの結合で1本になる。
+
+戻り値の辞書の座標は整数を SCALE で割った値（round(x, 3) と同じ値）で、整数の座標は ix0, ix1, iy0, iy1 に残す。
+"""
+
+SCALE = 1000    # 固定小数点の倍率（0.001ポイント単位）
+GAP = 1         # 接しているとみなす隙間（固定小数点の単位）
+
+
+#============================================================================
+#  浮動小数点の座標を固定小数点の整数に変換する関数
+#============================================================================
+
+def ToFixed(value, scale=SCALE):
+    return int(round(value * scale))
+#end def
+
+
+#============================================================================
+#  罫線の辞書のリストを正規化する関数
+#============================================================================
+
+def NormalizeRules(LineData, scale=SCALE, gap=GAP):
+    # (向き, 位置, 線幅, 始点, 終点) の整数の組に変換
+    segments = []
+    for Line in LineData:
+        angle = Line.get("angle")
+        lw = ToFixed(Line.get("linewidth", 0.0), scale)
+        if angle == "H":
+            pos = ToFixed(Line["y0"], scale)
+            s0 = ToFixed(Line["x0"], scale)
+            s1 = ToFixed(Line["x1"], scale)
+        elif angle == "V":
+            pos = ToFixed(Line["x0"], scale)
+            s0 = ToFixed(Line["y0"], scale)
+            s1 = ToFixed(Line["y1"], scale)
+        else:
+            continue
+        #end if
+        if s1 < s0:
+            s0, s1 = s1, s0
+        #end if
+        segments.append((angle, pos, lw, s0, s1))
+    #next
+
+    # 同じ直線上の線分が始点の順に並ぶようにソートし、一度の走査で結合する
+    segments.sort()
+    merged = []
+    cur = None
+    for seg in segments:
+        if cur is not None and seg[:3] == tuple(cur[:3]) and seg[3] <= cur[4] + gap:
+            if seg[4] > cur[4]:
+                cur[4] = seg[4]
+            #end if
+        else:
+            if cur is not None:
+                merged.append(cur)
+            #end if
+            cur = list(seg)
+        #end if
+    #next
+    if cur is not None:
+        merged.append(cur)
+    #end if
+
+    NewLineData = []
+    for (angle, pos, lw, s0, s1) in merged:
+        if angle == "H":
+            ix0, ix1, iy0, iy1 = s0, s1, pos, pos
+        else:
+            ix0, ix1, iy0, iy1 = pos, pos, s0, s1
+        #end if
+        lineDic = {}
+        lineDic["x0"] = ix0 / scale
+        lineDic["x1"] = ix1 / scale
+        lineDic["y0"] = iy0 / scale
+        lineDic["y1"] = iy1 / scale
+        lineDic["height"] = (iy1 - iy0) / scale
+        lineDic["width"] = (ix1 - ix0) / scale
+        lineDic["linewidth"] = lw / scale
+        lineDic["pts"] = [(lineDic["x0"], lineDic["y0"]), (lineDic["x1"], lineDic["y1"])]
+        lineDic["angle"] = angle
+        lineDic["ix0"] = ix0
+        lineDic["ix1"] = ix1
+        lineDic["iy0"] = iy0
+        lineDic["iy1"] = iy1
+        NewLineData.append(lineDic)
+    #next
+    return NewLineData
+#end def
@@ -0,0 +1,241 @@
+#==========================================================================================
+#   CheckTool の実行の途中経過の記録（ジャーナル）と中断した実行の再開
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+2,000ページの計算書のチェックが1,700ページ目で止まる（例外、プロセスの異常終了、利用者による中止）と、
+それまでの結果がすべて失われていた。RunJournal は各ページの結果を処理した順にファイルへ追記し、
+同じ条件で再実行した場合は記録済みのページを処理せずに結果を再生して、続きのページから処理する。
+
+・ジャーナルは検出結果のPDFと同じ名前の .journal（<計算書名>[検出結果(閾値=0.95)].journal）。
+  検出結果のPDFを作成できた時点で削除する。
+・1件ごとに JSON の1行として追記してフラッシュする（プロセスが異常終了しても、最後の不完全な1件だけを捨てる）。
+  再開時は最後の完全な記録の直後でファイルを切り詰めてから追記する。
+  共有フォルダに置かれたジャーナルを読み込んでもコードが実行されないように pickle は使わない。
+・先頭の見出し（ファイルの内容のハッシュ・閾値・ページの範囲・プログラムの種類）が一致しないジャーナルは使わない。
+・ページの記録 : (pageFlag, ResultData, pageFlag2, ResultData2) と、伏図・軸組図・断面リストのページでは
+  そのページで追加された部材データ（RevisionDiff.MemberDelta）。再生時に MergeMemberData で戻す。
+・処理を始めたページにも印を付ける。MAX_ATTEMPTS 回続けて完了しなかったページ（毎回同じ場所で落ちるページ）は、
+  次の再開では読み飛ばして（検出なしとして）先に進む。
+
+    CT = MemberCheck01.CheckTool()
+    result = CT.Run("計算書.pdf", limit=0.95)     # 途中で止まった場合は result.ok == False
+    result = CT.Run("計算書.pdf", limit=0.95)     # 記録済みのページを再生して続きから処理する
+
+    python RunJournal.py 計算書[検出結果(閾値=0.95)].journal      # ジャーナルの内容を表示する
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from RevisionDiff import MemberDelta, PRODUCER_FLAGS
+
+# ジャーナルの形式のバージョン（記録の形式を変えた場合は上げる）
+#   2 : pickle から JSON lines に変更
+JOURNAL_VERSION = 2
+JOURNAL_SUFFIX = ".journal"
+MAX_ATTEMPTS = 2        # 続けて完了しなかった場合に読み飛ばすまでの回数
+
+
+#============================================================================
+#  ジャーナルのファイル名
+#============================================================================
+
+def JournalFile(out_file):
+    return os.path.splitext(out_file)[0] + JOURNAL_SUFFIX
+#end def
+
+
+#============================================================================
+#  ジャーナルの記録を読み込む関数（最後の不完全な記録は捨てる）
+#    戻り値 : (記録のリスト, 最後の完全な記録の終わりのバイト位置)
+#============================================================================
+
+def ReadRecords(filename):
+    records = []
+    offset = 0
+    if not os.path.exists(filename):
+        return records, offset
+    #end if
+    with open(filename, "rb") as fp:
+        for line in fp:
+            if not line.endswith(b"\n"):
+                # 書込みの途中で止まった最後の記録
+                break
+            #end if
+            try:
+                records.append(json.loads(line.decode("utf-8")))
+            except ValueError:
+                # 壊れた記録（以降の記録も使わない）
+                break
+            #end try
+            offset += len(line)
+        #next
+    #end with
+    return records, offset
+#end def
+
+
+#============================================================================
+#  実行のジャーナルのクラス
+#============================================================================
+
+class RunJournal():
+
+    def __init__(self, filename, header):
+        # header : 実行の条件（sha1・limit・stpage・edpage・kind）。一致する記録だけを再生する
+        self.filename = filename
+        self.header = dict(header, version=JOURNAL_VERSION)
+        self.done = {}          # ページ番号 : {"result": ..., "member": ...}
+        self.attempts = {}      # ページ番号 : 完了しなかった回数
+        self.fp = None
+
+        records, offset = ReadRecords(filename)
+        if len(records) > 0 and records[0] == self.header:
+            for rec in records[1:]:
+                pageN = rec["page"]
+                if "start" in rec:
+                    self.attempts[pageN] = self.attempts.get(pageN, 0) + 1
+                else:
+                    # JSON の配列をタプルに戻す（CheckPage の戻り値と同じ形）
+                    rec["result"] = tuple(rec["result"])
+                    self.done[pageN] = rec
+                    self.attempts.pop(pageN, None)
+                #end if
+            #next
+            # 不完全な最後の記録の後ろに追記しないように、最後の完全な記録の直後で切り詰める
+            self.fp = open(filename, "r+b")
+            self.fp.seek(offset)
+            self.fp.truncate()
+        else:
+            self.fp = open(filename, "wb")
+            self.Write(self.header)
+        #end if
+    #end def
+
+    def Write(self, rec):
+        self.fp.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.fp.flush()
+    #end def
+
+    #==================================================================================
+    #   再開時の問合せ
+    #==================================================================================
+
+    def Resumed(self):
+        return len(self.done) > 0 or len(self.attempts) > 0
+    #end def
+
+    def Get(self, pageN):
+        # 記録済みのページの記録（無い場合は None）
+        return self.done.get(pageN)
+    #end def
+
+    def Failing(self, pageN):
+        # 続けて MAX_ATTEMPTS 回完了しなかったページ
+        return self.attempts.get(pageN, 0) >= MAX_ATTEMPTS
+    #end def
+
+    #==================================================================================
+    #   ページの処理の記録
+    #==================================================================================
+
+    def Start(self, pageN):
+        self.Write({"page": pageN, "start": True})
+    #end def
+
+    def Done(self, pageN, result, member=None, skipped=False):
+        rec = {"page": pageN, "result": result, "member": member}
+        if skipped:
+            rec["skipped"] = True
+        #end if
+        self.Write(rec)
+        self.done[pageN] = rec
+    #end def
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        #end if
+    #end def
+
+    def Remove(self):
+        # 検出結果のPDFを作成できた後に削除する
+        self.close()
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+        #end try
+    #end def
+#end class
+
+
+#============================================================================
+#  部材データを作るページかどうかと、その差分を求める関数
+#============================================================================
+
+def IsProducer(pageInfo):
+    # pageInfo : CheckTool.SS7PageInfo の結果（SS7以外の計算書では None）
+    if pageInfo is None:
+        return False
+    #end if
+    return any(pageInfo["flags"].get(k) for k in PRODUCER_FLAGS)
+#end def
+
+def Snapshot(CT):
+    # 部材データの複製（差分を求めるため、処理の前に取る）
+    import copy
+    return copy.deepcopy(CT.GetMemberData())
+#end def
+
+def Delta(CT, before):
+    if before is None:
+        return None
+    #end if
+    return MemberDelta(before, CT.GetMemberData())
+#end def
+
+
+#============================================================================
+#  メインルーチン（ジャーナルの内容の表示）
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CheckTool のジャーナルの内容の表示")
+    parser.add_argument("journal")
+    args = parser.parse_args(argv)
+
+    records, offset = ReadRecords(args.journal)
+    if len(records) == 0:
+        print("記録がありません: {}".format(args.journal), file=sys.stderr)
+        return 1
+    #end if
+    header = records[0]
+    print("条件 : " + ", ".join("{}={}".format(k, header[k]) for k in sorted(header)))
+    for rec in records[1:]:
+        if "start" in rec:
+            continue
+        #end if
+        pageFlag, ResultData, pageFlag2, ResultData2 = rec["result"]
+        note = " 読み飛ばし" if rec.get("skipped") else ""
+        if rec.get("member"):
+            note += " 部材データ"
+        #end if
+        print("{:>5}  検出 {:>4}{}".format(rec["page"], len(ResultData) + len(ResultData2), note))
+    #next
+    done = set(rec["page"] for rec in records[1:] if not "start" in rec)
+    started = [rec["page"] for rec in records[1:] if "start" in rec and not rec["page"] in done]
+    if len(started) > 0:
+        print("完了していないページ : {}".format(sorted(set(started))))
+    #end if
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,494 @@
+#==========================================================================================
+#   ページの文字と罫線の配列を共有メモリで別のプロセスに渡す仕組み
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+ページの読取り（コンテンツストリームの解釈）と解析（MakeChar 以降）を別のプロセスで行う場合、
+PagePartition の文字 [char, x0, x1, y0, y1, matrix] や線のリストを pickle で渡すと、
+1文字ごとにリストとタプルを作り直すため、読取りより受渡しの方が遅くなっていた。
+SharedPageData はページの内容を型の決まった連続した配列（float64・int64・UTF-32）にまとめて
+1つの共有メモリ（multiprocessing.shared_memory）に書き込み、受け取る側は NumPy の配列として参照する。
+プロセスの間で渡すのは、共有メモリの名前と配列の配置だけの小さな handle である。
+
+コピーせずに参照できるのは Array・CharBoxes の配列だけである。MakeChar などリストの形式で読む関数に渡すと、
+Partition で文字と線のリストを作り直すので、1文字ごとの費用は pickle の受渡しと変わらない
+（省けるのは pickle の直列化と、MakeChar の中の CharBoxes の配列の作成だけ）。
+したがって、解析を別のプロセスに分けて速くなるのは受渡しの時間の分だけである。
+
+    # 読取りのプロセス
+    shared = SharedPageData.Export(part, pageN=12, transfer=True)   # part : RecordingDevice の結果（PagePartition）
+    conn.send(shared.Handle())
+    shared.close()                      # 削除は受け取った側が行う
+
+    # 解析のプロセス
+    handles = conn.recv()               # [handle, ...]
+    attached = 0
+    try:
+        for handle in handles:
+            shared = SharedPageData.Attach(handle, owner=True)
+            attached += 1
+            with shared:
+                boxes = shared.CharBoxes()      # 文字の座標（n×4: x0, x1, y0, y1）。共有メモリをそのまま参照する
+                replay = SharedPageData.SharedReplay()
+                LineText, CharData, LineData = CT.MakeChar(shared, replay, replay)
+            #end with                           # 共有メモリを閉じて削除する
+        #next
+    finally:
+        SharedPageData.Discard(handles[attached:])     # Attach しなかったページの共有メモリを削除する
+    #end try
+
+    python SharedPageData.py 計算書.pdf [--pages 1-20] [--workers 2]   # pickle との受渡しの時間の比較
+
+・配列 : chars・rotated（n×4 の外形）、cmatrix・rmatrix（n×6 の文字の行列）、text（UTF-32 の文字）・text_offsets、
+  lines（n×5: x0, y0, x1, y1, linewidth）・pts（n×2）・pts_offsets、rects・curves（n×4）
+・寿命 : 作った側（owner）が Release（close と unlink）するまで残る。transfer=True で作った共有メモリは
+  作ったプロセスが終わっても削除されず、Attach(handle, owner=True) で受け取った側が削除する。
+  受け取った側が Attach する前に止まると /dev/shm に残るので、Attach しなかった handle は finally で Discard する。
+  Array・CharBoxes の配列は close の後に使ってはいけない（close の前に参照を捨てる）。
+・SharedReplay は CheckTool の MakeChar・MakeCharPlus・CoverCheck（PartitionOf で読む関数）に
+  インタープリタとデバイスの代わりに渡す。レイアウトの木（LTChar）を辿る ChartDevider には使えない。
+"""
+
+import sys
+import time
+import pickle
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from LayoutPartition import PagePartition
+
+ALIGN = 8               # 配列の先頭の位置の境界（バイト）
+
+# 配列の名前・型・列の数（None は1次元）
+ARRAYS = (
+    ("chars",        np.float64, 4),
+    ("cmatrix",      np.float64, 6),
+    ("rotated",      np.float64, 4),
+    ("rmatrix",      np.float64, 6),
+    ("text",         np.uint32,  None),
+    ("text_offsets", np.int64,   None),
+    ("lines",        np.float64, 5),
+    ("pts",          np.float64, 2),
+    ("pts_offsets",  np.int64,   None),
+    ("rects",        np.float64, 4),
+    ("curves",       np.float64, 4),
+)
+
+
+#============================================================================
+#  PagePartition を型の決まった配列に変換する関数
+#============================================================================
+
+def CharArrays(chars):
+    n = len(chars)
+    boxes = np.empty((n, 4), dtype=np.float64)
+    matrix = np.empty((n, 6), dtype=np.float64)
+    for i, c in enumerate(chars):
+        boxes[i] = c[1:5]
+        matrix[i] = c[5]
+    #next
+    return boxes, matrix
+#end def
+
+def PackPartition(part):
+    # 戻り値 : 名前 : 配列 の辞書
+    arrays = {}
+    arrays["chars"], arrays["cmatrix"] = CharArrays(part.chars)
+    arrays["rotated"], arrays["rmatrix"] = CharArrays(part.rotated)
+
+    # 文字は合字などで2文字以上の場合があるので、まとめた文字列と区切りの位置で持つ
+    texts = [c[0] for c in part.chars] + [c[0] for c in part.rotated]
+    arrays["text"] = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+    arrays["text_offsets"] = offsets
+
+    n = len(part.lines)
+    lines = np.empty((n, 5), dtype=np.float64)
+    pts = []
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    for i, (x0, y0, x1, y1, linewidth, p) in enumerate(part.lines):
+        lines[i] = (x0, y0, x1, y1, linewidth)
+        pts.extend(p)
+        offsets[i + 1] = len(pts)
+    #next
+    arrays["lines"] = lines
+    arrays["pts"] = np.array(pts, dtype=np.float64).reshape(-1, 2)
+    arrays["pts_offsets"] = offsets
+    arrays["rects"] = np.array(part.rects, dtype=np.float64).reshape(-1, 4)
+    arrays["curves"] = np.array(part.curves, dtype=np.float64).reshape(-1, 4)
+    return arrays
+#end def
+
+def Layout(arrays):
+    # 共有メモリの中の配置 : [(名前, 型, 形, 先頭の位置), ...] と全体の大きさ
+    spec = []
+    offset = 0
+    for name, dtype, cols in ARRAYS:
+        a = arrays[name]
+        spec.append((name, np.dtype(dtype).str, a.shape, offset))
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    #next
+    return spec, max(offset, ALIGN)
+#end def
+
+
+#============================================================================
+#  共有メモリの登録の解除（作ったプロセスの終了時に削除されないようにする）
+#============================================================================
+
+def Untrack(shm):
+    # Python 3.12 以前は開いただけのプロセスの resource_tracker も終了時に削除してしまう
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    #end try
+#end def
+
+
+#============================================================================
+#  共有メモリのページのクラス
+#============================================================================
+
+class SharedPage():
+
+    def __init__(self, shm, spec, pageN=None, owner=False):
+        self.shm = shm
+        self.spec = spec
+        self.pageN = pageN
+        self.owner = owner      # True の場合は Release で共有メモリを削除する
+        self.views = {}
+        self.partition = None
+    #end def
+
+    def Handle(self):
+        # 別のプロセスに渡す情報（pickle できる小さなタプル）
+        return (self.shm.name, self.spec, self.pageN)
+    #end def
+
+    def Array(self, name):
+        # 共有メモリをそのまま参照する配列（書き換えない）
+        view = self.views.get(name)
+        if view is None:
+            if self.shm is None:
+                raise ValueError("共有メモリは閉じられています")
+            #end if
+            for n, dtype, shape, offset in self.spec:
+                if n == name:
+                    count = int(np.prod(shape)) if len(shape) > 0 else 0
+                    view = np.frombuffer(self.shm.buf, dtype=np.dtype(dtype), count=count, offset=offset)
+                    view = view.reshape(shape)
+                    view.flags.writeable = False
+                    break
+                #end if
+            #next
+            if view is None:
+                raise KeyError(name)
+            #end if
+            self.views[name] = view
+        #end if
+        return view
+    #end def
+
+    def CharBoxes(self):
+        # PagePartition.CharBoxes と同じ形式（n×4: x0, x1, y0, y1）
+        return self.Array("chars")
+    #end def
+
+    #==================================================================================
+    #   PagePartition に戻す関数（MakeChar などのリストの形式）
+    #==================================================================================
+
+    def Texts(self):
+        offsets = self.Array("text_offsets").tolist()
+        text = self.Array("text").tobytes().decode("utf-32-le")
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    #end def
+
+    def Partition(self):
+        if self.partition is not None:
+            return self.partition
+        #end if
+        texts = self.Texts()
+        part = SharedPartition(self)
+        n = 0
+        for key, mkey in (("chars", "cmatrix"), ("rotated", "rmatrix")):
+            chars = getattr(part, key)
+            for box, matrix in zip(self.Array(key).tolist(), self.Array(mkey).tolist()):
+                chars.append([texts[n], box[0], box[1], box[2], box[3], tuple(matrix)])
+                n += 1
+            #next
+        #next
+        pts = [tuple(p) for p in self.Array("pts").tolist()]
+        offsets = self.Array("pts_offsets").tolist()
+        for i, (x0, y0, x1, y1, linewidth) in enumerate(self.Array("lines").tolist()):
+            part.lines.append((x0, y0, x1, y1, linewidth, pts[offsets[i]:offsets[i + 1]]))
+        #next
+        part.rects = [tuple(r) for r in self.Array("rects").tolist()]
+        part.curves = [tuple(r) for r in self.Array("curves").tolist()]
+        self.partition = part
+        return part
+    #end def
+
+    #==================================================================================
+    #   寿命の管理
+    #==================================================================================
+
+    def close(self):
+        # このプロセスの参照を閉じる（共有メモリは残る）
+        self.views = {}
+        if self.partition is not None:
+            self.partition.shared = None
+            self.partition = None
+        #end if
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        #end if
+    #end def
+
+    def Release(self):
+        # 閉じて削除する（owner の場合だけ）
+        shm = self.shm
+        self.close()
+        if self.owner and shm is not None:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+            #end try
+        #end if
+    #end def
+
+    def __enter__(self):
+        return self
+    #end def
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.Release()
+    #end def
+#end class
+
+
+class SharedPartition(PagePartition):
+    # リストは PagePartition と同じ。CharBoxes は共有メモリの配列を返す
+
+    def __init__(self, shared):
+        PagePartition.__init__(self)
+        self.shared = shared
+    #end def
+
+    def CharBoxes(self):
+        if self.shared is None:
+            return PagePartition.CharBoxes(self)
+        #end if
+        return self.shared.CharBoxes()
+    #end def
+#end class
+
+
+#============================================================================
+#  共有メモリへの書込みと、別のプロセスからの参照
+#============================================================================
+
+def Export(part, pageN=None, transfer=False):
+    # transfer=True : 作ったプロセスが終わっても削除しない（受け取った側が Attach(owner=True) で削除する）
+    arrays = PackPartition(part)
+    spec, size = Layout(arrays)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    for name, dtype, shape, offset in spec:
+        a = arrays[name]
+        if a.nbytes > 0:
+            shm.buf[offset:offset + a.nbytes] = memoryview(np.ascontiguousarray(a)).cast("B")
+        #end if
+    #next
+    if transfer:
+        Untrack(shm)
+    #end if
+    return SharedPage(shm, spec, pageN, owner=not transfer)
+#end def
+
+def Discard(handles):
+    # transfer=True で作ったまま Attach されなかった共有メモリを削除する（削除済みのものは無視する）
+    for handle in handles:
+        try:
+            shm = shared_memory.SharedMemory(name=handle[0])
+        except FileNotFoundError:
+            continue
+        #end try
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        #end try
+    #next
+#end def
+
+def Attach(handle, owner=False):
+    name, spec, pageN = handle
+    shm = shared_memory.SharedMemory(name=name)
+    if not owner:
+        # 削除しない側（開くと登録されるので解除する）
+        Untrack(shm)
+    #end if
+    return SharedPage(shm, spec, pageN, owner=owner)
+#end def
+
+
+#============================================================================
+#  インタープリタとデバイスの代わり（共有メモリのページを MakeChar に渡す）
+#============================================================================
+
+class SharedReplay():
+
+    def __init__(self):
+        self.result = None
+    #end def
+
+    def process_page(self, page):
+        # page : SharedPage（PagePartition の場合はそのまま）
+        if isinstance(page, SharedPage):
+            self.result = page.Partition()
+        else:
+            self.result = page
+        #end if
+    #end def
+
+    def get_result(self):
+        return self.result
+    #end def
+#end class
+
+
+#============================================================================
+#  子プロセスで実行する仕事（ページを読み取って共有メモリに書き込む）
+#============================================================================
+
+def ExtractPageTask(filename, pageNs, shared=True):
+    # 戻り値 : [handle, ...]（shared=False の場合は PagePartition のリスト）
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from RecordingDevice import RecordingDevice
+    from PageWatchdog import OpenBook
+
+    book = OpenBook(filename)
+    if not "record" in book["tools"]:
+        resourceManager = PDFResourceManager()
+        device = RecordingDevice(resourceManager)
+        book["tools"]["record"] = (PDFPageInterpreter(resourceManager, device), device)
+    #end if
+    interpreter, device = book["tools"]["record"]
+    pages = book["source"].Pages()
+    results = []
+    try:
+        for pageN in pageNs:
+            interpreter.process_page(pages[pageN - 1])
+            part = device.get_result()
+            if shared:
+                page = Export(part, pageN, transfer=True)
+                results.append(page.Handle())
+                page.close()
+            else:
+                results.append(part)
+            #end if
+        #next
+    except BaseException:
+        # 途中のページで止まった場合は、作った共有メモリを渡せないので削除する
+        if shared:
+            Discard(results)
+        #end if
+        raise
+    #end try
+    return results
+#end def
+
+
+#============================================================================
+#  メインルーチン（pickle との受渡しの時間の比較）
+#============================================================================
+
+def PageRange(text, count):
+    if not text:
+        return list(range(1, count + 1))
+    #end if
+    pages = []
+    for item in text.split(","):
+        if "-" in item:
+            a, b = item.split("-")
+            pages += list(range(int(a), int(b) + 1))
+        else:
+            pages.append(int(item))
+        #end if
+    #next
+    return [p for p in pages if 1 <= p <= count]
+#end def
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ページの文字と罫線の共有メモリでの受渡し（pickle との比較。MakeChar はリストを作り直すので差は受渡しの分だけ）")
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", help="ページの範囲（例 1-20,25）。省略時はすべてのページ")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from PdfInput import PdfSource
+    import MemberCheck01
+
+    with PdfSource(args.pdf) as source:
+        pageNs = PageRange(args.pages, source.PageCount())
+    #end with
+    chunks = [pageNs[i::args.workers] for i in range(args.workers)]
+    CT = MemberCheck01.CheckTool()
+    replay = SharedReplay()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.workers) as pool:
+        # 子プロセスの起動と計算書の読込みを済ませてから比べる
+        pool.starmap(ExtractPageTask, [(args.pdf, c[:1], False) for c in chunks if len(c) > 0])
+
+        t0 = time.perf_counter()
+        size = 0
+        lines = 0
+        for parts in pool.starmap(ExtractPageTask, [(args.pdf, c, False) for c in chunks]):
+            size += len(pickle.dumps(parts, protocol=pickle.HIGHEST_PROTOCOL))
+            for part in parts:
+                lines += len(CT.MakeChar(part, replay, replay)[0])
+            #next
+        #next
+        t1 = time.perf_counter()
+        print("pickle  : {:.3f} 秒, {} 行, 受渡し {:,} バイト".format(t1 - t0, lines, size))
+
+        t0 = time.perf_counter()
+        size = 0
+        lines = 0
+        handles = []
+        for chunk in pool.starmap(ExtractPageTask, [(args.pdf, c, True) for c in chunks]):
+            size += len(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+            handles += chunk
+        #next
+        attached = 0
+        try:
+            for handle in handles:
+                shared = Attach(handle, owner=True)
+                attached += 1
+                with shared:
+                    lines += len(CT.MakeChar(shared, replay, replay)[0])
+                #end with
+            #next
+        finally:
+            # 途中で例外になった場合も、Attach しなかったページの共有メモリを残さない
+            Discard(handles[attached:])
+        #end try
+        t1 = time.perf_counter()
+        print("共有メモリ : {:.3f} 秒, {} 行, 受渡し {:,} バイト".format(t1 - t0, lines, size))
+    #end with
+    return 0
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())
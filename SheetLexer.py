@@ -0,0 +1,93 @@
+#==========================================================================================
+#   床伏図・軸組図の文字列の字句解析（通り芯・階・スケール・寸法・部材符号）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+BeamMemberSearch・ColumnMemberSearch は、空白で区切った語ごとに re.match を何回も呼んで種類を判定し、
+line2.find(item, st) で語の位置を探し直していた。
+SheetLexer は判定の順番どおりの規則を1つの正規表現（名前付きグループの選択）にまとめてコンパイルし、
+行を一度だけ語に分けて、種類と文字の位置の付いたトークンを返す。
+
+    for kind, item, n, e in PLAN_LEXER.Tokens(line):
+        # kind : 規則の名前（どの規則にも当てはまらない語は None）
+        # item : 語、n : 行の先頭の文字（空白を除く）からの位置、e : 語の最後の文字の位置
+        x0 = CharData[n][1]
+        x1 = CharData[e][2]
+
+・規則は re.match と同じく語の先頭から照合し、先に書いた規則が優先する（従来の if ～ elif の順番と同じ）。
+・位置は語の長さを順に足して求めるので、同じ文字列が行の中に2回あっても取り違えない。
+"""
+
+import re
+
+
+#============================================================================
+#  字句解析のクラス
+#============================================================================
+
+class SheetLexer():
+
+    def __init__(self, rules):
+        # rules : [(種類, 正規表現)]（正規表現の中では名前付きグループを使わない）
+        self.rules = list(rules)
+        self.pattern = re.compile("|".join("(?P<{}>{})".format(kind, pattern) for kind, pattern in self.rules))
+    #end def
+
+    def Kind(self, item):
+        m = self.pattern.match(item)
+        if m is None:
+            return None
+        #end if
+        return m.lastgroup
+    #end def
+
+    def Tokens(self, line):
+        # 行を空白で区切り、[(種類, 語, 先頭の位置, 最後の文字の位置)] を返す
+        tokens = []
+        n = 0
+        match = self.pattern.match
+        for item in line.split():
+            m = match(item)
+            tokens.append((m.lastgroup if m is not None else None, item, n, n + len(item) - 1))
+            n += len(item)
+        #next
+        return tokens
+    #end def
+#end class
+
+
+#============================================================================
+#  図面の種類ごとの規則
+#============================================================================
+
+# 床伏図の見出し（通り芯・階・スケール・寸法）
+PLAN_LEXER = SheetLexer([
+    ("xaxis", r"X\d+"),                     # X1,X2,・・・・X通り
+    ("level", r"\d+FL\S+|RFL\S+"),          # 階
+    ("scale", r"S=\d+/\d+"),                # スケール
+    ("dim", r"\d+\Z"),                      # X方向寸法
+    ("yaxis", r"Y\d+"),                     # Y1,Y2,・・・・Y通り
+])
+
+# 軸組図の見出し（フレーム・通り芯・スケール・寸法・層）
+ELEVATION_LEXER = SheetLexer([
+    ("frame", r"X\d+フレーム|Y\d+\w?フレーム"),  # フレーム名
+    ("axis", r"X\d+\w?|Y\d+\w?"),           # 通り芯
+    ("scale", r"S=1/\d+"),                  # スケール
+    ("dim", r"[0-9]+\Z"),                   # 寸法
+    ("level", r"\d+FL\Z|RFL\Z"),            # 層
+])
+
+# 部材符号（大梁・小梁、柱、耐震壁）
+MEMBER_LEXER = SheetLexer([
+    ("beam", r"\S*\d+G\d+|B\d+|\S*RG\d+|\S*FG\d+"),
+    ("column", r"\d+C\d+|\d+P\d+"),
+    ("wall", r"EW\d+\w?\(\d+\)|EW\d+\w?"),
+])
+
+# 縦書きの寸法
+DIMENSION_LEXER = SheetLexer([
+    ("dim", r"\d+"),
+])
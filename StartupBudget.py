@@ -0,0 +1,132 @@
+#==========================================================================================
+#   起動時間の計測（スタートアップ予算のチェック）
+#
+#           一般財団法人日本建築総合試験所
+#
+#==========================================================================================
+"""
+MemberCheck01 と ReadChartByChar を新しいインタープリタで読み込み、
+インスタンスを作成するまでの時間を計測して、予算（秒）を超えていないかを調べるツール。
+
+    python StartupBudget.py                 # 既定の予算でチェック
+    python StartupBudget.py --budget 0.8    # 予算を変更
+    python StartupBudget.py --importtime    # 時間のかかっているimportを表示
+
+インタープリタ自体の起動時間（python -c pass）を差し引いた正味の時間（中央値）を予算と比較し、
+超えた場合は終了コード1を返す。
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# 計測対象（名前 : 新しいプロセスで実行するコード）
+TARGETS = {
+    "MemberCheck01": "import MemberCheck01; MemberCheck01.CheckTool()",
+    "ReadChartByChar": "import ReadChartByChar; ReadChartByChar.ChartReader()",
+}
+
+# 既定のスタートアップ予算（秒、インタープリタ起動分を除く）
+DEFAULT_BUDGET = 0.5
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+#============================================================================
+#  コードを新しいインタープリタで実行し、経過時間を返す関数
+#============================================================================
+
+def MeasureOnce(code):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+#end def
+
+def Measure(code, repeat):
+    times = []
+    for i in range(repeat):
+        times.append(MeasureOnce(code))
+    #next
+    return statistics.median(times)
+#end def
+
+
+#============================================================================
+#  -X importtime の出力から時間のかかっているモジュールを返す関数
+#============================================================================
+
+def ImportTime(code, top=10):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        #end if
+        items = line[len("import time:"):].split("|")
+        if len(items) != 3 or not items[1].strip().isdigit():
+            continue
+        #end if
+        name = items[2].rstrip()
+        # 直接読み込まれたモジュール（インデントが浅いもの）のみを対象にする
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append([int(items[1]), name.strip()])
+        #end if
+    #next
+    rows.sort(reverse=True)
+    return rows[:top]
+#end def
+
+
+#============================================================================
+#  メインルーチン
+#============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="起動時間の予算チェック")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="正味の起動時間の予算（秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数")
+    parser.add_argument("--importtime", action="store_true",
+                        help="時間のかかっているimportを表示する")
+    args = parser.parse_args(argv)
+
+    base = Measure("pass", args.repeat)
+    print("interpreter = {:.3f} sec".format(base))
+
+    over = False
+    for name, code in TARGETS.items():
+        total = Measure(code, args.repeat)
+        net = total - base
+        if net > args.budget:
+            state = "NG"
+            over = True
+        else:
+            state = "OK"
+        #end if
+        print("{:<16s} total = {:.3f} sec  net = {:.3f} sec  budget = {:.3f} sec  {}".format(
+            name, total, net, args.budget, state))
+        if args.importtime:
+            for (us, module) in ImportTime(code):
+                print("    {:8.1f} ms  {}".format(us / 1000.0, module))
+            #next
+        #end if
+    #next
+
+    if over:
+        return 1
+    else:
+        return 0
+    #end if
+#end def
+
+if __name__ == '__main__':
+    sys.exit(main())